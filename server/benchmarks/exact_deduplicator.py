@@ -0,0 +1,82 @@
+"""
+Benchmark exact-duplicate detection: `ExactDeduplicator`'s size, edge and
+full-hash stages against sha256-hashing every file, over a generated
+library of random files, byte-identical copies of some of them and
+same-sized files that differ only in the middle.
+
+Run from the `server` directory:
+
+    python -m benchmarks.exact_deduplicator
+    python -m benchmarks.exact_deduplicator --files 5000 --copies 500
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from services.files.deduplication.exact_deduplicator import (
+    EDGE_BYTES,
+    ExactDeduplicator,
+)
+from services.files.uploads import hash_file
+
+
+def generate_library(directory: str, files: int, copies: int) -> List[str]:
+    rng = np.random.default_rng(0)
+    sizes = np.clip(rng.lognormal(13.5, 1.0, files), 1024, 32 * 1024 * 1024)
+    paths = []
+    for index, size in enumerate(sizes.astype(int)):
+        paths.append(os.path.join(directory, f"file_{index}.bin"))
+        with open(paths[-1], "wb") as file:
+            file.write(rng.bytes(size))
+    for index in range(copies):
+        source = paths[rng.integers(files)]
+        copy = os.path.join(directory, f"copy_{index}.bin")
+        shutil.copyfile(source, copy)
+        if index % 2:
+            # Same size and edges, different middle: only a full hash tells.
+            size = os.path.getsize(copy)
+            if size > 2 * EDGE_BYTES:
+                with open(copy, "r+b") as file:
+                    file.seek(size // 2)
+                    file.write(b"\0")
+        paths.append(copy)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument(
+        "--copies", type=int, default=200, help="Copies; every other one altered"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = generate_library(directory, args.files, args.copies)
+        total = sum(os.path.getsize(path) for path in paths)
+        print(f"{len(paths)} files, {total / 2**30:.2f} GiB\n")
+
+        start = time.perf_counter()
+        by_hash: Dict[str, List[str]] = {}
+        for path in paths:
+            by_hash.setdefault(hash_file(path).hexdigest(), []).append(path)
+        naive = time.perf_counter() - start
+        naive_groups = sum(len(group) > 1 for group in by_hash.values())
+
+        start = time.perf_counter()
+        groups = ExactDeduplicator().deduplicate_paths(paths)
+        staged = time.perf_counter() - start
+
+    print(f"{'method':>20} {'seconds':>9} {'groups':>7}")
+    print(f"{'sha256 every file':>20} {naive:>9.2f} {naive_groups:>7}")
+    print(f"{'ExactDeduplicator':>20} {staged:>9.2f} {len(groups):>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark the persistent file index: a full `os.walk` against a cold index
+build, a warm rescan with nothing changed and a warm rescan after a few
+directories changed.
+
+Without a folder, a synthetic tree is generated into a temporary directory.
+The index itself always goes to a temporary database. Run from the `server`
+directory:
+
+    python -m benchmarks.file_index_scan ~/Pictures
+    python -m benchmarks.file_index_scan --directories 2000 --files-per-directory 100
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import Callable, List, Tuple
+
+from config import FILE_INDEX_SCHEMA_PATH
+from services.files.file_index import FileIndex
+
+
+def generate_tree(root: str, directories: int, files_per_directory: int) -> None:
+    for i in range(directories):
+        # Two levels deep, like a photo library's year/month folders.
+        directory = os.path.join(root, f"{i // 12:04}", f"{i % 12:02}_{i}")
+        os.makedirs(directory, exist_ok=True)
+        for j in range(files_per_directory):
+            open(os.path.join(directory, f"IMG_{j:05}.jpg"), "w").close()
+
+
+def walk(root: str) -> int:
+    return sum(len(files) for _, _, files in os.walk(root))
+
+
+def touch_directories(root: str, count: int) -> List[str]:
+    """Adds a file to `count` random directories so their mtimes move."""
+    directories = [path for path, _, _ in os.walk(root)]
+    changed = random.sample(directories, min(count, len(directories)))
+    for directory in changed:
+        open(os.path.join(directory, f"new_{time.time_ns()}.jpg"), "w").close()
+    return changed
+
+
+def timed(function: Callable[[], object]) -> Tuple[float, object]:
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def run(root: str, changed_directories: int) -> None:
+    with tempfile.TemporaryDirectory() as index_dir:
+        index = FileIndex(os.path.join(index_dir, "index.db"), FILE_INDEX_SCHEMA_PATH)
+
+        seconds, files = timed(lambda: walk(root))
+        print(f"{files} files\n")
+        print(f"{'scan':>24} {'seconds':>9} {'listed dirs':>12}")
+        print(f"{'os.walk':>24} {seconds:>9.3f} {'all':>12}")
+
+        for label in ("cold index build", "warm rescan, no changes"):
+            seconds, stats = timed(lambda: index.scan(root))
+            print(f"{label:>24} {seconds:>9.3f} {stats.directories_listed:>12}")
+
+        touch_directories(root, changed_directories)
+        label = f"warm rescan, {changed_directories} changed"
+        seconds, stats = timed(lambda: index.scan(root))
+        print(f"{label:>24} {seconds:>9.3f} {stats.directories_listed:>12}")
+
+        seconds, stats = timed(lambda: index.scan(root, full=True))
+        print(f"{'full rescan':>24} {seconds:>9.3f} {stats.directories_listed:>12}")
+        index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("directory", nargs="?", help="Folder to index")
+    parser.add_argument("--directories", type=int, default=500)
+    parser.add_argument("--files-per-directory", type=int, default=100)
+    parser.add_argument(
+        "--changed",
+        type=int,
+        default=5,
+        help="Directories to modify before the second warm rescan",
+    )
+    args = parser.parse_args()
+
+    if args.directory:
+        run(os.path.abspath(args.directory), args.changed)
+        return
+
+    with tempfile.TemporaryDirectory() as root:
+        generate_tree(root, args.directories, args.files_per_directory)
+        run(root, args.changed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Benchmark GET /annotations/group/{group_id} latency against group size.
+
+Seeds throwaway groups of increasing size into the configured Supabase project,
+loads each one with the batched endpoint and with the previous per-file query
+pattern, and prints latency and round trips per size. Seeded rows are removed
+when the run finishes.
+
+Run from the `server` directory:
+
+    python -m benchmarks.group_annotation_latency --sizes 10 50 100 500
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import Any, Dict, List
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import routers.annotate as annotate
+from dbio.supabase import AsyncSupabaseDatabaseAdapter, SupabaseDatabaseAdapter
+from utilities.general import generate_id
+
+
+class CountingAdapter:
+    """Proxies a database adapter and counts the queries sent through it."""
+
+    def __init__(self, db: AsyncSupabaseDatabaseAdapter):
+        self.db = db
+        self.round_trips = 0
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self.db, name)
+        if not callable(attribute):
+            return attribute
+
+        def counted(*args, **kwargs):
+            self.round_trips += 1
+            return attribute(*args, **kwargs)
+
+        return counted
+
+
+async def load_group_per_file(db, group_id: str) -> Dict[str, Any]:
+    """The query pattern the endpoint used before it was batched."""
+    group = await db.select("groups", "*", {"id": group_id})
+    group_tags = await db.select("group_tags", "*", {"group_id": group_id})
+    files = await db.select("file_groups", "*", {"group_id": group_id})
+    file_annotations = []
+    for file_group in files:
+        file_id = file_group["file_id"]
+        file = await db.select("files", "*", {"id": file_id})
+        file_description = await db.select(
+            "file_descriptions", "*", {"file_id": file_id}
+        )
+        file_tags = await db.select("file_tags", "*", {"file_id": file_id})
+        file_annotations.append((file, file_description, file_tags))
+    return {"group": group, "tags": group_tags, "files": file_annotations}
+
+
+async def load_group_batched(db, group_id: str) -> Dict[str, Any]:
+    return await annotate.get_group_annotation(group_id, db)
+
+
+def seed_group(db: SupabaseDatabaseAdapter, size: int, tag_id: int) -> Dict[str, Any]:
+    group_id = generate_id()
+    file_ids = [generate_id() for _ in range(size)]
+
+    db.client.table("groups").insert(
+        {"id": group_id, "title": f"benchmark group ({size} files)"}
+    ).execute()
+    db.client.table("group_tags").insert(
+        {"group_id": group_id, "tag_id": tag_id}
+    ).execute()
+    db.client.table("files").insert(
+        [
+            {
+                "id": file_id,
+                "name": f"{file_id}.jpg",
+                "type": "IMAGE",
+                "path": f"/benchmark/{file_id}.jpg",
+            }
+            for file_id in file_ids
+        ]
+    ).execute()
+    db.client.table("file_descriptions").insert(
+        [
+            {"file_id": file_id, "manual_description": "benchmark file"}
+            for file_id in file_ids
+        ]
+    ).execute()
+    db.client.table("file_tags").insert(
+        [{"file_id": file_id, "tag_id": tag_id} for file_id in file_ids]
+    ).execute()
+    db.client.table("file_groups").insert(
+        [{"file_id": file_id, "group_id": group_id} for file_id in file_ids]
+    ).execute()
+
+    return {"group_id": group_id, "file_ids": file_ids}
+
+
+def remove_group(db: SupabaseDatabaseAdapter, seeded: Dict[str, Any]) -> None:
+    db.client.table("groups").delete().eq("id", seeded["group_id"]).execute()
+    file_ids = seeded["file_ids"]
+    for start in range(0, len(file_ids), 150):
+        db.client.table("files").delete().in_(
+            "id", file_ids[start : start + 150]
+        ).execute()
+
+
+async def time_loader(loader, db, group_id: str, repeats: int) -> Dict[str, float]:
+    timings: List[float] = []
+    round_trips = 0
+    for _ in range(repeats):
+        counting_db = CountingAdapter(db)
+        started = time.perf_counter()
+        await loader(counting_db, group_id)
+        timings.append(time.perf_counter() - started)
+        round_trips = counting_db.round_trips
+    return {"median_ms": statistics.median(timings) * 1000, "round_trips": round_trips}
+
+
+async def run(args: argparse.Namespace) -> None:
+    url, key = os.environ["SUPABASE_URL"], os.environ["SUPABASE_SECRET_KEY"]
+    db = SupabaseDatabaseAdapter(url=url, key=key)
+    async_db = AsyncSupabaseDatabaseAdapter(url=url, key=key)
+    tag = db.insert("tags", {"tag": f"benchmark-{generate_id()}"})
+    tag_id = tag[0]["id"]
+
+    print(f"{'files':>8} {'loader':>10} {'median ms':>12} {'round trips':>12}")
+    try:
+        for size in args.sizes:
+            seeded = seed_group(db, size, tag_id)
+            try:
+                loaders = [("batched", load_group_batched)]
+                if not args.skip_per_file:
+                    loaders.append(("per-file", load_group_per_file))
+                for name, loader in loaders:
+                    result = await time_loader(
+                        loader, async_db, seeded["group_id"], args.repeats
+                    )
+                    print(
+                        f"{size:>8} {name:>10} {result['median_ms']:>12.1f} "
+                        f"{result['round_trips']:>12}"
+                    )
+            finally:
+                remove_group(db, seeded)
+    finally:
+        db.delete("tags", {"id": tag_id})
+        await async_db.close()
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 100, 500])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--skip-per-file",
+        action="store_true",
+        help="Only time the batched loader (the per-file loader is slow for large groups).",
+    )
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark near-duplicate lookups over packed perceptual hashes: every hash
+matched against every other through `HammingIndex`, against a brute-force
+popcount scan (timed on a sample of queries and extrapolated).
+
+Hashes are random 256-bit strings plus perturbed copies of some of them,
+standing in for the pHashes of a photo library. Run from the `server`
+directory:
+
+    python -m benchmarks.hamming_index
+    python -m benchmarks.hamming_index --hashes 100000 --threshold 0.9
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from services.files.deduplication.hamming_index import (
+    HammingIndex,
+    popcount,
+    radius_for_threshold,
+)
+
+BITS = 256
+BRUTE_FORCE_SAMPLE = 500
+
+
+def generate_hashes(count: int, duplicates: int, max_flips: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    words = BITS // 64
+    hashes = rng.integers(0, 2**64, size=(count, words), dtype=np.uint64)
+    copies = hashes[rng.choice(count, duplicates, replace=False)].copy()
+    for row in copies:
+        for bit in rng.choice(BITS, rng.integers(0, max_flips + 1), replace=False):
+            row[bit // 64] ^= np.uint64(1) << np.uint64(bit % 64)
+    return np.concatenate([hashes, copies])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--hashes", type=int, default=100_000)
+    parser.add_argument(
+        "--duplicates", type=int, default=5_000, help="Perturbed copies to add"
+    )
+    parser.add_argument("--threshold", type=float, default=0.9)
+    args = parser.parse_args()
+
+    radius = radius_for_threshold(args.threshold, BITS)
+    hashes = generate_hashes(args.hashes, args.duplicates, radius)
+    print(f"{len(hashes)} hashes, radius {radius}\n")
+
+    start = time.perf_counter()
+    index = HammingIndex(BITS, radius)
+    index.add(hashes)
+    matches = index.query(hashes)
+    indexed = time.perf_counter() - start
+    pairs = (sum(len(ids) for ids, _ in matches) - len(hashes)) // 2
+
+    start = time.perf_counter()
+    sample = hashes[:BRUTE_FORCE_SAMPLE]
+    for query in sample:
+        popcount(hashes ^ query) <= radius
+    brute_force = (time.perf_counter() - start) * len(hashes) / len(sample)
+
+    print(f"{'method':>24} {'seconds':>9}")
+    print(f"{'brute force (estimated)':>24} {brute_force:>9.2f}")
+    print(f"{'HammingIndex':>24} {indexed:>9.2f}")
+    print(f"\n{pairs} matching pairs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Concurrent load test for a running server.
+
+Keeps `--concurrency` requests in flight against each endpoint for `--duration`
+seconds and reports requests/sec and latency percentiles. To compare before
+and after a change, start the server (`python main.py`) on each revision and run
+the same command against it:
+
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 \\
+        --endpoint /annotations/groups/ids --endpoint /tags/autocomplete?search=a \\
+        --concurrency 64 --duration 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List
+
+import httpx
+
+
+async def worker(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    deadline: float,
+    latencies: List[float],
+    errors: List[str],
+) -> None:
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.get(endpoint)
+            if response.status_code >= 400:
+                errors.append(str(response.status_code))
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - started)
+
+
+async def load_endpoint(
+    url: str, endpoint: str, concurrency: int, duration: float
+) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors: List[str] = []
+    limits = httpx.Limits(
+        max_connections=concurrency, max_keepalive_connections=concurrency
+    )
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(
+            *(
+                worker(client, endpoint, deadline, latencies, errors)
+                for _ in range(concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_second": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p95_ms": percentile(0.95) * 1000 if latencies else 0.0,
+        "p99_ms": percentile(0.99) * 1000 if latencies else 0.0,
+    }
+
+
+async def run(args: argparse.Namespace) -> None:
+    print(
+        f"{'endpoint':<40} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} "
+        f"{'p99 ms':>10} {'errors':>8}"
+    )
+    for endpoint in args.endpoint:
+        result = await load_endpoint(
+            args.url, endpoint, args.concurrency, args.duration
+        )
+        print(
+            f"{endpoint:<40} {result['requests_per_second']:>10.1f} "
+            f"{result['p50_ms']:>10.1f} {result['p95_ms']:>10.1f} "
+            f"{result['p99_ms']:>10.1f} {result['errors']:>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", action="append", default=[])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+    if not args.endpoint:
+        args.endpoint = ["/annotations/groups/ids"]
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark `FileMetadataExtractor.iter_files_metadata` against extracting the
+same files one after another, and check that every file comes back: images
+and text go through the process pool, videos through the thread pool.
+
+Needs ffmpeg on PATH to generate the test videos. The metadata cache is not
+used, so every run extracts every file, and the pooled time includes
+starting the spawned workers. Run from the `server` directory:
+
+    python -m benchmarks.metadata_extraction
+    python -m benchmarks.metadata_extraction --generate 40
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import tempfile
+import time
+from typing import Dict, List
+
+from PIL import Image
+
+from models.file_metadata import ImageMetadata, TextMetadata, VideoMetadata
+from services.files.metadata_extraction.metadata_extractors import (
+    EXTRACTION_BUDGETS,
+    FileMetadataExtractor,
+)
+from services.files.directory_file_organizer import DirectoryFileOrganizer
+
+EXPECTED_TYPES = {".jpg": ImageMetadata, ".txt": TextMetadata, ".mp4": VideoMetadata}
+WORDS = "the quick brown fox jumps over the lazy dog".split()
+
+
+def generate_files(directory: str, count: int) -> List[str]:
+    """`count` images, text files and videos each."""
+    paths = []
+    for i in range(count):
+        image_path = os.path.join(directory, f"generated_{i}.jpg")
+        Image.effect_noise((1024, 768), 64).convert("RGB").save(image_path)
+
+        text_path = os.path.join(directory, f"generated_{i}.txt")
+        with open(text_path, "w") as file:
+            file.write(" ".join(random.choice(WORDS) for _ in range(200_000)))
+
+        video_path = os.path.join(directory, f"generated_{i}.mp4")
+        subprocess.run(
+            [
+                "ffmpeg",
+                "-v",
+                "error",
+                "-f",
+                "lavfi",
+                "-i",
+                "testsrc=duration=2:size=640x360:rate=30",
+                "-y",
+                video_path,
+            ],
+            check=True,
+        )
+        paths.extend([image_path, text_path, video_path])
+    return paths
+
+
+def check(paths: List[str], results: Dict[str, object]) -> None:
+    """Every path came back as the metadata type of its extension."""
+    missing = [path for path in paths if path not in results]
+    if missing:
+        raise SystemExit(f"No metadata for {len(missing)} files: {missing[:3]}")
+    for path, metadata in results.items():
+        expected = EXPECTED_TYPES[os.path.splitext(path)[1]]
+        if not isinstance(metadata, expected):
+            raise SystemExit(
+                f"{path}: expected {expected.__name__}, got {type(metadata).__name__}"
+            )
+
+
+def run(paths: List[str]) -> None:
+    extractor = FileMetadataExtractor(use_cache=False)
+    pools = {
+        extension: (
+            "process"
+            if EXTRACTION_BUDGETS[
+                DirectoryFileOrganizer.get_file_type(extension[1:])
+            ].use_processes
+            else "thread"
+        )
+        for extension in EXPECTED_TYPES
+    }
+    print(f"{len(paths)} files, {os.cpu_count()} CPUs")
+    print(", ".join(f"{ext} -> {pool} pool" for ext, pool in pools.items()) + "\n")
+
+    start = time.perf_counter()
+    serial = {path: extractor._extract_uncached(path) for path in paths}
+    serial_elapsed = time.perf_counter() - start
+    check(paths, serial)
+
+    start = time.perf_counter()
+    pooled = {file.path: file.metadata for file in extractor.iter_files_metadata(paths)}
+    pooled_elapsed = time.perf_counter() - start
+    check(paths, pooled)
+
+    print(f"{'mode':>10} {'total s':>9} {'ms/file':>9}")
+    for mode, elapsed in (("serial", serial_elapsed), ("pooled", pooled_elapsed)):
+        print(f"{mode:>10} {elapsed:>9.2f} {elapsed / len(paths) * 1000:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--generate",
+        type=int,
+        default=10,
+        help="Images, text files and videos to generate, each",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        run(generate_files(directory, args.generate))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark thumbnail decoding: full-resolution decode vs. the reduced-resolution
+path in `ThumbnailExtractor` (EXIF preview, JPEG `draft()`, `reducing_gap`).
+
+Each mode runs in a fresh process over every image in the folder so the peak
+RSS it reports belongs to that mode alone. Without a folder, large synthetic
+JPEGs are generated into a temporary directory.
+
+Run from the `server` directory:
+
+    python -m benchmarks.thumbnail_decoding ~/Pictures/large --size 1024
+    python -m benchmarks.thumbnail_decoding --generate 10
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from PIL import Image
+from pillow_heif import register_heif_opener
+
+from services.thumbnail_extractor import ThumbnailExtractor
+
+BENCHMARK_EXTENSIONS = {".jpg", ".jpeg", ".heic", ".png", ".tif", ".tiff", ".webp"}
+# 48 MP, the resolution of current phone main cameras.
+GENERATED_IMAGE_SIZE = (8000, 6000)
+
+
+def peak_rss_mb() -> float:
+    # Linux keeps ru_maxrss across exec, so a spawned worker would report the
+    # parent's peak; VmHWM belongs to this process image only.
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def decode_full(path: str, size: int, output_dir: str) -> Image.Image:
+    """
+    The path thumbnailing used to take: rotate and decode at full resolution,
+    then copy and shrink with Pillow's default `thumbnail()`. Decoding has
+    already happened by then, so its `draft()` does nothing, but its default
+    `reducing_gap` still applies to the resample.
+    """
+    extractor = ThumbnailExtractor(media_path=path, output_dir=output_dir)
+    img = extractor._maintain_orientation(Image.open(path))
+    img.load()
+    img = img.copy()
+    img.thumbnail((size, size))
+    return img
+
+
+def decode_reduced(path: str, size: int, output_dir: str) -> Image.Image:
+    extractor = ThumbnailExtractor(media_path=path, output_dir=output_dir)
+    return extractor._load_image(size)
+
+
+MODES = {"full": decode_full, "reduced": decode_reduced}
+
+
+def run_mode(mode: str, paths: List[str], size: int) -> Dict[str, float]:
+    register_heif_opener()
+    with tempfile.TemporaryDirectory() as output_dir:
+        baseline_rss = peak_rss_mb()
+        start = time.perf_counter()
+        for path in paths:
+            MODES[mode](path, size, output_dir)
+        elapsed = time.perf_counter() - start
+    return {
+        "seconds": elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+        "baseline_rss_mb": baseline_rss,
+    }
+
+
+def generate_images(directory: str, count: int) -> List[str]:
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"generated_{i}.jpg")
+        Image.effect_noise(GENERATED_IMAGE_SIZE, 40 + i).convert("RGB").save(
+            path, "JPEG", quality=90
+        )
+        paths.append(path)
+    return paths
+
+
+def find_images(directory: str) -> List[str]:
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if os.path.splitext(name)[1].lower() in BENCHMARK_EXTENSIONS
+    )
+
+
+def run(paths: List[str], size: int) -> None:
+    print(f"{len(paths)} images, target size {size}px\n")
+    print(
+        f"{'mode':>8} {'total s':>9} {'ms/image':>9} "
+        f"{'peak RSS MB':>12} {'startup RSS MB':>15}"
+    )
+
+    context = multiprocessing.get_context("spawn")
+    for mode in MODES:
+        with context.Pool(1) as pool:
+            result = pool.apply(run_mode, (mode, paths, size))
+        print(
+            f"{mode:>8} {result['seconds']:>9.2f} "
+            f"{result['seconds'] / len(paths) * 1000:>9.1f} "
+            f"{result['peak_rss_mb']:>12.1f} {result['baseline_rss_mb']:>15.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("directory", nargs="?", help="Folder of large JPEG/HEIC files")
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument(
+        "--generate",
+        type=int,
+        default=5,
+        help="Synthetic images to generate when no folder is given",
+    )
+    args = parser.parse_args()
+
+    if args.directory:
+        run(find_images(args.directory), args.size)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        run(generate_images(directory, args.generate), args.size)
+
+
+if __name__ == "__main__":
+    main()
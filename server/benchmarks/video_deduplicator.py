@@ -0,0 +1,145 @@
+"""
+Benchmark near-duplicate video detection: `VideoDeduplicator` over a set of
+generated videos and re-encoded, resized and trimmed copies of some of them,
+reporting the time taken and how many copies were grouped with their source.
+
+Each video is a sequence of slowly panning scenes cut from random images,
+so consecutive samples look alike, as in real footage. Run from the
+`server` directory:
+
+    python -m benchmarks.video_deduplicator
+    python -m benchmarks.video_deduplicator --videos 200 --copies 100
+"""
+
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from services.files.deduplication.video_deduplicator import VideoDeduplicator
+
+WIDTH, HEIGHT = 640, 360
+SCENE_SECONDS = 4
+# Pixels per second each scene pans right and down.
+PAN_X, PAN_Y = 40, 20
+# (description, ffmpeg output options) for each kind of copy.
+COPIES = [
+    ("re-encoded", ["-c:v", "mpeg4", "-q:v", "6"]),
+    ("resized", ["-vf", "scale=320:180", "-c:v", "libx264", "-crf", "30"]),
+    ("trimmed", ["-ss", "5.3", "-c:v", "libx264", "-crf", "26"]),
+]
+
+
+def write_scene(path: str, rng: np.random.Generator) -> None:
+    noise = rng.integers(0, 256, (9, 16, 3), dtype=np.uint8)
+    size = (WIDTH + PAN_X * SCENE_SECONDS, HEIGHT + PAN_Y * SCENE_SECONDS)
+    image = Image.fromarray(noise).resize(size, Image.Resampling.BICUBIC)
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.integers(0, size[0]), rng.integers(0, size[1])
+        diameter = rng.integers(40, 240)
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        draw.ellipse((x, y, x + diameter, y + diameter), fill=color)
+    image.save(path)
+
+
+def write_video(path: str, scenes: List[str]) -> None:
+    inputs, filters = [], []
+    for index, scene in enumerate(scenes):
+        inputs += ["-loop", "1", "-framerate", "25", "-t", str(SCENE_SECONDS)]
+        inputs += ["-i", scene]
+        crop = f"crop={WIDTH}:{HEIGHT}:t*{PAN_X}:t*{PAN_Y}"
+        filters.append(f"[{index}]{crop},setsar=1,format=yuv420p[v{index}]")
+    labels = "".join(f"[v{index}]" for index in range(len(scenes)))
+    filters.append(f"{labels}concat=n={len(scenes)}:v=1:a=0[out]")
+    command = ["ffmpeg", "-v", "error", "-y", *inputs]
+    command += ["-filter_complex", ";".join(filters), "-map", "[out]"]
+    command += ["-c:v", "libx264", "-preset", "ultrafast", path]
+    subprocess.run(command, check=True)
+
+
+def generate_videos(
+    directory: str, videos: int, copies: int
+) -> Tuple[List[str], List[Tuple[str, str, str]]]:
+    rng = np.random.default_rng(0)
+    scenes = []
+    for index in range(videos * 3):
+        scenes.append(os.path.join(directory, f"scene_{index}.png"))
+        write_scene(scenes[-1], rng)
+    sources = [os.path.join(directory, f"video_{index}.mp4") for index in range(videos)]
+    jobs = [
+        (path, list(rng.choice(scenes, rng.integers(4, 16), replace=False)))
+        for path in sources
+    ]
+    with ThreadPoolExecutor() as executor:
+        list(executor.map(lambda job: write_video(*job), jobs))
+
+    duplicates, commands = [], []
+    for index in range(copies):
+        source = sources[index % videos]
+        kind, options = COPIES[index % len(COPIES)]
+        copy = os.path.join(directory, f"copy_{index}.mkv")
+        duplicates.append((source, copy, kind))
+        commands.append(["ffmpeg", "-v", "error", "-y", "-i", source, *options, copy])
+    with ThreadPoolExecutor() as executor:
+        list(
+            executor.map(lambda command: subprocess.run(command, check=True), commands)
+        )
+    return sources, duplicates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--videos", type=int, default=60)
+    parser.add_argument(
+        "--copies", type=int, default=30, help="Re-encoded, resized or trimmed copies"
+    )
+    parser.add_argument("--threshold", type=float, default=0.6)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        sources, duplicates = generate_videos(directory, args.videos, args.copies)
+        print(
+            f"Generated {len(sources)} videos and {len(duplicates)} copies "
+            f"in {time.perf_counter() - start:.1f}s\n"
+        )
+
+        start = time.perf_counter()
+        groups = VideoDeduplicator(args.threshold).deduplicate_video_paths(
+            sources + [copy for _, copy, _ in duplicates]
+        )
+        elapsed = time.perf_counter() - start
+
+    group_of = {
+        path: index
+        for index, group in enumerate(groups)
+        for path in [group.original, *group.duplicates]
+    }
+    found = {kind: 0 for kind, _ in COPIES}
+    total = {kind: 0 for kind, _ in COPIES}
+    for source, copy, kind in duplicates:
+        total[kind] += 1
+        found[kind] += source in group_of and group_of.get(copy) == group_of[source]
+    source_of = {copy: source for source, copy, _ in duplicates}
+    mixed = sum(
+        len({source_of.get(path, path) for path in [group.original, *group.duplicates]})
+        > 1
+        for group in groups
+    )
+
+    print(f"Deduplicated in {elapsed:.1f}s\n")
+    print(f"{'copy':>12} {'found':>7}")
+    for kind, _ in COPIES:
+        print(f"{kind:>12} {found[kind]:>3}/{total[kind]:<3}")
+    print(f"\n{mixed} of {len(groups)} groups mix unrelated videos")
+
+
+if __name__ == "__main__":
+    main()
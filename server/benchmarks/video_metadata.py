@@ -0,0 +1,137 @@
+"""
+Benchmark per-video metadata extraction: the original probe sequence (a full
+`ffmpeg.probe`, two exiftool processes and three stat calls) against
+`VideoMetadataExtractor`'s single pass, with and without batched exiftool
+prefetching.
+
+Needs ffmpeg, ffprobe and exiftool on PATH. Without a folder, short test
+videos are generated into a temporary directory. Run from the `server`
+directory:
+
+    python -m benchmarks.video_metadata ~/Movies
+    python -m benchmarks.video_metadata --generate 20
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import ffmpeg
+
+from services.files.metadata_extraction.video_metadata_extractor import (
+    VideoMetadataExtractor,
+)
+
+BENCHMARK_EXTENSIONS = {".mp4", ".mov", ".mkv", ".avi", ".webm", ".m4v"}
+
+
+def original(path: str) -> dict:
+    """The probe sequence `extract_metadata` used to run for every video."""
+
+    def exiftool() -> dict:
+        result = subprocess.run(
+            ["exiftool", "-json", path], capture_output=True, text=True
+        )
+        return json.loads(result.stdout)[0]
+
+    probe = ffmpeg.probe(path)
+    exiftool()
+    properties = exiftool()
+    return {
+        "size": os.path.getsize(path),
+        "created_at": os.path.getctime(path),
+        "modified_at": os.path.getmtime(path),
+        "duration": probe["format"].get("duration"),
+        "properties": properties,
+    }
+
+
+def single_pass(paths: List[str]) -> None:
+    extractor = VideoMetadataExtractor()
+    for path in paths:
+        extractor.extract_metadata(path)
+
+
+def single_pass_prefetched(paths: List[str]) -> None:
+    extractor = VideoMetadataExtractor()
+    extractor.prefetch_properties(paths)
+    for path in paths:
+        extractor.extract_metadata(path)
+
+
+def generate_videos(directory: str, count: int) -> List[str]:
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"generated_{i}.mp4")
+        subprocess.run(
+            [
+                "ffmpeg",
+                "-v",
+                "error",
+                "-f",
+                "lavfi",
+                "-i",
+                "testsrc=duration=2:size=640x360:rate=30",
+                "-metadata",
+                f"title=Generated {i}",
+                "-y",
+                path,
+            ],
+            check=True,
+        )
+        paths.append(path)
+    return paths
+
+
+def find_videos(directory: str) -> List[str]:
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if os.path.splitext(name)[1].lower() in BENCHMARK_EXTENSIONS
+    )
+
+
+def run(paths: List[str]) -> None:
+    modes: Dict[str, Callable[[List[str]], None]] = {
+        "original": lambda paths: [original(path) for path in paths],
+        "single pass": single_pass,
+        "single pass + prefetch": single_pass_prefetched,
+    }
+    # Starts the exiftool daemon up front so its one-off startup isn't
+    # charged to the first mode that uses it.
+    VideoMetadataExtractor().prefetch_properties(paths[:1])
+
+    print(f"{len(paths)} videos\n")
+    print(f"{'mode':>24} {'total s':>9} {'ms/video':>9}")
+    for mode, function in modes.items():
+        start = time.perf_counter()
+        function(paths)
+        elapsed = time.perf_counter() - start
+        print(f"{mode:>24} {elapsed:>9.2f} {elapsed / len(paths) * 1000:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("directory", nargs="?", help="Folder of videos")
+    parser.add_argument(
+        "--generate",
+        type=int,
+        default=10,
+        help="Test videos to generate when no folder is given",
+    )
+    args = parser.parse_args()
+
+    if args.directory:
+        run(find_videos(args.directory))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        run(generate_videos(directory, args.generate))
+
+
+if __name__ == "__main__":
+    main()
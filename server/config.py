@@ -1,12 +1,14 @@
 import json
 import os
 
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
 ROOT_PATH = os.path.join(os.path.expanduser("~"), "life-repository")
 CONFIG_PATH = os.path.join(ROOT_PATH, "config.json")
 TMP_DIR = os.path.join(ROOT_PATH, "data", "tmp")  # TODO get from global config
 DATA_DIR = os.path.join(ROOT_PATH, "data")  # TODO get from global config
 ANNOTATED_FILES_DIR = os.path.join(DATA_DIR, "annotation-app")
 THUMBNAILS_DIR = os.path.join(DATA_DIR, "thumbnails")
+UPLOADS_DIR = os.path.join(TMP_DIR, "uploads")
 
 
 def load_config():
@@ -93,6 +95,50 @@ DATA_FILE_TYPES = [
 
 MAX_FILE_UPLOAD_SIZE_BYTES = 25 * 1024 * 1024  # 25 MB
 
+DATABASE_BACKEND = "supabase"  # "supabase" or "sqlite"
+SQLITE_DATABASE_PATH = os.path.join(DATA_DIR, "life_repository.db")
+SQLITE_DATABASE_SCHEMA_PATH = os.path.join(SERVER_DIR, "schemas", "schema_dev_v1.sql")
+
+DATABASE_POOL_SIZE = 20
+DATABASE_KEEPALIVE_EXPIRY_SECONDS = 60.0
+DATABASE_HEALTH_CHECK_INTERVAL_SECONDS = 30.0
+
+THUMBNAIL_SIZES = [128, 512, 1024]
+THUMBNAIL_DEFAULT_SIZE = 512
+THUMBNAIL_FORMAT = "JPEG"  # "JPEG" or "WEBP"
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2 GB
+VIDEO_THUMBNAIL_FRAMES = 1
+THUMBNAIL_CACHE_SCHEMA_PATH = os.path.join(
+    SERVER_DIR, "schemas", "thumbnail_cache_v1.sql"
+)
+
+JOB_WORKERS = os.cpu_count() or 1
+JOBS_DATABASE_PATH = os.path.join(DATA_DIR, "jobs.db")
+JOBS_DATABASE_SCHEMA_PATH = os.path.join(SERVER_DIR, "schemas", "jobs_v1.sql")
+JOB_RETENTION_DAYS = 7
+
+FILE_INDEX_DATABASE_PATH = os.path.join(DATA_DIR, "file_index.db")
+FILE_INDEX_SCHEMA_PATH = os.path.join(SERVER_DIR, "schemas", "file_index_v1.sql")
+
+METADATA_CACHE_DATABASE_PATH = os.path.join(DATA_DIR, "metadata_cache.db")
+METADATA_CACHE_SCHEMA_PATH = os.path.join(
+    SERVER_DIR, "schemas", "metadata_cache_v1.sql"
+)
+METADATA_CACHE_VERIFY_CONTENT = False
+
+HASH_STORE_DATABASE_PATH = os.path.join(DATA_DIR, "hash_store.db")
+HASH_STORE_SCHEMA_PATH = os.path.join(SERVER_DIR, "schemas", "hash_store_v1.sql")
+HASH_STORE_INDEX_DIR = os.path.join(DATA_DIR, "hash_index")
+DUPLICATE_THRESHOLD = 0.9
+# Fraction of sampled frames that must line up for two videos to match.
+VIDEO_DUPLICATE_THRESHOLD = 0.6
+UPLOAD_DUPLICATES = "flag"  # "off", "flag" or "reject" (exact copies only)
+
+FILE_WATCHER_ENABLED = True
+FILE_WATCHER_DEBOUNCE_SECONDS = 2.0
+FILE_WATCHER_POLL_INTERVAL_SECONDS = 60.0
+
 
 class Config:
     def __init__(self):
@@ -111,4 +157,84 @@ class Config:
             "max_file_upload_size_bytes", MAX_FILE_UPLOAD_SIZE_BYTES
         )
 
+        self.database_backend = config_data.get("database_backend", DATABASE_BACKEND)
+        self.sqlite_database_path = config_data.get(
+            "sqlite_database_path", SQLITE_DATABASE_PATH
+        )
+        self.sqlite_database_schema_path = config_data.get(
+            "sqlite_database_schema_path", SQLITE_DATABASE_SCHEMA_PATH
+        )
+        self.database_pool_size = config_data.get(
+            "database_pool_size", DATABASE_POOL_SIZE
+        )
+        self.database_keepalive_expiry_seconds = config_data.get(
+            "database_keepalive_expiry_seconds", DATABASE_KEEPALIVE_EXPIRY_SECONDS
+        )
+        self.database_health_check_interval_seconds = config_data.get(
+            "database_health_check_interval_seconds",
+            DATABASE_HEALTH_CHECK_INTERVAL_SECONDS,
+        )
+
+        self.thumbnail_sizes = config_data.get("thumbnail_sizes", THUMBNAIL_SIZES)
+        self.thumbnail_default_size = config_data.get(
+            "thumbnail_default_size", THUMBNAIL_DEFAULT_SIZE
+        )
+        self.thumbnail_format = config_data.get("thumbnail_format", THUMBNAIL_FORMAT)
+        self.thumbnail_quality = config_data.get("thumbnail_quality", THUMBNAIL_QUALITY)
+        self.thumbnail_cache_max_bytes = config_data.get(
+            "thumbnail_cache_max_bytes", THUMBNAIL_CACHE_MAX_BYTES
+        )
+        self.video_thumbnail_frames = config_data.get(
+            "video_thumbnail_frames", VIDEO_THUMBNAIL_FRAMES
+        )
+        self.thumbnail_cache_schema_path = THUMBNAIL_CACHE_SCHEMA_PATH
+
+        self.job_workers = config_data.get("job_workers", JOB_WORKERS)
+        self.jobs_database_path = config_data.get(
+            "jobs_database_path", JOBS_DATABASE_PATH
+        )
+        self.jobs_database_schema_path = JOBS_DATABASE_SCHEMA_PATH
+        self.job_retention_days = config_data.get(
+            "job_retention_days", JOB_RETENTION_DAYS
+        )
+
+        self.root_paths = config_data.get("root_paths", [])
+        self.file_index_database_path = config_data.get(
+            "file_index_database_path", FILE_INDEX_DATABASE_PATH
+        )
+        self.file_index_schema_path = FILE_INDEX_SCHEMA_PATH
+
+        self.metadata_cache_database_path = config_data.get(
+            "metadata_cache_database_path", METADATA_CACHE_DATABASE_PATH
+        )
+        self.metadata_cache_schema_path = METADATA_CACHE_SCHEMA_PATH
+        self.metadata_cache_verify_content = config_data.get(
+            "metadata_cache_verify_content", METADATA_CACHE_VERIFY_CONTENT
+        )
+
+        self.hash_store_database_path = config_data.get(
+            "hash_store_database_path", HASH_STORE_DATABASE_PATH
+        )
+        self.hash_store_schema_path = HASH_STORE_SCHEMA_PATH
+        self.hash_store_index_dir = config_data.get(
+            "hash_store_index_dir", HASH_STORE_INDEX_DIR
+        )
+        self.duplicate_threshold = config_data.get(
+            "duplicate_threshold", DUPLICATE_THRESHOLD
+        )
+        self.video_duplicate_threshold = config_data.get(
+            "video_duplicate_threshold", VIDEO_DUPLICATE_THRESHOLD
+        )
+        self.upload_duplicates = config_data.get("upload_duplicates", UPLOAD_DUPLICATES)
+
+        self.file_watcher_enabled = config_data.get(
+            "file_watcher_enabled", FILE_WATCHER_ENABLED
+        )
+        self.file_watcher_debounce_seconds = config_data.get(
+            "file_watcher_debounce_seconds", FILE_WATCHER_DEBOUNCE_SECONDS
+        )
+        self.file_watcher_poll_interval_seconds = config_data.get(
+            "file_watcher_poll_interval_seconds", FILE_WATCHER_POLL_INTERVAL_SECONDS
+        )
+
         self.frame_pattern = "frame_%05d.jpg"
@@ -0,0 +1,48 @@
+import os
+
+from config import Config
+from dbio.base_sql import AsyncBaseSQLDatabaseAdapter, BaseSQLDatabaseAdapter
+from dbio.sqlite import AsyncSQLiteDatabaseAdapter, SQLiteDatabaseAdapter
+from dbio.supabase import AsyncSupabaseDatabaseAdapter, SupabaseDatabaseAdapter
+
+
+def create_database_adapter(config: Config) -> BaseSQLDatabaseAdapter:
+    if config.database_backend == "sqlite":
+        return SQLiteDatabaseAdapter(
+            config.sqlite_database_path, config.sqlite_database_schema_path
+        )
+    if config.database_backend != "supabase":
+        raise ValueError(f"Unknown database backend: {config.database_backend}")
+    return SupabaseDatabaseAdapter(
+        url=os.environ["SUPABASE_URL"],
+        key=os.environ["SUPABASE_SECRET_KEY"],
+        pool_size=config.database_pool_size,
+        keepalive_expiry=config.database_keepalive_expiry_seconds,
+    )
+
+
+def create_async_database_adapter(config: Config) -> AsyncBaseSQLDatabaseAdapter:
+    if config.database_backend == "sqlite":
+        return AsyncSQLiteDatabaseAdapter(
+            config.sqlite_database_path, config.sqlite_database_schema_path
+        )
+    if config.database_backend != "supabase":
+        raise ValueError(f"Unknown database backend: {config.database_backend}")
+    return AsyncSupabaseDatabaseAdapter(
+        url=os.environ["SUPABASE_URL"],
+        key=os.environ["SUPABASE_SECRET_KEY"],
+        pool_size=config.database_pool_size,
+        keepalive_expiry=config.database_keepalive_expiry_seconds,
+    )
+
+
+__all__ = [
+    "AsyncBaseSQLDatabaseAdapter",
+    "AsyncSQLiteDatabaseAdapter",
+    "AsyncSupabaseDatabaseAdapter",
+    "BaseSQLDatabaseAdapter",
+    "SQLiteDatabaseAdapter",
+    "SupabaseDatabaseAdapter",
+    "create_async_database_adapter",
+    "create_database_adapter",
+]
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional
 
 
 class BaseSQLDatabaseAdapter(ABC):
@@ -7,12 +7,55 @@ class BaseSQLDatabaseAdapter(ABC):
     def insert(self, table: str, data: Dict[str, Any]) -> Dict[str, Any]:
         pass
 
+    @abstractmethod
+    def upsert(
+        self, table: str, data: Dict[str, Any], conflict_columns=["id"]
+    ) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    def insert_many(
+        self, table: str, rows: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Inserts all `rows` in as few statements as the backend allows."""
+        pass
+
+    @abstractmethod
+    def upsert_many(
+        self, table: str, rows: List[Dict[str, Any]], conflict_columns=["id"]
+    ) -> List[Dict[str, Any]]:
+        """Upserts all `rows` in as few statements as the backend allows."""
+        pass
+
     @abstractmethod
     def select(
         self, table: str, columns: str = "*", filters: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         pass
 
+    @abstractmethod
+    def select_in(
+        self,
+        table: str,
+        column: str,
+        values: Iterable[Any],
+        columns: str = "*",
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Selects every row whose `column` is one of `values` in as few round trips
+        as the backend allows. `columns` may embed related tables, for example
+        `"*, file_tags(tag_id)"`, so children are loaded in the same query.
+        """
+        pass
+
+    @abstractmethod
+    def select_like(
+        self, table: str, column: str, pattern: str, columns: str = "*"
+    ) -> List[Dict[str, Any]]:
+        """Selects rows whose `column` matches a case-insensitive LIKE `pattern`."""
+        pass
+
     @abstractmethod
     def update(
         self, table: str, data: Dict[str, Any], filters: Dict[str, Any]
@@ -22,3 +65,80 @@ class BaseSQLDatabaseAdapter(ABC):
     @abstractmethod
     def delete(self, table: str, filters: Dict[str, Any]) -> bool:
         pass
+
+    def health_check(self) -> bool:
+        return True
+
+    def reconnect(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class AsyncBaseSQLDatabaseAdapter(ABC):
+    """Asyncio counterpart of `BaseSQLDatabaseAdapter` for use inside request handlers."""
+
+    @abstractmethod
+    async def insert(self, table: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    async def upsert(
+        self, table: str, data: Dict[str, Any], conflict_columns=["id"]
+    ) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    async def insert_many(
+        self, table: str, rows: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    async def upsert_many(
+        self, table: str, rows: List[Dict[str, Any]], conflict_columns=["id"]
+    ) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    async def select(
+        self, table: str, columns: str = "*", filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    async def select_in(
+        self,
+        table: str,
+        column: str,
+        values: Iterable[Any],
+        columns: str = "*",
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    async def select_like(
+        self, table: str, column: str, pattern: str, columns: str = "*"
+    ) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    async def update(
+        self, table: str, data: Dict[str, Any], filters: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    async def delete(self, table: str, filters: Dict[str, Any]) -> bool:
+        pass
+
+    async def health_check(self) -> bool:
+        return True
+
+    async def reconnect(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,581 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from dbio.base_sql import AsyncBaseSQLDatabaseAdapter, BaseSQLDatabaseAdapter
+
+# SQLite caps bound parameters per statement, so IN filters are chunked. Chunks
+# are padded to a power of two so repeated lookups reuse the same statements.
+IN_FILTER_CHUNK_SIZE = 512
+STATEMENT_CACHE_SIZE = 512
+BUSY_TIMEOUT_MS = 5000
+
+IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+sqlite3.register_adapter(dict, json.dumps)
+sqlite3.register_adapter(list, json.dumps)
+sqlite3.register_adapter(tuple, json.dumps)
+sqlite3.register_converter("JSON", json.loads)
+sqlite3.register_converter("BOOLEAN", lambda value: bool(int(value)))
+
+
+def quote(identifier: str) -> str:
+    if not IDENTIFIER_PATTERN.match(identifier):
+        raise ValueError(f"Invalid SQL identifier: {identifier}")
+    return f'"{identifier}"'
+
+
+def singular(table: str) -> str:
+    return table[:-1] if table.endswith("s") else table
+
+
+@lru_cache(maxsize=256)
+def parse_columns(columns: str) -> Tuple[Tuple[str, ...], Tuple[Tuple[str, str], ...]]:
+    """
+    Splits a PostgREST style column list such as
+    `"file_id, files(*, file_tags(tag_id))"` into plain columns and embedded
+    relations with their own column lists.
+    """
+    parts, depth, start = [], 0, 0
+    for index, char in enumerate(columns):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append(columns[start:index])
+            start = index + 1
+    parts.append(columns[start:])
+    if depth != 0:
+        raise ValueError(f"Unbalanced parentheses in columns: {columns}")
+
+    plain, relations = [], []
+    for part in (part.strip() for part in parts):
+        if not part:
+            continue
+        if "(" in part:
+            name, inner = part.split("(", 1)
+            relations.append((name.strip(), inner[:-1].strip()))
+        else:
+            plain.append(part)
+    return tuple(plain), tuple(relations)
+
+
+def padded_chunks(values: List[Any]) -> Iterable[List[Any]]:
+    for start in range(0, len(values), IN_FILTER_CHUNK_SIZE):
+        chunk = values[start : start + IN_FILTER_CHUNK_SIZE]
+        size = 8
+        while size < len(chunk):
+            size *= 2
+        yield chunk + [chunk[-1]] * (min(size, IN_FILTER_CHUNK_SIZE) - len(chunk))
+
+
+class SQLiteDatabaseAdapter(BaseSQLDatabaseAdapter):
+    """
+    Local database backend for single-user deployments.
+
+    Each thread gets its own connection, opened in WAL mode so readers never
+    block the writer. Statements are generated with stable text so sqlite3's
+    per-connection statement cache reuses them, and list inserts go through
+    `executemany`. Embedded relations in `columns` are resolved by the naming
+    convention the schema follows (`<table>_id` foreign keys), one batched
+    query per relation.
+    """
+
+    def __init__(self, database_path: str, schema_path: Optional[str] = None):
+        self.database_path = database_path
+        self.schema_path = schema_path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._generation = 0
+        self._table_columns_cache: Dict[str, List[str]] = {}
+
+        if os.path.dirname(database_path):
+            os.makedirs(os.path.dirname(database_path), exist_ok=True)
+        self._apply_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.database_path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False,
+        )
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        connection.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        connection.execute("PRAGMA temp_store=MEMORY")
+        return connection
+
+    def _connection(self) -> sqlite3.Connection:
+        if getattr(self._local, "generation", None) != self._generation:
+            connection = self._connect()
+            with self._connections_lock:
+                self._connections.append(connection)
+            self._local.connection = connection
+            self._local.generation = self._generation
+        return self._local.connection
+
+    def _apply_schema(self) -> None:
+        if not self.schema_path or not os.path.exists(self.schema_path):
+            return
+        with open(self.schema_path, "r") as file:
+            schema = file.read()
+        self._connection().executescript(schema)
+
+    def _table_columns(self, table: str) -> List[str]:
+        if table not in self._table_columns_cache:
+            rows = self._connection().execute(f"PRAGMA table_info({quote(table)})")
+            self._table_columns_cache[table] = [row["name"] for row in rows]
+        return self._table_columns_cache[table]
+
+    def _where(self, filters: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+        if not filters:
+            return "", []
+        clauses, params = [], []
+        for key, value in filters.items():
+            if value is None:
+                clauses.append(f"{quote(key)} IS NULL")
+            else:
+                clauses.append(f"{quote(key)} = ?")
+                params.append(value)
+        return " WHERE " + " AND ".join(clauses), params
+
+    def _relation(self, table: str, name: str) -> Tuple[str, str, bool]:
+        """Returns (parent key, child key, is_many) for an embedded relation."""
+        foreign_key = f"{singular(name)}_id"
+        if foreign_key in self._table_columns(table):
+            return foreign_key, "id", False
+        foreign_key = f"{singular(table)}_id"
+        if foreign_key in self._table_columns(name):
+            return "id", foreign_key, True
+        raise ValueError(f"No relationship found between {table} and {name}")
+
+    def _query(
+        self,
+        table: str,
+        columns: str,
+        where: str,
+        params: Sequence[Any],
+        key_column: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Runs a select and resolves embedded relations. `key_column` is always
+        fetched so callers can match rows back to their keys; they drop it with
+        `_hide_unrequested` once they are done.
+        """
+        plain, relations = parse_columns(columns)
+        relations = [
+            (name, inner or "*", *self._relation(table, name))
+            for name, inner in relations
+        ]
+
+        extra = []
+        if "*" not in plain:
+            for column in [key_column, *(relation[2] for relation in relations)]:
+                if column and column not in plain and column not in extra:
+                    extra.append(column)
+        select_columns = (
+            "*" if "*" in plain else ", ".join(quote(c) for c in [*plain, *extra])
+        )
+
+        sql = f"SELECT {select_columns} FROM {quote(table)}{where}"
+        rows = [dict(row) for row in self._connection().execute(sql, params)]
+
+        for name, inner, parent_key, child_key, is_many in relations:
+            keys = [row[parent_key] for row in rows if row[parent_key] is not None]
+            children = self._select_in(name, child_key, keys, inner, None)
+            if is_many:
+                grouped: Dict[Any, List[Dict[str, Any]]] = {}
+                for child in children:
+                    grouped.setdefault(child[child_key], []).append(child)
+                for row in rows:
+                    row[name] = grouped.get(row[parent_key], [])
+            else:
+                by_key = {child[child_key]: child for child in children}
+                for row in rows:
+                    row[name] = by_key.get(row[parent_key])
+            self._hide_unrequested(children, inner, child_key)
+
+        parent_keys = [relation[2] for relation in relations]
+        self._hide_unrequested(rows, columns, *parent_keys)
+        return rows
+
+    @staticmethod
+    def _hide_unrequested(
+        rows: List[Dict[str, Any]], columns: str, *keys: str
+    ) -> List[Dict[str, Any]]:
+        plain, _ = parse_columns(columns)
+        hidden = [key for key in keys if "*" not in plain and key not in plain]
+        for row in rows:
+            for key in hidden:
+                row.pop(key, None)
+        return rows
+
+    def _select_in(
+        self,
+        table: str,
+        column: str,
+        values: Iterable[Any],
+        columns: str,
+        filters: Optional[Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        values = list(dict.fromkeys(values))
+        if not values:
+            return []
+        filter_sql, filter_params = self._where(filters)
+        filter_sql = filter_sql.replace(" WHERE ", " AND ", 1)
+        rows = []
+        for chunk in padded_chunks(values):
+            where = f" WHERE {quote(column)} IN ({', '.join('?' * len(chunk))})"
+            rows.extend(
+                self._query(
+                    table,
+                    columns,
+                    where + filter_sql,
+                    [*chunk, *filter_params],
+                    key_column=column,
+                )
+            )
+        return rows
+
+    def _write(self, sql: str, params: Sequence[Any]) -> List[Dict[str, Any]]:
+        connection = self._connection()
+        with connection:
+            return [dict(row) for row in connection.execute(sql, params)]
+
+    def _write_many(
+        self, sql_for_columns, table: str, rows: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Writes rows with one `executemany` per distinct column set."""
+        batches: Dict[Tuple[str, ...], List[Tuple[Any, ...]]] = {}
+        for row in rows:
+            batches.setdefault(tuple(row.keys()), []).append(tuple(row.values()))
+        connection = self._connection()
+        with connection:
+            for columns, values in batches.items():
+                connection.executemany(sql_for_columns(table, columns), values)
+        return rows
+
+    def insert(
+        self, table: str, data: Union[Dict[str, Any], List[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        if isinstance(data, list):
+            return self.insert_many(table, data)
+        try:
+            return self._write(
+                insert_sql(table, tuple(data.keys())) + " RETURNING *",
+                list(data.values()),
+            )
+        except Exception as e:
+            print(f"Error inserting data into {table}: {e}")
+            return []
+
+    def insert_many(
+        self, table: str, rows: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        try:
+            return self._write_many(insert_sql, table, rows)
+        except Exception as e:
+            print(f"Error inserting rows into {table}: {e}")
+            return []
+
+    def upsert(
+        self, table: str, data: Dict[str, Any], conflict_columns=["id"]
+    ) -> Dict[str, Any]:
+        if isinstance(data, list):
+            return self.upsert_many(table, data, conflict_columns)
+        try:
+            sql = upsert_sql(table, tuple(data.keys()), conflict_key(conflict_columns))
+            return self._write(sql + " RETURNING *", list(data.values()))
+        except Exception as e:
+            print(f"Error upserting data into {table}: {e}")
+            return []
+
+    def upsert_many(
+        self, table: str, rows: List[Dict[str, Any]], conflict_columns=["id"]
+    ) -> List[Dict[str, Any]]:
+        conflict = conflict_key(conflict_columns)
+        try:
+            return self._write_many(
+                lambda table, columns: upsert_sql(table, columns, conflict),
+                table,
+                rows,
+            )
+        except Exception as e:
+            print(f"Error upserting rows into {table}: {e}")
+            return []
+
+    def increment(
+        self,
+        table: str,
+        data: Dict[str, Any],
+        counters: Dict[str, int],
+        conflict_columns=["id"],
+    ) -> Dict[str, Any]:
+        """
+        Inserts `data` with `counters`, or adds `counters` to the row that
+        already has its conflict key. It is one statement, so concurrent
+        writers never lose counts.
+        """
+        try:
+            sql = increment_sql(
+                table,
+                tuple(data.keys()),
+                tuple(counters.keys()),
+                conflict_key(conflict_columns),
+            )
+            return self._write(
+                sql + " RETURNING *", [*data.values(), *counters.values()]
+            )
+        except Exception as e:
+            print(f"Error incrementing counters in {table}: {e}")
+            return []
+
+    def select(
+        self, table: str, columns: str = "*", filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        try:
+            where, params = self._where(filters)
+            return self._query(table, columns, where, params)
+        except Exception as e:
+            print(f"Error executing select query: {e}")
+        return []
+
+    def select_in(
+        self,
+        table: str,
+        column: str,
+        values: Iterable[Any],
+        columns: str = "*",
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        try:
+            rows = self._select_in(table, column, values, columns, filters)
+            return self._hide_unrequested(rows, columns, column)
+        except Exception as e:
+            print(f"Error executing select in query: {e}")
+        return []
+
+    def select_like(
+        self, table: str, column: str, pattern: str, columns: str = "*"
+    ) -> List[Dict[str, Any]]:
+        try:
+            return self._query(
+                table, columns, f" WHERE {quote(column)} LIKE ?", [pattern]
+            )
+        except Exception as e:
+            print(f"Error executing select like query: {e}")
+        return []
+
+    def select_greater(
+        self, table: str, column: str, value: Any, columns: str = "*"
+    ) -> List[Dict[str, Any]]:
+        """Rows whose `column` is greater than `value`, for watermark polling."""
+        try:
+            return self._query(table, columns, f" WHERE {quote(column)} > ?", [value])
+        except Exception as e:
+            print(f"Error executing select greater query: {e}")
+        return []
+
+    def select_ordered(
+        self,
+        table: str,
+        order_by: str,
+        descending: bool = False,
+        limit: Optional[int] = None,
+        columns: str = "*",
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Rows sorted by `order_by`, at most `limit` of them, sorted and cut in SQL."""
+        try:
+            where, params = self._where(filters)
+            where += f" ORDER BY {quote(order_by)}{' DESC' if descending else ''}"
+            if limit is not None:
+                where += " LIMIT ?"
+                params.append(limit)
+            return self._query(table, columns, where, params)
+        except Exception as e:
+            print(f"Error executing select ordered query: {e}")
+        return []
+
+    def update(
+        self, table: str, data: Dict[str, Any], filters: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        try:
+            assignments = ", ".join(f"{quote(key)} = ?" for key in data)
+            where, params = self._where(filters)
+            return self._write(
+                f"UPDATE {quote(table)} SET {assignments}{where} RETURNING *",
+                [*data.values(), *params],
+            )
+        except Exception as e:
+            print(f"Error executing update query: {e}")
+        return []
+
+    def delete(self, table: str, filters: Dict[str, Any]) -> bool:
+        try:
+            where, params = self._where(filters)
+            return self._write(f"DELETE FROM {quote(table)}{where} RETURNING *", params)
+        except Exception as e:
+            print(f"Error executing delete query: {e}")
+        return []
+
+    def delete_less(self, table: str, column: str, value: Any) -> int:
+        """Deletes rows whose `column` is less than `value`, returning how many."""
+        try:
+            return len(
+                self._write(
+                    f"DELETE FROM {quote(table)} WHERE {quote(column)} < ? "
+                    f"RETURNING {quote(column)}",
+                    [value],
+                )
+            )
+        except Exception as e:
+            print(f"Error executing delete less query: {e}")
+        return 0
+
+    def health_check(self) -> bool:
+        try:
+            self._connection().execute("SELECT 1").fetchone()
+            return True
+        except Exception as e:
+            print(f"Database health check failed: {e}")
+            return False
+
+    def reconnect(self) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._connections_lock:
+            self._generation += 1
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+
+
+def conflict_key(conflict_columns) -> Tuple[str, ...]:
+    if isinstance(conflict_columns, str):
+        conflict_columns = conflict_columns.split(",")
+    return tuple(column.strip() for column in conflict_columns)
+
+
+@lru_cache(maxsize=512)
+def insert_sql(table: str, columns: Tuple[str, ...]) -> str:
+    return (
+        f"INSERT INTO {quote(table)} ({', '.join(quote(c) for c in columns)}) "
+        f"VALUES ({', '.join('?' * len(columns))})"
+    )
+
+
+@lru_cache(maxsize=512)
+def upsert_sql(table: str, columns: Tuple[str, ...], conflict: Tuple[str, ...]) -> str:
+    updates = [column for column in columns if column not in conflict]
+    on_conflict = f" ON CONFLICT ({', '.join(quote(c) for c in conflict)}) DO " + (
+        "UPDATE SET " + ", ".join(f"{quote(c)} = excluded.{quote(c)}" for c in updates)
+        if updates
+        else "NOTHING"
+    )
+    return insert_sql(table, columns) + on_conflict
+
+
+@lru_cache(maxsize=512)
+def increment_sql(
+    table: str,
+    columns: Tuple[str, ...],
+    counters: Tuple[str, ...],
+    conflict: Tuple[str, ...],
+) -> str:
+    updates = [
+        *(f"{quote(c)} = {quote(c)} + excluded.{quote(c)}" for c in counters),
+        *(f"{quote(c)} = excluded.{quote(c)}" for c in columns if c not in conflict),
+    ]
+    return (
+        insert_sql(table, (*columns, *counters))
+        + f" ON CONFLICT ({', '.join(quote(c) for c in conflict)}) DO UPDATE SET "
+        + ", ".join(updates)
+    )
+
+
+class AsyncSQLiteDatabaseAdapter(AsyncBaseSQLDatabaseAdapter):
+    """
+    Runs `SQLiteDatabaseAdapter` calls on the default executor so request
+    handlers never block on disk. Every executor thread keeps its own
+    connection, which bounds the pool to the executor size.
+    """
+
+    def __init__(self, database_path: str, schema_path: Optional[str] = None):
+        self.sync_adapter = SQLiteDatabaseAdapter(database_path, schema_path)
+
+    async def insert(self, table: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.sync_adapter.insert, table, data)
+
+    async def upsert(
+        self, table: str, data: Dict[str, Any], conflict_columns=["id"]
+    ) -> Dict[str, Any]:
+        return await asyncio.to_thread(
+            self.sync_adapter.upsert, table, data, conflict_columns
+        )
+
+    async def insert_many(
+        self, table: str, rows: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.sync_adapter.insert_many, table, rows)
+
+    async def upsert_many(
+        self, table: str, rows: List[Dict[str, Any]], conflict_columns=["id"]
+    ) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(
+            self.sync_adapter.upsert_many, table, rows, conflict_columns
+        )
+
+    async def select(
+        self, table: str, columns: str = "*", filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(
+            self.sync_adapter.select, table, columns, filters
+        )
+
+    async def select_in(
+        self,
+        table: str,
+        column: str,
+        values: Iterable[Any],
+        columns: str = "*",
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(
+            self.sync_adapter.select_in, table, column, list(values), columns, filters
+        )
+
+    async def select_like(
+        self, table: str, column: str, pattern: str, columns: str = "*"
+    ) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(
+            self.sync_adapter.select_like, table, column, pattern, columns
+        )
+
+    async def update(
+        self, table: str, data: Dict[str, Any], filters: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.sync_adapter.update, table, data, filters)
+
+    async def delete(self, table: str, filters: Dict[str, Any]) -> bool:
+        return await asyncio.to_thread(self.sync_adapter.delete, table, filters)
+
+    async def health_check(self) -> bool:
+        return await asyncio.to_thread(self.sync_adapter.health_check)
+
+    async def reconnect(self) -> None:
+        self.sync_adapter.reconnect()
+
+    async def close(self) -> None:
+        self.sync_adapter.close()
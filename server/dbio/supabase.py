@@ -1,12 +1,111 @@
-from typing import Any, Dict, List, Optional
+import asyncio
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
+from postgrest import AsyncPostgrestClient
+from postgrest.utils import AsyncClient, SyncClient
 from supabase import create_client, Client
 
-from dbio.base_sql import BaseSQLDatabaseAdapter
+from dbio.base_sql import AsyncBaseSQLDatabaseAdapter, BaseSQLDatabaseAdapter
+
+# PostgREST encodes `in` filters in the query string, so long id lists are split
+# into chunks that keep the request URL well under the gateway limit.
+IN_FILTER_CHUNK_SIZE = 150
+
+# Bulk writes send rows in the request body; chunking keeps each request small
+# enough for the gateway while still writing hundreds of rows per round trip.
+BULK_WRITE_CHUNK_SIZE = 500
+
+DEFAULT_POOL_SIZE = 20
+DEFAULT_KEEPALIVE_EXPIRY_SECONDS = 60.0
+# After a reconnect, requests already sent on the old session get this long to
+# finish before it is closed.
+RECONNECT_GRACE_SECONDS = 30.0
+
+
+def on_conflict_param(conflict_columns) -> str:
+    if isinstance(conflict_columns, str):
+        return conflict_columns
+    return ",".join(conflict_columns)
+
+
+def chunked(rows: List[Dict[str, Any]], size: int) -> Iterable[List[Dict[str, Any]]]:
+    for start in range(0, len(rows), size):
+        yield rows[start : start + size]
 
 
 class SupabaseDatabaseAdapter(BaseSQLDatabaseAdapter):
-    def __init__(self, url: str, key: str):
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY_SECONDS,
+        health_check_table: str = "groups",
+    ):
         self.client: Client = create_client(url, key)
+        self.pool_size = pool_size
+        self.keepalive_expiry = keepalive_expiry
+        self.health_check_table = health_check_table
+        self._retiring: Dict[threading.Timer, SyncClient] = {}
+        self._retiring_lock = threading.Lock()
+        self._configure_session().close()
+
+    def _configure_session(self) -> SyncClient:
+        """
+        Replaces the PostgREST HTTP session with one that keeps up to `pool_size`
+        connections alive, so TCP and TLS setup is paid once per connection rather
+        than once per request. Returns the session it replaced.
+        """
+        postgrest = self.client.postgrest
+        session = postgrest.session
+        postgrest.session = SyncClient(
+            base_url=session.base_url,
+            headers=session.headers,
+            timeout=session.timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+        )
+        return session
+
+    def health_check(self) -> bool:
+        try:
+            self.client.table(self.health_check_table).select("id").limit(1).execute()
+            return True
+        except Exception as e:
+            print(f"Database health check failed: {e}")
+            return False
+
+    def _close_after_grace_period(self, session: SyncClient) -> None:
+        # Runs on the timer's own thread, which is its key in `_retiring`.
+        with self._retiring_lock:
+            self._retiring.pop(threading.current_thread(), None)
+        session.close()
+
+    def reconnect(self) -> None:
+        # New requests go to the new session straight away; closing the old one
+        # now would fail the requests still using it.
+        session = self._configure_session()
+        timer = threading.Timer(
+            RECONNECT_GRACE_SECONDS, self._close_after_grace_period, [session]
+        )
+        timer.daemon = True
+        with self._retiring_lock:
+            self._retiring[timer] = session
+        timer.start()
+
+    def close(self) -> None:
+        with self._retiring_lock:
+            retiring, self._retiring = self._retiring, {}
+        for timer, session in retiring.items():
+            timer.cancel()
+            session.close()
+        self.client.postgrest.session.close()
 
     def insert(self, table: str, data: Dict[str, Any]) -> Dict[str, Any]:
         try:
@@ -30,6 +129,34 @@ class SupabaseDatabaseAdapter(BaseSQLDatabaseAdapter):
             print(f"Error upserting data into {table}: {e}")
             return []
 
+    def insert_many(
+        self, table: str, rows: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        inserted = []
+        for chunk in chunked(rows, BULK_WRITE_CHUNK_SIZE):
+            try:
+                response = self.client.table(table).insert(chunk).execute()
+                inserted.extend(response.data or [])
+            except Exception as e:
+                print(f"Error inserting rows into {table}: {e}")
+        return inserted
+
+    def upsert_many(
+        self, table: str, rows: List[Dict[str, Any]], conflict_columns=["id"]
+    ) -> List[Dict[str, Any]]:
+        upserted = []
+        for chunk in chunked(rows, BULK_WRITE_CHUNK_SIZE):
+            try:
+                response = (
+                    self.client.table(table)
+                    .upsert(chunk, on_conflict=on_conflict_param(conflict_columns))
+                    .execute()
+                )
+                upserted.extend(response.data or [])
+            except Exception as e:
+                print(f"Error upserting rows into {table}: {e}")
+        return upserted
+
     def select(
         self, table: str, columns: str = "*", filters: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
@@ -45,6 +172,46 @@ class SupabaseDatabaseAdapter(BaseSQLDatabaseAdapter):
             print(f"Error executing select query: {e}")
         return []
 
+    def select_in(
+        self,
+        table: str,
+        column: str,
+        values: Iterable[Any],
+        columns: str = "*",
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        values = list(dict.fromkeys(values))
+        rows = []
+        for start in range(0, len(values), IN_FILTER_CHUNK_SIZE):
+            chunk = values[start : start + IN_FILTER_CHUNK_SIZE]
+            try:
+                query = self.client.table(table).select(columns).in_(column, chunk)
+                if filters:
+                    for key, value in filters.items():
+                        query = query.eq(key, value)
+                response = query.execute()
+                if response.data:
+                    rows.extend(response.data)
+            except Exception as e:
+                print(f"Error executing select in query: {e}")
+        return rows
+
+    def select_like(
+        self, table: str, column: str, pattern: str, columns: str = "*"
+    ) -> List[Dict[str, Any]]:
+        try:
+            response = (
+                self.client.table(table)
+                .select(columns)
+                .ilike(column, pattern)
+                .execute()
+            )
+            if response.data:
+                return response.data
+        except Exception as e:
+            print(f"Error executing select like query: {e}")
+        return []
+
     def update(
         self, table: str, data: Dict[str, Any], filters: Dict[str, Any]
     ) -> Dict[str, Any]:
@@ -71,3 +238,204 @@ class SupabaseDatabaseAdapter(BaseSQLDatabaseAdapter):
         except Exception as e:
             print(f"Error executing delete query: {e}")
         return []
+
+
+class AsyncSupabaseDatabaseAdapter(AsyncBaseSQLDatabaseAdapter):
+    """
+    Talks to the Supabase REST API through an async PostgREST client, so a slow
+    query suspends only the request waiting on it instead of the whole worker.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY_SECONDS,
+        health_check_table: str = "groups",
+    ):
+        self.client = AsyncPostgrestClient(
+            f"{url}/rest/v1",
+            headers={"apiKey": key, "Authorization": f"Bearer {key}"},
+        )
+        self.pool_size = pool_size
+        self.keepalive_expiry = keepalive_expiry
+        self.health_check_table = health_check_table
+        self._retiring: Dict[asyncio.Task, AsyncClient] = {}
+        self._configure_session()
+
+    def _configure_session(self) -> AsyncClient:
+        """Swaps in a new pooled session, returning the one it replaced."""
+        session = self.client.session
+        self.client.session = AsyncClient(
+            base_url=session.base_url,
+            headers=session.headers,
+            timeout=session.timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+        )
+        return session
+
+    async def insert(self, table: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            response = await self.client.table(table).insert(data).execute()
+            return response.data if response.data else []
+        except Exception as e:
+            print(f"Error inserting data into {table}: {e}")
+            return []
+
+    async def upsert(
+        self, table: str, data: Dict[str, Any], conflict_columns=["id"]
+    ) -> Dict[str, Any]:
+        try:
+            response = (
+                await self.client.table(table)
+                .upsert(data, on_conflict=conflict_columns)
+                .execute()
+            )
+            return response.data if response.data else []
+        except Exception as e:
+            print(f"Error upserting data into {table}: {e}")
+            return []
+
+    async def insert_many(
+        self, table: str, rows: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        inserted = []
+        for chunk in chunked(rows, BULK_WRITE_CHUNK_SIZE):
+            try:
+                response = await self.client.table(table).insert(chunk).execute()
+                inserted.extend(response.data or [])
+            except Exception as e:
+                print(f"Error inserting rows into {table}: {e}")
+        return inserted
+
+    async def upsert_many(
+        self, table: str, rows: List[Dict[str, Any]], conflict_columns=["id"]
+    ) -> List[Dict[str, Any]]:
+        upserted = []
+        for chunk in chunked(rows, BULK_WRITE_CHUNK_SIZE):
+            try:
+                response = (
+                    await self.client.table(table)
+                    .upsert(chunk, on_conflict=on_conflict_param(conflict_columns))
+                    .execute()
+                )
+                upserted.extend(response.data or [])
+            except Exception as e:
+                print(f"Error upserting rows into {table}: {e}")
+        return upserted
+
+    async def select(
+        self, table: str, columns: str = "*", filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        try:
+            query = self.client.table(table).select(columns)
+            if filters:
+                for key, value in filters.items():
+                    query = query.eq(key, value)
+            response = await query.execute()
+            if response.data:
+                return response.data
+        except Exception as e:
+            print(f"Error executing select query: {e}")
+        return []
+
+    async def select_in(
+        self,
+        table: str,
+        column: str,
+        values: Iterable[Any],
+        columns: str = "*",
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        values = list(dict.fromkeys(values))
+        rows = []
+        for start in range(0, len(values), IN_FILTER_CHUNK_SIZE):
+            chunk = values[start : start + IN_FILTER_CHUNK_SIZE]
+            try:
+                query = self.client.table(table).select(columns).in_(column, chunk)
+                if filters:
+                    for key, value in filters.items():
+                        query = query.eq(key, value)
+                response = await query.execute()
+                if response.data:
+                    rows.extend(response.data)
+            except Exception as e:
+                print(f"Error executing select in query: {e}")
+        return rows
+
+    async def select_like(
+        self, table: str, column: str, pattern: str, columns: str = "*"
+    ) -> List[Dict[str, Any]]:
+        try:
+            response = (
+                await self.client.table(table)
+                .select(columns)
+                .ilike(column, pattern)
+                .execute()
+            )
+            if response.data:
+                return response.data
+        except Exception as e:
+            print(f"Error executing select like query: {e}")
+        return []
+
+    async def update(
+        self, table: str, data: Dict[str, Any], filters: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        try:
+            query = self.client.table(table).update(data)
+            if filters:
+                for key, value in filters.items():
+                    query = query.eq(key, value)
+            response = await query.execute()
+            if response.data:
+                return response.data
+        except Exception as e:
+            print(f"Error executing update query: {e}")
+        return []
+
+    async def delete(self, table: str, filters: Dict[str, Any]) -> bool:
+        try:
+            response = self.client.table(table).delete()
+            for key, value in filters.items():
+                response = response.eq(key, value)
+            response = await response.execute()
+            if response.data:
+                return response.data
+        except Exception as e:
+            print(f"Error executing delete query: {e}")
+        return []
+
+    async def health_check(self) -> bool:
+        try:
+            await self.client.table(self.health_check_table).select("id").limit(
+                1
+            ).execute()
+            return True
+        except Exception as e:
+            print(f"Database health check failed: {e}")
+            return False
+
+    async def _close_after_grace_period(self, session: AsyncClient) -> None:
+        await asyncio.sleep(RECONNECT_GRACE_SECONDS)
+        await session.aclose()
+
+    async def reconnect(self) -> None:
+        # New requests go to the new session straight away; closing the old one
+        # now would fail the requests still using it.
+        session = self._configure_session()
+        task = asyncio.create_task(self._close_after_grace_period(session))
+        self._retiring[task] = session
+        task.add_done_callback(lambda task: self._retiring.pop(task, None))
+
+    async def close(self) -> None:
+        for task, session in list(self._retiring.items()):
+            task.cancel()
+            await session.aclose()
+        await self.client.session.aclose()
@@ -2,22 +2,82 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+import asyncio
 import os
 import uvicorn
 import logging
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 
 from routers.file_io import router as file_io_router
 from routers.transcribe import router as transcribe_router
 from routers.tags import router as tags_router
 from routers.annotate import router as annotate_router
-from config import load_config
+from routers.jobs import router as jobs_router
+from config import Config, load_config
+from dbio import AsyncBaseSQLDatabaseAdapter, create_async_database_adapter
+from services.exiftool import close_exiftool
+from services.files.deduplication.hash_store import HashStore
+from services.files.file_index import FileIndex
+from services.files.metadata_cache import MetadataCache
+from services.files.file_watcher import FileWatcher
+from services.jobs import JobQueue, JobStore
+
+
+async def monitor_database_health(db: AsyncBaseSQLDatabaseAdapter, interval: float):
+    """Periodically pings the database and rebuilds the connection pool on failure."""
+    logger = logging.getLogger("uvicorn")
+    while True:
+        await asyncio.sleep(interval)
+        if not await db.health_check():
+            logger.warning("Database health check failed - reconnecting")
+            await db.reconnect()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    config = Config()
+    app.state.db = create_async_database_adapter(config)
+    health_monitor = asyncio.create_task(
+        monitor_database_health(
+            app.state.db, config.database_health_check_interval_seconds
+        )
+    )
+    app.state.job_queue = JobQueue(
+        JobStore(config.jobs_database_path, config.jobs_database_schema_path),
+        app.state.db,
+        config.job_workers,
+        config.job_retention_days,
+    )
+    await app.state.job_queue.start()
+    # Shared by every request, so hashes stored by one upload are in memory
+    # for the next; the pHash index is mapped now so the first check doesn't
+    # pay for it.
+    app.state.hash_store = HashStore.from_config()
+    await asyncio.to_thread(app.state.hash_store.load_index)
+    app.state.file_watcher = FileWatcher(
+        FileIndex.from_config(),
+        config.root_paths if config.file_watcher_enabled else [],
+        app.state.job_queue,
+        config.file_watcher_debounce_seconds,
+        config.file_watcher_poll_interval_seconds,
+    )
+    await app.state.file_watcher.start()
+    try:
+        yield
+    finally:
+        health_monitor.cancel()
+        await app.state.file_watcher.stop()
+        await app.state.job_queue.stop()
+        await app.state.db.close()
+        close_exiftool()
 
 
 def create_app():
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
 
     environment = os.getenv("ENVIRONMENT", "dev")  # Default to 'development' if not set
 
@@ -36,6 +96,7 @@ def create_app():
     app.include_router(transcribe_router, prefix="/transcribe")
     app.include_router(tags_router, prefix="/tags")
     app.include_router(annotate_router, prefix="/annotations")
+    app.include_router(jobs_router, prefix="/jobs")
 
     return app
 
@@ -49,5 +110,18 @@ async def get_config():
     return load_config()
 
 
+@app.get("/health")
+async def get_health(request: Request):
+    healthy = await request.app.state.db.health_check()
+    return {"database": "ok" if healthy else "unavailable"}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "metadata_cache": await run_in_threadpool(MetadataCache.from_config().stats)
+    }
+
+
 if __name__ == "__main__":
     uvicorn.run(app="main:app", host="0.0.0.0", reload=True)
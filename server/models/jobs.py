@@ -0,0 +1,22 @@
+from enum import Enum
+from typing import Any, Optional
+from pydantic import BaseModel
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class Job(BaseModel):
+    id: str
+    task: str
+    payload: dict
+    status: JobStatus = JobStatus.QUEUED
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
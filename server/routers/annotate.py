@@ -1,11 +1,13 @@
+import asyncio
 import os
 import traceback
-from typing import List
-from fastapi import APIRouter, HTTPException, Request
+from typing import Dict, List, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Request
 
 from config import Config
-from utilities.general import get_db
-from services.thumbnail_extractor import ThumbnailExtractor
+from dbio.base_sql import AsyncBaseSQLDatabaseAdapter
+from utilities.general import get_db, get_job_queue
+from services.jobs import JobQueue
 
 
 config = Config()
@@ -19,49 +21,50 @@ Read Functions
 """
 
 
-@router.get("/group/{group_id}", response_model=dict)
-async def get_group_annotation(group_id: str):
-    db = get_db()
+# Embedded selects resolve files, descriptions and tags through their foreign
+# keys, so a group loads in two queries regardless of how many files it holds.
+GROUP_COLUMNS = "*, group_tags(tag_id)"
+GROUP_FILE_COLUMNS = "file_id, files(*, file_descriptions(*), file_tags(tag_id))"
+
+
+def build_file_annotation(file: dict) -> dict:
+    file_descriptions = file.get("file_descriptions") or [{}]
+    file_description = file_descriptions[0]
+    return {
+        "file_id": file.get("id"),
+        "uri": file.get("path"),
+        "description": file_description.get("manual_description"),
+        "date_description": file_description.get("date_description"),
+        "tags": [tag["tag_id"] for tag in file.get("file_tags") or []],
+        "annotated_at": file_description.get("created_at"),
+        "added_at": file.get("created_at"),
+        "status": "uploaded",
+        "uploaded_at": file.get("created_at"),
+        "metadata": file.get("metadata"),
+    }
+
 
-    group = db.select("groups", "*", {"id": group_id})
+@router.get("/group/{group_id}", response_model=dict)
+async def get_group_annotation(
+    group_id: str, db: AsyncBaseSQLDatabaseAdapter = Depends(get_db)
+):
+    group = await db.select("groups", GROUP_COLUMNS, {"id": group_id})
     group = group[0] if group else None
 
     if not group:
         raise HTTPException(status_code=404, detail="Group not found")
 
-    group_tags = db.select("group_tags", "*", {"group_id": group_id})
-    tags = [tag["tag_id"] for tag in group_tags]
-
-    files = db.select("file_groups", "*", {"group_id": group_id})
-    file_ids = [file["file_id"] for file in files]
+    tags = [tag["tag_id"] for tag in group.get("group_tags") or []]
 
-    file_annotations = []
-    for file_id in file_ids:
-        file = db.select("files", "*", {"id": file_id})
-        file_description = db.select("file_descriptions", "*", {"file_id": file_id})
-        file_tags = db.select("file_tags", "*", {"file_id": file_id})
-        tags = [tag["tag_id"] for tag in file_tags]
-
-        file = file[0] if file else None
-        file_description = file_description[0] if file_description else {}
-
-        if not file:
-            continue
+    file_groups = await db.select(
+        "file_groups", GROUP_FILE_COLUMNS, {"group_id": group_id}
+    )
+    file_annotations = [
+        build_file_annotation(file_group["files"])
+        for file_group in file_groups
+        if file_group.get("files")
+    ]
 
-        file_annotations.append(
-            {
-                "file_id": file_id,
-                "uri": file.get("path"),
-                "description": file_description.get("manual_description"),
-                "date_description": file_description.get("date_description"),
-                "tags": tags,
-                "annotated_at": file_description.get("created_at"),
-                "added_at": file.get("created_at"),
-                "status": "uploaded",
-                "uploaded_at": file.get("created_at"),
-                "metadata": file.get("metadata"),
-            }
-        )
     group_annotation = {
         "group_id": group_id,
         "title": group.get("title"),
@@ -78,24 +81,23 @@ async def get_group_annotation(group_id: str):
 
 
 @router.get("/groups/ids", response_model=list)
-async def get_all_group_ids():
-    db = get_db()
-
-    groups = db.select("groups", "*")
+async def get_all_group_ids(db: AsyncBaseSQLDatabaseAdapter = Depends(get_db)):
+    groups = await db.select("groups", "*")
     group_ids = [group["id"] for group in groups]
 
     return group_ids
 
 
 @router.post("/group/status", response_model=List[dict])
-async def get_group_status(request: Request):
+async def get_group_status(
+    request: Request, db: AsyncBaseSQLDatabaseAdapter = Depends(get_db)
+):
     body = await request.json()
 
     group_id = body["group_id"]
     file_ids = body["file_ids"]
 
-    db = get_db()
-    group = db.select("groups", "*", {"id": group_id})
+    group = await db.select("groups", "*", {"id": group_id})
 
     if not group:
         raise HTTPException(status_code=404, detail="Group not found")
@@ -103,8 +105,17 @@ async def get_group_status(request: Request):
     group = group[0]
     file_statuses = []
 
+    files = await db.select_in("files", "id", file_ids)
+    files_by_id = {file["id"]: file for file in files}
+
+    file_groups = await db.select_in(
+        "file_groups", "file_id", file_ids, "file_id", {"group_id": group_id}
+    )
+    grouped_file_ids = {file_group["file_id"] for file_group in file_groups}
+    missing_file_groups = []
+
     for file_id in file_ids:
-        file = db.select("files", "*", {"id": file_id})
+        file = files_by_id.get(file_id)
         if not file:
             file_statuses.append(
                 {
@@ -116,16 +127,13 @@ async def get_group_status(request: Request):
             )
             continue
 
-        file = file[0]
         file_path = file.get("path")
         exists_path = os.path.exists(file_path)
         exists_db = True
 
-        file_groups = db.select(
-            "file_groups", "*", {"file_id": file_id, "group_id": group_id}
-        )
-        if not file_groups:
-            db.insert("file_groups", {"file_id": file_id, "group_id": group_id})
+        if file_id not in grouped_file_ids:
+            missing_file_groups.append({"file_id": file_id, "group_id": group_id})
+            grouped_file_ids.add(file_id)
 
         file_data = {
             "file_id": file_id,
@@ -149,6 +157,9 @@ async def get_group_status(request: Request):
             }
         )
 
+    if missing_file_groups:
+        await db.insert_many("file_groups", missing_file_groups)
+
     return file_statuses
 
 
@@ -158,72 +169,148 @@ Write Functions
 """
 
 
+# Child tables of `files`, written together once the file rows exist.
+FILE_ANNOTATION_TABLES = ["file_descriptions", "file_tags"]
+# The columns each table's rows are unique on. One bulk upsert can't touch a
+# row twice, so only the last row per key is sent.
+FILE_ANNOTATION_KEYS = {
+    "files": ("id",),
+    "file_descriptions": ("file_id",),
+    "file_tags": ("file_id", "tag_id"),
+}
+
+
+def last_row_per_key(rows: List[dict], key: Tuple[str, ...]) -> List[dict]:
+    return list({tuple(row[column] for column in key): row for row in rows}.values())
+
+
+def build_file_annotation_rows(file: dict, path: str) -> Dict[str, List[dict]]:
+    file_id = file["file_id"]
+    return {
+        "files": [
+            {
+                "id": file_id,
+                "name": os.path.basename(file["uri"]),
+                "type": "IMAGE",
+                "path": path,
+            }
+        ],
+        "file_descriptions": [
+            {
+                "file_id": file_id,
+                "manual_description": file["description"],
+                "date_description": file.get("date_description"),
+                "generated_description": None,
+                "generated_description_model": None,
+            }
+        ],
+        "file_tags": [
+            {"file_id": file_id, "tag_id": tag["id"]} for tag in file["tags"]
+        ],
+    }
+
+
+def thumbnail_job_payload(file: dict, path: str) -> dict:
+    # Files annotated along with their video metadata already know their
+    # duration, which saves the thumbnail job an ffprobe call.
+    metadata = file.get("metadata") or {}
+    return {
+        "file_id": file["file_id"],
+        "path": path,
+        "duration": metadata.get("duration"),
+    }
+
+
+async def write_file_annotation_rows(
+    db: AsyncBaseSQLDatabaseAdapter, rows: Dict[str, List[dict]]
+) -> None:
+    """Sends one bulk write per table, however many files `rows` covers."""
+    rows = {
+        table: last_row_per_key(table_rows, FILE_ANNOTATION_KEYS[table])
+        for table, table_rows in rows.items()
+    }
+    await db.upsert_many("files", rows["files"])
+    await asyncio.gather(
+        *(
+            db.upsert_many(table, rows[table])
+            for table in FILE_ANNOTATION_TABLES
+            if rows[table]
+        )
+    )
+
+
 @router.post("/insert/file", response_model=dict)
-async def insert_file_annotation(request: Request):
+async def insert_file_annotation(
+    request: Request,
+    db: AsyncBaseSQLDatabaseAdapter = Depends(get_db),
+    job_queue: JobQueue = Depends(get_job_queue),
+):
     try:
-        db = get_db()
-
         body = await request.json()
         file, path = body["file"], body["path"]
 
         if not file or not path:
             raise HTTPException(status_code=400, detail="File or path is required")
 
-        file_id = file["file_id"]
-        file_uri = file["uri"]
-        file_description = file["description"]
-        date_description = file.get("date_description")
-        file_tags = file["tags"]
+        await write_file_annotation_rows(db, build_file_annotation_rows(file, path))
+        job = await job_queue.submit("thumbnails", thumbnail_job_payload(file, path))
 
-        thumbnail_extractor = ThumbnailExtractor(
-            media_path=path, output_dir=config.thumbnails_dir
-        )
-        thumbnail_paths = thumbnail_extractor.extract()
-        thumbnail_paths = thumbnail_paths if thumbnail_paths else []
-
-        file_data = {
-            "id": file_id,
-            "name": os.path.basename(file_uri),
-            "type": "IMAGE",
-            "path": path,
+        print("File and related data inserted successfully")
+        return {
+            "message": "File and related data inserted successfully",
+            "thumbnail_job_id": job.id,
         }
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail="Internal Server Error")
 
-        db.upsert("files", file_data)
-
-        for thumbnail_path in thumbnail_paths:
-            db.upsert(
-                "file_thumbnails",
-                {
-                    "file_id": file_id,
-                    "thumbnail_path": thumbnail_path,
-                },
-            )
-
-        file_description_data = {
-            "file_id": file_id,
-            "manual_description": file_description,
-            "date_description": date_description,
-            "generated_description": None,
-            "generated_description_model": None,
-        }
 
-        db.upsert("file_descriptions", file_description_data)
+@router.post("/insert/files", response_model=dict)
+async def insert_file_annotations(
+    request: Request,
+    db: AsyncBaseSQLDatabaseAdapter = Depends(get_db),
+    job_queue: JobQueue = Depends(get_job_queue),
+):
+    """
+    Bulk import: takes `{"files": [{"file": ..., "path": ...}, ...]}` and writes
+    every annotation with one request per table.
+    """
+    body = await request.json()
+    annotations = body.get("files", [])
 
-        for tag in file_tags:
-            file_tag_data = {"file_id": file_id, "tag_id": tag["id"]}
-            db.upsert("file_tags", file_tag_data)
+    if any(not item.get("file") or not item.get("path") for item in annotations):
+        raise HTTPException(status_code=400, detail="File or path is required")
 
-        print("File and related data inserted successfully")
-        return {"message": "File and related data inserted successfully"}
+    try:
+        rows = {table: [] for table in ["files", *FILE_ANNOTATION_TABLES]}
+        for item in annotations:
+            file_rows = build_file_annotation_rows(item["file"], item["path"])
+            for table, table_rows in file_rows.items():
+                rows[table].extend(table_rows)
+
+        await write_file_annotation_rows(db, rows)
+        jobs = [
+            await job_queue.submit(
+                "thumbnails", thumbnail_job_payload(item["file"], item["path"])
+            )
+            for item in annotations
+        ]
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+    print(f"{len(annotations)} files and related data inserted successfully")
+    return {
+        "message": "Files and related data inserted successfully",
+        "count": len(annotations),
+        "thumbnail_job_ids": [job.id for job in jobs],
+    }
 
-@router.post("/update/file_descriptions", response_model=dict)
-async def update_file_annotation(request: Request):
-    db = get_db()
 
+@router.post("/update/file_descriptions", response_model=dict)
+async def update_file_annotation(
+    request: Request, db: AsyncBaseSQLDatabaseAdapter = Depends(get_db)
+):
     file = await request.json()
 
     file_id = file["file_id"]
@@ -238,7 +325,7 @@ async def update_file_annotation(request: Request):
         "generated_description_model": None,
     }
 
-    response = db.update(
+    response = await db.update(
         "file_descriptions", file_description_data, {"file_id": file_id}
     )
     print(response)
@@ -246,44 +333,43 @@ async def update_file_annotation(request: Request):
 
 
 @router.post("/update/file_tags", response_model=dict)
-async def update_file_tags(request: Request):
-    db = get_db()
-
+async def update_file_tags(
+    request: Request, db: AsyncBaseSQLDatabaseAdapter = Depends(get_db)
+):
     file = await request.json()
     file_id = file["file_id"]
     file_tags = file["tags"]
 
-    db.delete("file_tags", {"file_id": file_id})
-
-    for tag in file_tags:
-        file_tag_data = {"file_id": file_id, "tag_id": tag["id"]}
-        db.upsert("file_tags", file_tag_data)
+    await db.delete("file_tags", {"file_id": file_id})
+    await db.insert_many(
+        "file_tags", [{"file_id": file_id, "tag_id": tag["id"]} for tag in file_tags]
+    )
 
     return {"message": "File tags updated successfully"}
 
 
 @router.post("/delete/file", response_model=dict)
-async def delete_file_annotation(request: Request):
-    db = get_db()
-
+async def delete_file_annotation(
+    request: Request, db: AsyncBaseSQLDatabaseAdapter = Depends(get_db)
+):
     body = await request.json()
     file_id = body["file_id"]
 
-    file_record = db.select("files", "path", {"id": file_id})
+    file_record = await db.select("files", "path", {"id": file_id})
 
     if file_record:
         file_path = file_record[0]["path"]
         os.remove(file_path)
-        db.delete("files", {"id": file_id})
+        await db.delete("files", {"id": file_id})
         return {"message": "File deleted successfully"}
 
     return {"message": "File not found"}
 
 
 @router.post("/insert/group", response_model=dict)
-async def insert_group_annotation(request: Request):
-    db = get_db()
-
+async def insert_group_annotation(
+    request: Request, db: AsyncBaseSQLDatabaseAdapter = Depends(get_db)
+):
     body = await request.json()
     group_id = body["group_id"]
 
@@ -299,20 +385,20 @@ async def insert_group_annotation(request: Request):
         "date_description": date_description,
     }
 
-    db.upsert("groups", group_data)
-
-    for tag in tags:
-        group_tag_data = {"group_id": group_id, "tag_id": tag["id"]}
-        db.upsert("group_tags", group_tag_data)
+    await db.upsert("groups", group_data)
+    await db.upsert_many(
+        "group_tags", [{"group_id": group_id, "tag_id": tag["id"]} for tag in tags]
+    )
 
     print("Group inserted successfully")
     return {"message": "Group inserted successfully"}
 
 
 @router.post("/insert/file_groups", response_model=dict)
-async def insert_file_groups(request: Request):
+async def insert_file_groups(
+    request: Request, db: AsyncBaseSQLDatabaseAdapter = Depends(get_db)
+):
     print("inserting file groups!")
-    db = get_db()
 
     body = await request.json()
 
@@ -320,15 +406,14 @@ async def insert_file_groups(request: Request):
     cover_image_file_id = body.get("cover_image_file_id")
     file_ids = [file["file_id"] for file in body.get("files", [])]
 
-    for file_id in file_ids:
-        try:
-            group_file_data = {"group_id": group_id, "file_id": file_id}
-            db.upsert("file_groups", group_file_data)
-
-            if file_id == cover_image_file_id:
-                db.upsert("groups", {"cover_image_file_id": file_id}, {"id": group_id})
+    await db.upsert_many(
+        "file_groups",
+        [{"group_id": group_id, "file_id": file_id} for file_id in file_ids],
+    )
 
-        except Exception as e:
-            print(f"file_id {file_id}: Failed to insert file group data: {e}")
+    if cover_image_file_id in file_ids:
+        await db.update(
+            "groups", {"cover_image_file_id": cover_image_file_id}, {"id": group_id}
+        )
 
     return {"message": "File groups inserted successfully"}
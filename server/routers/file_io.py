@@ -1,26 +1,48 @@
-import datetime
+import itertools
 import json
 import os
 import shutil
-from typing import List
-import mimetypes
+from typing import Any, Dict, List, Optional
 
 from fastapi import (
     Request,
     APIRouter,
+    Depends,
     HTTPException,
-    UploadFile,
     HTTPException,
-    Form,
-    File,
+    Header,
+    Query,
+    Response,
 )
 
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.requests import ClientDisconnect
 
 from pydantic import BaseModel
-import subprocess
 
-from utilities.general import get_db
+from dbio.base_sql import AsyncBaseSQLDatabaseAdapter
+from services.exiftool import ExifToolError, get_exiftool
+from services.files.deduplication.hash_store import DuplicateCheck, HashStore
+from services.files.directory_file_organizer import DirectoryFileOrganizer
+from services.files.directory_listing import (
+    LISTING_PAGE_SIZE,
+    paginate,
+    walk_directory,
+)
+from services.files.uploads import (
+    MAX_FORM_FIELDS_BYTES,
+    ResumableUploads,
+    UploadOffsetMismatch,
+    UploadSession,
+    UploadTooLarge,
+    hash_file,
+    move_into_place,
+    receive_multipart_upload,
+    secure_filename,
+)
+from services.thumbnail_extractor import ThumbnailExtractor
+from utilities.general import generate_id, get_db, get_hash_store
 
 
 # TODO remove this completely and utilize a partial type from tables
@@ -33,10 +55,13 @@ class FileItemModel(BaseModel):
     modified_at: str
     is_directory: bool
     name: str
+    path: str
+    cursor: str
 
 
 from config import (
     ANNOTATED_FILES_DIR,
+    Config,
     DATA_DIR,
     IMAGE_FILE_TYPES,
     MAX_FILE_UPLOAD_SIZE_BYTES,
@@ -44,6 +69,8 @@ from config import (
     AUDIO_FILE_TYPES,
     TEXT_FILE_TYPES,
     DATA_FILE_TYPES,
+    THUMBNAILS_DIR,
+    UPLOADS_DIR,
     load_config,
 )
 
@@ -59,51 +86,50 @@ ALLOWED_FILE_TYPES = (
 router = APIRouter()
 
 
-async def gather_file_details(full_path: str, item: str) -> dict:
-    """Gathers details of a file or directory."""
-    file_info = os.stat(full_path)
-    mime_type, _ = mimetypes.guess_type(full_path)
-    return {
-        "name": item,
-        "is_directory": os.path.isdir(full_path),
-        "generic_file_type": mime_type.split("/")[0] if mime_type else "unknown",
-        "specific_file_type": mime_type if mime_type else "unknown",
-        "size_bytes": file_info.st_size,
-        "added_at": datetime.datetime.fromtimestamp(file_info.st_ctime).strftime(
-            "%Y-%m-%d %H:%M:%S"
-        ),
-        "created_at": datetime.datetime.fromtimestamp(file_info.st_ctime).strftime(
-            "%Y-%m-%d %H:%M:%S"
-        ),
-        "modified_at": datetime.datetime.fromtimestamp(file_info.st_mtime).strftime(
-            "%Y-%m-%d %H:%M:%S"
-        ),
-    }
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
 
 
-async def list_directory_contents(path: str, recursive: bool = False) -> List[dict]:
-    """Lists contents of a directory, optionally recursively."""
-    files_details = []
+async def list_directory(
+    request: Request,
+    path: str,
+    max_depth: Optional[int],
+    limit: Optional[int],
+    cursor: Optional[str],
+) -> Response:
+    """
+    Lists `path` from a worker thread, a page of entries at a time. Clients
+    that accept NDJSON get one entry per line as the walk goes; everyone else
+    gets a JSON array. Every entry carries a `cursor` to resume after it.
+    """
+    try:
+        entries = walk_directory(path, max_depth, cursor)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Directory not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if limit is not None:
+        entries = itertools.islice(entries, limit)
+    pages = iterate_in_threadpool(paginate(entries, LISTING_PAGE_SIZE))
 
-    async def _list_contents(inner_path: str):
-        try:
-            for item in os.listdir(inner_path):
-                full_path = os.path.join(inner_path, item)
-                if os.path.isdir(full_path):
-                    files_details.append(await gather_file_details(full_path, item))
-                    if recursive:
-                        await _list_contents(full_path)
-                else:
-                    files_details.append(await gather_file_details(full_path, item))
-        except FileNotFoundError:
-            raise HTTPException(status_code=404, detail="Directory not found")
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+
+        async def lines():
+            async for page in pages:
+                yield "".join(json.dumps(entry) + "\n" for entry in page)
 
-    await _list_contents(path)
-    return files_details
+        return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+    return JSONResponse([entry async for page in pages for entry in page])
 
 
 @router.get("/read-dir/", response_model=List[FileItemModel])
-async def read_dir(request: Request, path: str):
+async def read_dir(
+    request: Request,
+    path: str,
+    max_depth: int = Query(1, ge=1),
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+):
     """Reads the contents of a directory and returns file details."""
     config = load_config()
     root_paths = config.get("root_paths", [])
@@ -111,38 +137,39 @@ async def read_dir(request: Request, path: str):
     if not any(path.startswith(root_path) for root_path in root_paths):
         raise HTTPException(status_code=403, detail="Access denied")
 
-    try:
-        directory_contents = await list_directory_contents(path, recursive=False)
-        return directory_contents
-    except FileNotFoundError:
-        raise HTTPException(status_code=404, detail="Directory not found")
+    return await list_directory(request, path, max_depth, limit, cursor)
 
 
 @router.get("/list-files-recursive/", response_model=List[FileItemModel])
-async def list_files_recursive(request: Request, path: str):
+async def list_files_recursive(
+    request: Request,
+    path: str,
+    max_depth: Optional[int] = Query(None, ge=1),
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+):
     """Lists all files in a directory recursively and returns their details."""
-    try:
-        directory_contents = await list_directory_contents(path, recursive=True)
-        return directory_contents
-    except FileNotFoundError:
-        raise HTTPException(status_code=404, detail="Directory not found")
+    return await list_directory(request, path, max_depth, limit, cursor)
 
 
 @router.get("/file-exists/")
-async def file_exists(path: str = None, file_id: str = None):
+async def file_exists(
+    path: str = None,
+    file_id: str = None,
+    db: AsyncBaseSQLDatabaseAdapter = Depends(get_db),
+):
     if not path and not file_id:
         print("file_exists: either path or file_id must be provided")
         raise HTTPException(
             status_code=400, detail="Either path or file_id must be provided"
         )
 
-    db = get_db()
     file = None
     if file_id:
-        file = db.select("files", "path", {"id": file_id})
+        file = await db.select("files", "path", {"id": file_id})
         path = file[0].get("path") if file else None
     elif path:
-        file = db.select("files", "path", {"path": path})
+        file = await db.select("files", "path", {"path": path})
 
     db_path = file[0].get("path") if file else None
 
@@ -166,18 +193,38 @@ async def get_file(path: str):
 
 
 @router.get("/get-path-from-file-id")
-async def get_uri_from_file_id(file_id: str):
-    db = get_db()
-    path = db.select("files", "path", {"id": file_id})
+async def get_uri_from_file_id(
+    file_id: str, db: AsyncBaseSQLDatabaseAdapter = Depends(get_db)
+):
+    path = await db.select("files", "path", {"id": file_id})
     if not path:
         return {"error": "File not found"}
     return {"path": path[0].get("path")}
 
 
 @router.get("/get-thumbnail-from-file-id")
-async def get_thumbnail_from_file_id(file_id: str):
-    db = get_db()
-    thumbnail_path = db.select(
+async def get_thumbnail_from_file_id(
+    file_id: str,
+    size: Optional[int] = None,
+    db: AsyncBaseSQLDatabaseAdapter = Depends(get_db),
+):
+    if size:
+        file = await db.select("files", "path", {"id": file_id})
+        if not file or not os.path.exists(file[0]["path"]):
+            return {"error": "File not found"}
+        thumbnail_extractor = ThumbnailExtractor(
+            media_path=file[0]["path"], output_dir=THUMBNAILS_DIR
+        )
+        try:
+            thumbnail_path = await run_in_threadpool(
+                thumbnail_extractor.rendition, size
+            )
+        except Exception as e:
+            print(f"Error extracting thumbnail for {file_id}: {e}")
+            return {"error": "Thumbnail not available"}
+        return {"thumbnail_path": thumbnail_path}
+
+    thumbnail_path = await db.select(
         "file_thumbnails", "thumbnail_path", {"file_id": file_id}
     )
     if not thumbnail_path:
@@ -185,56 +232,277 @@ async def get_thumbnail_from_file_id(file_id: str):
     return {"thumbnail_path": thumbnail_path[0].get("thumbnail_path")}
 
 
+async def write_upload_metadata(file_path: str, metadata: str) -> None:
+    try:
+        await run_in_threadpool(
+            get_exiftool().write_tags, file_path, json.loads(metadata)
+        )
+    except (json.JSONDecodeError, ExifToolError, OSError) as e:
+        print("Error adding metadata:", e)
+
+
+async def check_upload_duplicates(
+    hash_store: HashStore, path: str, sha256: str, destination_path: str
+) -> Optional[DuplicateCheck]:
+    """
+    Looks a received upload up in the hash store before it is moved to
+    `destination_path`. Exact copies are rejected with a 409 when
+    `upload_duplicates` is "reject"; otherwise matches are only reported.
+    """
+    action = Config().upload_duplicates
+    if action == "off":
+        return None
+    file_type = DirectoryFileOrganizer.get_file_type(destination_path.split(".")[-1])
+    try:
+        check = await run_in_threadpool(
+            hash_store.check_file,
+            path,
+            sha256,
+            destination_path,
+            file_type,
+        )
+    except Exception as e:
+        print("Error checking upload for duplicates:", e)
+        return None
+    if action == "reject" and check.exact_matches:
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "message": "File already exists",
+                "exact_matches": check.exact_matches,
+            },
+        )
+    return check
+
+
+async def record_upload_hashes(
+    hash_store: HashStore,
+    file_path: str,
+    check: Optional[DuplicateCheck],
+    rewritten: bool,
+):
+    """
+    Stores the hashes of an upload once it is in place. When its metadata
+    was written, the file no longer has the received bytes, so its sha256 is
+    taken again; the pixels, and so the perceptual hashes, are unchanged.
+    """
+    if check is None:
+        return
+    try:
+        if rewritten:
+            content_hash = await run_in_threadpool(hash_file, file_path)
+            check = check.model_copy(update={"content_hash": content_hash.hexdigest()})
+        await run_in_threadpool(hash_store.add_file, file_path, check)
+    except Exception as e:
+        print("Error storing upload hashes:", e)
+
+
+def duplicates_content(check: Optional[DuplicateCheck]) -> Dict[str, Any]:
+    if check is None:
+        return {}
+    return {
+        "duplicates": {"exact_matches": check.exact_matches, "similar": check.similar}
+    }
+
+
+def upload_too_large() -> HTTPException:
+    limit_mb = MAX_FILE_UPLOAD_SIZE_BYTES // (1024 * 1024)
+    return HTTPException(
+        status_code=413, detail=f"File size exceeds limit of {limit_mb}MB"
+    )
+
+
+def check_file_type(filename: str) -> None:
+    if filename.split(".")[-1] not in ALLOWED_FILE_TYPES:
+        raise HTTPException(status_code=400, detail="File type not allowed")
+
+
 @router.post("/upload-file/")
 async def upload_file(
-    file: UploadFile = File(...), metadata: str = Form(...), file_id: str = Form(...)
+    request: Request, hash_store: HashStore = Depends(get_hash_store)
 ):
+    """
+    Takes a multipart form with `file`, `metadata` and `file_id`. The body is
+    parsed as it arrives rather than spooled by Starlette first, so an
+    oversized upload is refused with a 413 as soon as it passes the limit.
+    """
     print("Uploading file...")
-    file_size = len(await file.read())
+    content_length = request.headers.get("content-length")
+    if (
+        content_length
+        and content_length.isdigit()
+        and int(content_length) > MAX_FILE_UPLOAD_SIZE_BYTES + MAX_FORM_FIELDS_BYTES
+    ):
+        print("file_size > MAX_FILE_UPLOAD_SIZE_BYTES")
+        raise upload_too_large()
 
-    if file_size > MAX_FILE_UPLOAD_SIZE_BYTES:
+    # Stream into a temp file next to the other uploads, then rename, so a
+    # failed or oversized upload never leaves a partial file in place.
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    tmp_path = os.path.join(UPLOADS_DIR, f"{generate_id()}.part")
+    try:
+        upload = await receive_multipart_upload(
+            request.headers.get("content-type", ""),
+            request.stream(),
+            tmp_path,
+            MAX_FILE_UPLOAD_SIZE_BYTES,
+            check_file_type,
+        )
+        metadata = upload.fields.get("metadata")
+        if metadata is None or "file_id" not in upload.fields:
+            raise HTTPException(
+                status_code=422, detail="file, metadata and file_id are required"
+            )
+        filename = secure_filename(upload.filename)
+        file_path = os.path.join(ANNOTATED_FILES_DIR, filename)
+        check = await check_upload_duplicates(
+            hash_store, tmp_path, upload.sha256, file_path
+        )
+        await run_in_threadpool(move_into_place, tmp_path, file_path)
+    except UploadTooLarge:
         print("file_size > MAX_FILE_UPLOAD_SIZE_BYTES")
-        raise HTTPException(status_code=413, detail="File size exceeds limit of 10MB")
+        raise upload_too_large()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ClientDisconnect:
+        return Response(status_code=400)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    await write_upload_metadata(file_path, metadata)
+    await record_upload_hashes(hash_store, file_path, check, rewritten=True)
+
+    return JSONResponse(
+        status_code=200,
+        content={
+            "message": "File uploaded successfully",
+            "filename": filename,
+            "path": file_path,
+            "size_bytes": upload.size,
+            "sha256": upload.sha256,
+            **duplicates_content(check),
+        },
+    )
+
+
+"""
+
+Resumable uploads: POST /uploads/ opens a session for a file of known size,
+PATCH /uploads/{id} appends the request body at the `Upload-Offset` header,
+and HEAD or GET /uploads/{id} report the offset to resume from after a
+dropped connection.
+
+"""
+
+
+class UploadSessionRequest(BaseModel):
+    filename: str
+    size: int
+    metadata: Optional[str] = None
+    file_id: Optional[str] = None
 
-    await file.seek(0)
 
-    file_extension = file.filename.split(".")[-1]
+resumable_uploads = ResumableUploads(UPLOADS_DIR, MAX_FILE_UPLOAD_SIZE_BYTES)
+
+
+def get_upload_session(upload_id: str) -> UploadSession:
+    session = resumable_uploads.get(upload_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+
+@router.post("/uploads/", response_model=UploadSession)
+async def create_upload(body: UploadSessionRequest):
+    file_extension = body.filename.split(".")[-1]
     if file_extension not in ALLOWED_FILE_TYPES:
         raise HTTPException(status_code=400, detail="File type not allowed")
+    try:
+        return resumable_uploads.create(
+            body.filename, body.size, body.metadata, body.file_id
+        )
+    except UploadTooLarge:
+        raise upload_too_large()
 
-    secure_filename = file.filename.replace("..", "").replace("/", "").replace("\\", "")
-    file_path = os.path.join(ANNOTATED_FILES_DIR, secure_filename)
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
-    with open(file_path, "wb") as buffer:
-        while True:
-            chunk = await file.read(1024)  # Read in chunks of 1024 bytes
-            if not chunk:
-                break
-            buffer.write(chunk)
+@router.head("/uploads/{upload_id}")
+@router.get("/uploads/{upload_id}", response_model=UploadSession)
+async def get_upload(upload_id: str):
+    session = get_upload_session(upload_id)
+    return JSONResponse(
+        content=session.model_dump(),
+        headers={"Upload-Offset": str(session.offset)},
+    )
+
 
+@router.patch("/uploads/{upload_id}")
+async def append_upload(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(...),
+    hash_store: HashStore = Depends(get_hash_store),
+):
+    session = get_upload_session(upload_id)
     try:
-        metadata_dict = json.loads(metadata)
-        metadata_args = []
-        for key, value in metadata_dict.items():
-            if isinstance(value, list):
-                value = ",".join(map(str, value))
-            metadata_args.append(f"-{key}={value}")
-
-        subprocess.run(["exiftool", *metadata_args, file_path])
-    except (json.JSONDecodeError, subprocess.CalledProcessError) as e:
-        print("Error adding metadata:", e)
+        session = await resumable_uploads.append(
+            session, upload_offset, request.stream()
+        )
+    except UploadOffsetMismatch as e:
+        raise HTTPException(
+            status_code=409,
+            detail=str(e),
+            headers={"Upload-Offset": str(e.expected)},
+        )
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="Upload exceeds its declared size")
+    except ClientDisconnect:
+        # Everything received so far is kept; the client resumes from HEAD.
+        return Response(status_code=400)
+
+    headers = {"Upload-Offset": str(session.offset)}
+    if session.offset < session.size:
+        return JSONResponse(
+            content={**session.model_dump(), "complete": False}, headers=headers
+        )
+
+    file_path = os.path.join(ANNOTATED_FILES_DIR, session.filename)
+    sha256 = await run_in_threadpool(resumable_uploads.content_hash, session)
+    try:
+        check = await check_upload_duplicates(
+            hash_store, resumable_uploads.part_path(session.id), sha256, file_path
+        )
+    except HTTPException:
+        resumable_uploads.discard(session.id)
+        raise
+    await run_in_threadpool(resumable_uploads.complete, session, file_path)
+    if session.metadata:
+        await write_upload_metadata(file_path, session.metadata)
+    await record_upload_hashes(
+        hash_store, file_path, check, rewritten=bool(session.metadata)
+    )
 
     return JSONResponse(
-        status_code=200,
+        headers=headers,
         content={
             "message": "File uploaded successfully",
-            "filename": secure_filename,
+            "filename": session.filename,
             "path": file_path,
+            "size_bytes": session.size,
+            "sha256": sha256,
+            "complete": True,
+            **duplicates_content(check),
         },
     )
 
 
+@router.delete("/uploads/{upload_id}")
+async def cancel_upload(upload_id: str):
+    get_upload_session(upload_id)
+    resumable_uploads.discard(upload_id)
+    return {"message": "Upload cancelled"}
+
+
 # Consider adding routes for:
 # - Creating directories
 # - Writing to files
@@ -0,0 +1,37 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+from models.jobs import Job, JobStatus
+from services.jobs import JobQueue
+from utilities.general import get_job_queue
+
+router = APIRouter()
+
+
+@router.get("/", response_model=List[Job])
+async def list_jobs(
+    status: Optional[JobStatus] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    job_queue: JobQueue = Depends(get_job_queue),
+):
+    """The most recently created jobs, optionally only those with `status`."""
+    return await job_queue.list(status, limit)
+
+
+@router.get("/{job_id}", response_model=Job)
+async def get_job(job_id: str, job_queue: JobQueue = Depends(get_job_queue)):
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("/{task}", response_model=Job)
+async def submit_job(
+    task: str, request: Request, job_queue: JobQueue = Depends(get_job_queue)
+):
+    payload = await request.json()
+    try:
+        return await job_queue.submit(task, payload)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown task: {task}")
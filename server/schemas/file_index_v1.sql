@@ -0,0 +1,30 @@
+-- Persistent index of the files under the configured root paths. Directories
+-- keep the mtime they had when last listed, so a rescan only lists the ones
+-- whose entries changed; files keep size/mtime/inode to tell whether their
+-- content hash is still valid.
+
+CREATE TABLE IF NOT EXISTS indexed_directories (
+    path TEXT NOT NULL PRIMARY KEY,
+    parent TEXT,
+    mtime REAL NOT NULL,
+    scanned_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS indexed_directories_parent_idx
+    ON indexed_directories (parent);
+
+CREATE TABLE IF NOT EXISTS indexed_files (
+    path TEXT NOT NULL PRIMARY KEY,
+    directory TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    inode INTEGER NOT NULL,
+    content_hash TEXT,
+    file_type TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS indexed_files_directory_idx ON indexed_files (directory);
+CREATE INDEX IF NOT EXISTS indexed_files_size_idx ON indexed_files (size);
+CREATE INDEX IF NOT EXISTS indexed_files_content_hash_idx ON indexed_files (content_hash);
+CREATE INDEX IF NOT EXISTS indexed_files_file_type_idx ON indexed_files (file_type);
@@ -0,0 +1,23 @@
+-- Content and perceptual hashes per file, valid while the file's stat
+-- fingerprint (size, mtime, inode) is unchanged. `phash` and `dhash` are hex
+-- strings; `video_signature` is a JSON object with the frame sample
+-- `interval` in seconds and the per-frame pHashes as hex in `frames`, null
+-- for frames too flat to hash.
+
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT NOT NULL PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    inode INTEGER NOT NULL,
+    content_hash TEXT,
+    phash TEXT,
+    dhash TEXT,
+    video_signature JSON,
+    hashed_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS file_hashes_content_hash_idx
+    ON file_hashes (content_hash);
+
+CREATE INDEX IF NOT EXISTS file_hashes_hashed_at_idx
+    ON file_hashes (hashed_at);
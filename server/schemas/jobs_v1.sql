@@ -0,0 +1,19 @@
+-- Background job state, kept in its own SQLite file next to the data
+-- directory so queued work survives restarts whichever backend is active.
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT NOT NULL PRIMARY KEY,
+    task TEXT NOT NULL,
+    payload JSON NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    result JSON,
+    error TEXT,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at DATETIME,
+    finished_at DATETIME
+);
+
+CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs (status);
+-- Listing sorts by creation time and pruning deletes by finish time.
+CREATE INDEX IF NOT EXISTS jobs_created_at_idx ON jobs (created_at);
+CREATE INDEX IF NOT EXISTS jobs_finished_at_idx ON jobs (finished_at);
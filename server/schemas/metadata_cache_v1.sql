@@ -0,0 +1,26 @@
+-- Extracted file metadata, keyed by path and reused while the file's stat
+-- fingerprint (size, mtime, inode) is unchanged. Rows written by an older
+-- `schema_version` of the extractors are treated as misses.
+
+CREATE TABLE IF NOT EXISTS metadata_cache (
+    path TEXT NOT NULL PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    inode INTEGER NOT NULL,
+    content_hash TEXT,
+    schema_version INTEGER NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata JSON NOT NULL,
+    extracted_at REAL NOT NULL
+);
+
+-- Hit/miss totals. Every process that uses the cache adds its counts to a
+-- single row with an atomic upsert, so concurrent flushes don't lose counts.
+-- Databases written before that may still hold one row per flush, which
+-- `MetadataCache.stats` sums.
+CREATE TABLE IF NOT EXISTS metadata_cache_stats (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    hits INTEGER NOT NULL,
+    misses INTEGER NOT NULL,
+    flushed_at REAL NOT NULL
+);
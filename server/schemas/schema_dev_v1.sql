@@ -0,0 +1,136 @@
+-- SQLite schema mirroring the Supabase migrations in supabase/migrations.
+-- UUID keys are stored as text; JSON columns are declared JSON so the adapter
+-- decodes them back into Python objects.
+
+CREATE TABLE IF NOT EXISTS files (
+    id TEXT NOT NULL PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
+    name TEXT,
+    type TEXT NOT NULL CHECK (
+        type IN ('IMAGE', 'VIDEO', 'TEXT', 'AUDIO', 'ARCHIVE', 'DOCUMENT', 'OTHER')
+    ),
+    path TEXT NOT NULL,
+    metadata JSON,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS files_path_idx ON files (path);
+
+CREATE TABLE IF NOT EXISTS file_metadata (
+    id TEXT NOT NULL PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
+    file_id TEXT NOT NULL REFERENCES files (id) ON UPDATE CASCADE ON DELETE CASCADE,
+    size NUMERIC,
+    created_at DATETIME NOT NULL,
+    modified_at DATETIME NOT NULL,
+    image_width NUMERIC,
+    image_height NUMERIC,
+    image_color_mode TEXT,
+    image_format TEXT,
+    image_properties JSON,
+    image_xmp_data JSON,
+    image_location JSON,
+    video_duration NUMERIC,
+    video_width NUMERIC,
+    video_height NUMERIC,
+    video_framerate NUMERIC,
+    video_codec TEXT,
+    video_bitrate NUMERIC,
+    video_properties JSON,
+    video_location JSON,
+    text_num_words NUMERIC,
+    text_language TEXT,
+    text_encoding TEXT,
+    audio_bitrate NUMERIC,
+    audio_duration NUMERIC,
+    audio_sample_rate NUMERIC,
+    audio_channels NUMERIC,
+    audio_codec TEXT,
+    archive_num_files NUMERIC,
+    archive_compression_type TEXT,
+    archive_encrypted BOOLEAN,
+    document_num_pages NUMERIC,
+    document_author TEXT,
+    document_title TEXT,
+    document_language TEXT
+);
+
+CREATE INDEX IF NOT EXISTS file_metadata_file_id_idx ON file_metadata (file_id);
+
+CREATE TABLE IF NOT EXISTS file_thumbnails (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_id TEXT NOT NULL REFERENCES files (id) ON UPDATE CASCADE ON DELETE CASCADE,
+    thumbnail_path TEXT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS file_thumbnails_file_id_idx ON file_thumbnails (file_id);
+
+CREATE TABLE IF NOT EXISTS file_annotations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_id TEXT NOT NULL REFERENCES files (id) ON UPDATE CASCADE ON DELETE CASCADE,
+    category TEXT NOT NULL,
+    sub_category TEXT NOT NULL,
+    detail TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS file_annotations_file_id_idx ON file_annotations (file_id);
+
+CREATE TABLE IF NOT EXISTS file_descriptions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_id TEXT NOT NULL REFERENCES files (id) ON UPDATE CASCADE ON DELETE CASCADE,
+    manual_description TEXT,
+    date_description TEXT,
+    generated_description TEXT,
+    generated_description_model TEXT,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS file_descriptions_file_id_idx ON file_descriptions (file_id);
+
+CREATE TABLE IF NOT EXISTS tags (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tag TEXT NOT NULL UNIQUE,
+    featured BOOLEAN,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS file_tags (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_id TEXT NOT NULL REFERENCES files (id) ON UPDATE CASCADE ON DELETE CASCADE,
+    tag_id INTEGER NOT NULL REFERENCES tags (id) ON UPDATE CASCADE ON DELETE CASCADE,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS file_tags_file_id_idx ON file_tags (file_id);
+
+CREATE TABLE IF NOT EXISTS groups (
+    id TEXT NOT NULL PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
+    title TEXT,
+    description TEXT,
+    date_description TEXT,
+    cover_image_file_id TEXT,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS group_tags (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_id TEXT NOT NULL REFERENCES groups (id) ON UPDATE CASCADE ON DELETE CASCADE,
+    tag_id INTEGER NOT NULL REFERENCES tags (id) ON UPDATE CASCADE ON DELETE CASCADE,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS group_tags_group_id_idx ON group_tags (group_id);
+
+CREATE TABLE IF NOT EXISTS file_groups (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_id TEXT NOT NULL REFERENCES files (id) ON UPDATE CASCADE ON DELETE CASCADE,
+    group_id TEXT NOT NULL REFERENCES groups (id) ON UPDATE CASCADE ON DELETE CASCADE,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS file_groups_group_id_idx ON file_groups (group_id);
+CREATE INDEX IF NOT EXISTS file_groups_file_id_idx ON file_groups (file_id);
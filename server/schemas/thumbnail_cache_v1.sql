@@ -0,0 +1,25 @@
+-- Index for the content-addressed thumbnail cache. Sources map a file path and
+-- its last seen size/mtime to a content hash; renditions are keyed by that hash
+-- so unchanged or moved files never get re-rendered. Video renditions are
+-- additionally keyed by the frame's offset in milliseconds; images use 0.
+
+CREATE TABLE IF NOT EXISTS thumbnail_sources (
+    path TEXT NOT NULL PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    content_hash TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS thumbnail_renditions (
+    content_hash TEXT NOT NULL,
+    frame INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL,
+    format TEXT NOT NULL,
+    path TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    last_accessed REAL NOT NULL,
+    PRIMARY KEY (content_hash, frame, size, format)
+);
+
+CREATE INDEX IF NOT EXISTS thumbnail_renditions_last_accessed_idx
+    ON thumbnail_renditions (last_accessed);
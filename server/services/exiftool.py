@@ -0,0 +1,173 @@
+import atexit
+import html
+import json
+import os
+import selectors
+import subprocess
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+EXIFTOOL_TIMEOUT_SECONDS = 60
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class ExifToolError(Exception):
+    pass
+
+
+class ExifTool:
+    """
+    A long-running `exiftool -stay_open True -@ -` process.
+
+    Starting exiftool costs a Perl interpreter and its module tree, 150-300 ms
+    every time, so one process is kept per worker and fed commands over stdin.
+    Each command ends in a numbered `-execute`; exiftool answers with the
+    matching `{ready<n>}` on stdout (and, through `-echo4`, on stderr) once it
+    has finished, which is how responses are told apart. Commands from
+    different threads are serialised by a lock, and reads take any number of
+    files in one command. The process is restarted if it dies.
+    """
+
+    def __init__(
+        self,
+        executable: str = "exiftool",
+        timeout: float = EXIFTOOL_TIMEOUT_SECONDS,
+    ):
+        self.executable = executable
+        self.timeout = timeout
+        self._process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+        self._command_id = 0
+
+    def _start(self) -> subprocess.Popen:
+        if self._process is None or self._process.poll() is not None:
+            self._process = subprocess.Popen(
+                [
+                    self.executable,
+                    "-stay_open",
+                    "True",
+                    "-@",
+                    "-",
+                    "-common_args",
+                    "-charset",
+                    "filename=utf8",
+                ],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        return self._process
+
+    def execute(self, *args: str) -> Tuple[str, str]:
+        """Runs one exiftool command and returns its stdout and stderr."""
+        if any("\n" in arg for arg in args):
+            raise ValueError("exiftool arguments cannot contain newlines")
+        with self._lock:
+            process = self._start()
+            self._command_id += 1
+            sentinel = f"{{ready{self._command_id}}}"
+            lines = [*args, "-echo4", sentinel, f"-execute{self._command_id}", ""]
+            try:
+                process.stdin.write("\n".join(lines).encode())
+                process.stdin.flush()
+                return self._read_until(process, sentinel)
+            except (OSError, ExifToolError):
+                # Whatever is left in the pipes belongs to the failed command.
+                self._terminate()
+                raise
+
+    def _read_until(self, process: subprocess.Popen, sentinel: str) -> Tuple[str, str]:
+        marker = sentinel.encode()
+        buffers = {process.stdout: bytearray(), process.stderr: bytearray()}
+        deadline = time.monotonic() + self.timeout
+        with selectors.DefaultSelector() as selector:
+            for stream in buffers:
+                selector.register(stream, selectors.EVENT_READ)
+            while selector.get_map():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ExifToolError("Timed out waiting for exiftool")
+                for key, _ in selector.select(remaining):
+                    chunk = os.read(key.fd, READ_CHUNK_SIZE)
+                    if not chunk:
+                        raise ExifToolError("exiftool exited unexpectedly")
+                    buffer = buffers[key.fileobj]
+                    buffer += chunk
+                    if buffer.rstrip().endswith(marker):
+                        selector.unregister(key.fileobj)
+
+        stdout, stderr = (
+            bytes(buffer).rstrip()[: -len(marker)].decode(errors="replace")
+            for buffer in buffers.values()
+        )
+        return stdout, stderr
+
+    def read_metadata(self, paths: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Reads the tags of every file in `paths` in a single command, keyed by
+        path. Files exiftool cannot read are left out.
+        """
+        if not paths:
+            return {}
+        stdout, stderr = self.execute("-json", *paths)
+        if not stdout.strip():
+            raise ExifToolError(stderr.strip() or "exiftool returned no metadata")
+        return {metadata["SourceFile"]: metadata for metadata in json.loads(stdout)}
+
+    def write_tags(self, path: str, tags: Dict[str, Any]) -> None:
+        # `-E` makes exiftool unescape HTML entities in the values, which
+        # lets values containing newlines through the line-based protocol.
+        args = ["-E"]
+        for key, value in tags.items():
+            if isinstance(value, list):
+                value = ",".join(map(str, value))
+            value = html.escape(str(value), quote=False).replace("\n", "&#xa;")
+            args.append(f"-{key}={value}")
+        _, stderr = self.execute(*args, path)
+        errors = [line for line in stderr.splitlines() if line.startswith("Error")]
+        if errors:
+            raise ExifToolError("; ".join(errors))
+
+    def _terminate(self) -> None:
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+            self._process = None
+
+    def close(self) -> None:
+        with self._lock:
+            if self._process is None:
+                return
+            if self._process.poll() is None:
+                try:
+                    self._process.stdin.write(b"-stay_open\nFalse\n")
+                    self._process.stdin.flush()
+                    self._process.wait(timeout=5)
+                except (OSError, subprocess.TimeoutExpired):
+                    self._process.kill()
+                    self._process.wait()
+            self._process = None
+
+
+_instances: Dict[int, ExifTool] = {}
+_instances_lock = threading.Lock()
+
+
+def get_exiftool() -> ExifTool:
+    """The exiftool process of the current worker process, started on first use."""
+    # Keyed by pid so a forked child never shares its parent's pipes.
+    with _instances_lock:
+        exiftool = _instances.get(os.getpid())
+        if exiftool is None:
+            exiftool = _instances[os.getpid()] = ExifTool()
+        return exiftool
+
+
+def close_exiftool() -> None:
+    exiftool = _instances.pop(os.getpid(), None)
+    if exiftool is not None:
+        exiftool.close()
+
+
+atexit.register(close_exiftool)
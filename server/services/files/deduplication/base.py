@@ -1,6 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional
-from datasketch import MinHash, MinHashLSH
+from typing import Dict, Iterable, List, Tuple
 from pydantic import BaseModel
 
 
@@ -10,33 +9,78 @@ class DuplicateResult(BaseModel):
     exact_matches: List[str]
 
 
+def group_matches(matches: Iterable[Tuple[int, int]]) -> List[List[int]]:
+    """
+    Clusters matching pairs of ids with union-find. Each group is sorted and
+    the groups are ordered by their smallest id, so the result depends only
+    on which pairs match, not on the order they were found in.
+    """
+    parent: Dict[int, int] = {}
+
+    def find(item: int) -> int:
+        root = item
+        while parent.setdefault(root, root) != root:
+            root = parent[root]
+        while parent[item] != root:
+            parent[item], item = root, parent[item]
+        return root
+
+    for a, b in matches:
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            # The smaller id always wins, keeping the earliest item the root.
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    groups: Dict[int, List[int]] = {}
+    for item in sorted(parent):
+        groups.setdefault(find(item), []).append(item)
+    return [group for _, group in sorted(groups.items()) if len(group) > 1]
+
+
+def merge_duplicate_results(
+    paths: List[str], *passes: List[DuplicateResult]
+) -> List[DuplicateResult]:
+    """
+    Merges the groups found by several passes over `paths` into disjoint
+    groups, so a file an earlier pass grouped can't turn up again in another
+    group. Each original is the group's earliest member in `paths`, and a
+    duplicate is an exact match when a chain of exact matches links it to
+    the original.
+    """
+    ids = {path: index for index, path in enumerate(dict.fromkeys(paths))}
+    matches: List[Tuple[int, int]] = []
+    exact: List[Tuple[int, int]] = []
+    for results in passes:
+        for result in results:
+            original = ids.setdefault(result.original, len(ids))
+            for path in result.duplicates:
+                matches.append((original, ids.setdefault(path, len(ids))))
+            exact += [(original, ids[path]) for path in result.exact_matches]
+    exact_groups = {item: group[0] for group in group_matches(exact) for item in group}
+    paths = list(ids)
+
+    merged = []
+    for original, *duplicates in group_matches(matches):
+        root = exact_groups.get(original)
+        merged.append(
+            DuplicateResult(
+                original=paths[original],
+                duplicates=[paths[i] for i in duplicates],
+                exact_matches=[
+                    paths[i]
+                    for i in duplicates
+                    if root is not None and exact_groups.get(i) == root
+                ],
+            )
+        )
+    return merged
+
+
 class Deduplicator(ABC):
-    def __init__(
-        self, threshold: float = 0.5, hash_size: int = 16, num_perm: int = 256
-    ):
+    def __init__(self, threshold: float = 0.5, hash_size: int = 16):
         self.threshold: float = threshold
         self.hash_size: int = hash_size
-        self.num_perm: int = num_perm
-        self.lsh: MinHashLSH = MinHashLSH(threshold=threshold, num_perm=num_perm)
-        self.hashes: Dict[str, MinHash] = {}
-
-    def _compute_minhash(self, data: bytes) -> Optional[MinHash]:
-        try:
-            minhash = MinHash(num_perm=self.num_perm)
-            minhash.update(data)
-            return minhash
-        except Exception:
-            return None
-
-    def add_item(self, item_id: str, data: bytes) -> None:
-        minhash = self._compute_minhash(data)
-        if minhash is None:
-            return
-        self.lsh.insert(item_id, minhash)
-        self.hashes[item_id] = minhash
-
-    def find_duplicates(self, data: bytes) -> List[str]:
-        minhash = self._compute_minhash(data)
-        if minhash is None:
-            return []
-        return self.lsh.query(minhash)
+
+    @abstractmethod
+    def find_duplicates(self, path: str) -> Tuple[List[str], List[str]]:
+        """Added files similar to `path`, and the exact matches among them."""
@@ -0,0 +1,215 @@
+import hashlib
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+from stat import S_ISREG
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.files.deduplication.base import DuplicateResult
+from services.files.deduplication.hash_store import HashStore
+from services.files.directory_file_organizer import DirectoryFileOrganizer
+
+EDGE_BYTES = 64 * 1024
+FULL_HASH_CHUNK_BYTES = 8 * 1024 * 1024
+
+try:
+    import xxhash
+
+    def new_hash():
+        return xxhash.xxh3_128()
+
+except ImportError:
+
+    def new_hash():
+        return hashlib.blake2b(digest_size=16)
+
+
+def edge_hash(path: str, size: int) -> Optional[str]:
+    """
+    Hash of the first and last `EDGE_BYTES` of a file, which for files up
+    to twice that is all of it. None if the file can't be read.
+    """
+    digest = new_hash()
+    try:
+        with open(path, "rb") as file:
+            digest.update(file.read(EDGE_BYTES))
+            if size > EDGE_BYTES:
+                file.seek(max(EDGE_BYTES, size - EDGE_BYTES))
+                digest.update(file.read(EDGE_BYTES))
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def full_hash(path: str, new_digest: Callable[[], Any] = new_hash) -> Optional[str]:
+    """Hash of a whole file read through mmap, or None if it can't be read."""
+    digest = new_digest()
+    try:
+        with open(path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if hasattr(mapped, "madvise"):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                with memoryview(mapped) as view:
+                    for start in range(0, len(view), FULL_HASH_CHUNK_BYTES):
+                        digest.update(view[start : start + FULL_HASH_CHUNK_BYTES])
+    except (OSError, ValueError):
+        return None
+    return digest.hexdigest()
+
+
+def unique_paths(paths: List[str], groups: List[DuplicateResult]) -> List[str]:
+    """`paths` without the duplicates in `groups`; each original is kept."""
+    duplicates = {path for group in groups for path in group.duplicates}
+    return [path for path in paths if path not in duplicates]
+
+
+class ExactDeduplicator:
+    """
+    Byte-identical files of any type, found in stages that each read only
+    what the previous one couldn't rule out: files are grouped by size, then
+    files sharing a size by a hash of their first and last `EDGE_BYTES`, and
+    only files that still collide are hashed in full. Most files in a library
+    have a unique size and are never opened.
+
+    Hashes are xxh3-128 when `xxhash` is installed and BLAKE2b otherwise;
+    collisions either way are far less likely than a disk error. Each stage
+    hashes in a thread pool, as it mostly waits on reads. Hard links to one
+    file are hashed once and reported as duplicates of each other; empty
+    files and symlinks are skipped.
+
+    With a `store`, each group of identical files also gets its sha256
+    kept in the hash store, so uploads can be checked against them. The
+    copies are identical, so it is read from one of them, or reused when
+    any of them already has it stored.
+    """
+
+    def __init__(
+        self, max_workers: Optional[int] = None, store: Optional[HashStore] = None
+    ):
+        self.max_workers = max_workers
+        self.store = store
+
+    def _hash_groups(
+        self,
+        groups: Dict[Tuple, List[str]],
+        hash_path: Callable[[str], Optional[str]],
+    ) -> Dict[Tuple, List[str]]:
+        """Splits each group by `hash_path`, dropping files that can't be read."""
+        paths = [path for group in groups.values() for path in group]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            hashes = dict(zip(paths, executor.map(hash_path, paths)))
+        split: Dict[Tuple, List[str]] = {}
+        for key, group in groups.items():
+            for path in group:
+                if hashes[path] is not None:
+                    split.setdefault((*key, hashes[path]), []).append(path)
+        return split
+
+    def _hash_contents(
+        self, groups: Dict[Tuple, List[str]], stats: Dict[str, os.stat_result]
+    ) -> Dict[Tuple, List[str]]:
+        """The full-hash stage, storing the sha256 of the duplicates found."""
+        split = self._hash_groups(groups, full_hash)
+        if self.store is None:
+            return split
+        duplicates = [group for group in split.values() if len(group) > 1]
+        paths = {path: stats[path] for group in duplicates for path in group}
+        stored = {
+            path: row["content_hash"]
+            for path, row in self.store.get_many(paths).items()
+            if row["content_hash"]
+        }
+        # The copies are identical, so one stored or freshly read sha256
+        # covers the whole group.
+        hashes = [
+            next((stored[path] for path in group if path in stored), None)
+            for group in duplicates
+        ]
+        unknown = [
+            index for index, content_hash in enumerate(hashes) if not content_hash
+        ]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            read = executor.map(
+                lambda index: full_hash(duplicates[index][0], hashlib.sha256), unknown
+            )
+            for index, content_hash in zip(unknown, read):
+                hashes[index] = content_hash
+        entries = [
+            (path, paths[path], {"content_hash": content_hash})
+            for group, content_hash in zip(duplicates, hashes)
+            if content_hash
+            for path in group
+            if stored.get(path) != content_hash
+        ]
+        self.store.put_many(entries)
+        return split
+
+    def deduplicate_paths(self, paths: List[str]) -> List[DuplicateResult]:
+        """
+        Groups of identical files among `paths`, each original being the
+        first of its copies in `paths`.
+        """
+        paths = list(dict.fromkeys(paths))
+        stats: Dict[str, os.stat_result] = {}
+        # One path per inode is hashed; the others are linked to it.
+        inode_paths: Dict[Tuple[int, int], str] = {}
+        links: Dict[str, List[str]] = {}
+        for path in paths:
+            try:
+                stat = os.lstat(path)
+            except OSError:
+                continue
+            if not S_ISREG(stat.st_mode) or not stat.st_size:
+                continue
+            inode = (stat.st_dev, stat.st_ino)
+            if inode in inode_paths:
+                links.setdefault(inode_paths[inode], []).append(path)
+            else:
+                inode_paths[inode] = path
+                stats[path] = stat
+
+        by_size: Dict[Tuple, List[str]] = {}
+        for path, stat in stats.items():
+            by_size.setdefault((stat.st_size,), []).append(path)
+        by_edges = self._hash_groups(
+            {key: group for key, group in by_size.items() if len(group) > 1},
+            lambda path: edge_hash(path, stats[path].st_size),
+        )
+        # Files no bigger than both edges were hashed whole already.
+        identical = [
+            group
+            for (size, _), group in by_edges.items()
+            if len(group) > 1 and size <= 2 * EDGE_BYTES
+        ]
+        by_content = self._hash_contents(
+            {
+                key: group
+                for key, group in by_edges.items()
+                if len(group) > 1 and key[0] > 2 * EDGE_BYTES
+            },
+            stats,
+        )
+        identical += [group for group in by_content.values() if len(group) > 1]
+        grouped = {path for group in identical for path in group}
+        identical += [[path] for path in links if path not in grouped]
+
+        order = {path: index for index, path in enumerate(paths)}
+        results = []
+        for group in identical:
+            original, *duplicates = sorted(
+                [copy for path in group for copy in (path, *links.get(path, []))],
+                key=order.__getitem__,
+            )
+            results.append(
+                DuplicateResult(
+                    original=original, duplicates=duplicates, exact_matches=duplicates
+                )
+            )
+        return sorted(results, key=lambda group: order[group.original])
+
+    def deduplicate_directory(
+        self, directory_path: str, use_index: bool = False
+    ) -> List[DuplicateResult]:
+        return self.deduplicate_paths(
+            DirectoryFileOrganizer.list_files_recursive(directory_path, use_index)
+        )
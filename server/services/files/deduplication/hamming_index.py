@@ -0,0 +1,202 @@
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+import imagehash
+import numpy as np
+
+CHUNK_BITS = 16
+QUERY_BATCH_SIZE = 2048
+
+if hasattr(np, "bitwise_count"):
+
+    def popcount(words: np.ndarray) -> np.ndarray:
+        """Set bits per row of a 2D uint64 array."""
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int64)
+
+else:
+    _BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], np.uint8)
+
+    def popcount(words: np.ndarray) -> np.ndarray:
+        """Set bits per row of a 2D uint64 array."""
+        as_bytes = np.ascontiguousarray(words).view(np.uint8)
+        return _BYTE_POPCOUNT[as_bytes].sum(axis=1, dtype=np.int64)
+
+
+def pack_hash(image_hash: imagehash.ImageHash) -> np.ndarray:
+    """The hash's bits packed into uint64 words, zero-padded to a whole word."""
+    packed = np.packbits(image_hash.hash.flatten())
+    packed = np.pad(packed, (0, -len(packed) % 8))
+    return packed.view(np.uint64)
+
+
+def radius_for_threshold(threshold: float, bits: int) -> int:
+    """The largest Hamming distance with a similarity of at least `threshold`."""
+    return max(0, math.floor((1 - threshold) * bits + 1e-9))
+
+
+def _flip_masks(bits: int, radius: int) -> np.ndarray:
+    """Every `bits`-wide mask with at most `radius` bits set."""
+    masks = np.arange(1 << bits, dtype=np.uint16)
+    weights = np.unpackbits(masks.view(np.uint8)).reshape(len(masks), -1).sum(axis=1)
+    return masks[weights <= radius]
+
+
+class HammingIndex:
+    """
+    Finds the stored bit strings within a Hamming radius of a query, using
+    multi-index hashing.
+
+    Hashes are kept as rows of packed uint64 words and split into 16-bit
+    chunks. Two hashes within `radius` of each other differ by at most
+    `radius // chunks` bits in at least one chunk, so candidates are the
+    rows whose value in some chunk is within that many bit flips of the
+    query's, read from per-chunk buckets.
+    The candidates' exact distances are then checked with a vectorised
+    popcount, a batch of queries at a time.
+    """
+
+    def __init__(self, bits: int, radius: int):
+        self.bits = bits
+        self.radius = radius
+        self.words = math.ceil(bits / 64)
+        self.chunks = math.ceil(bits / CHUNK_BITS)
+        self.flips = _flip_masks(CHUNK_BITS, radius // self.chunks)
+        self.hashes = np.empty((0, self.words), np.uint64)
+        self._pending: List[np.ndarray] = []
+        self._size = 0
+        self._order: np.ndarray = np.empty((self.chunks, 0), np.int64)
+        self._bucket_starts: np.ndarray = np.zeros(
+            (self.chunks, (1 << CHUNK_BITS) + 1), np.int64
+        )
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, hashes: np.ndarray) -> np.ndarray:
+        """Stores a row (or 2D array of rows) of packed hashes, returning their ids."""
+        hashes = np.atleast_2d(np.asarray(hashes, np.uint64))
+        start = self._size
+        self._pending.append(hashes)
+        self._size += len(hashes)
+        return np.arange(start, self._size)
+
+    def _build(self) -> None:
+        if not self._pending:
+            return
+        self.hashes = np.concatenate([self.hashes, *self._pending])
+        self._pending = []
+        chunks = self._chunk_values(self.hashes)
+        self._order = np.argsort(chunks, axis=1, kind="stable")
+        # Row `c` holds where each chunk value's bucket starts in `_order[c]`.
+        self._bucket_starts = np.zeros((self.chunks, (1 << CHUNK_BITS) + 1), np.int64)
+        for chunk, values in enumerate(chunks):
+            counts = np.bincount(values, minlength=1 << CHUNK_BITS)
+            np.cumsum(counts, out=self._bucket_starts[chunk, 1:])
+
+    def save(self, directory: str) -> None:
+        """Writes the hashes and chunk buckets as `.npy` files for `load`."""
+        self._build()
+        os.makedirs(directory, exist_ok=True)
+        for name, array in self._arrays().items():
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+
+    @classmethod
+    def load(
+        cls, directory: str, bits: int, radius: int, mmap: bool = True
+    ) -> "HammingIndex":
+        """
+        An index saved by `save`. With `mmap` the arrays are memory-mapped
+        read-only, so loading is instant and pages are read as queries touch
+        them. Hashes added afterwards are merged into an in-memory copy.
+        """
+        index = cls(bits, radius)
+        arrays = {
+            name: np.load(
+                os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None
+            )
+            for name in index._arrays()
+        }
+        index.hashes = arrays["hashes"]
+        index._order = arrays["order"]
+        index._bucket_starts = arrays["buckets"]
+        index._size = len(index.hashes)
+        return index
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            "hashes": self.hashes,
+            "order": self._order,
+            "buckets": self._bucket_starts,
+        }
+
+    def _chunk_values(self, hashes: np.ndarray) -> np.ndarray:
+        """(chunks, rows) array of each row's 16-bit chunk values."""
+        return np.ascontiguousarray(hashes).view(np.uint16)[:, : self.chunks].T
+
+    def query(
+        self, hashes: np.ndarray, radius: Optional[int] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        For each query row, the ids of stored rows within `radius` (the
+        index's radius by default, and no more) and their distances, nearest
+        first.
+        """
+        radius = self.radius if radius is None else min(radius, self.radius)
+        hashes = np.atleast_2d(np.asarray(hashes, np.uint64))
+        self._build()
+        results = []
+        for start in range(0, len(hashes), QUERY_BATCH_SIZE):
+            results.extend(
+                self._query_batch(hashes[start : start + QUERY_BATCH_SIZE], radius)
+            )
+        return results
+
+    def _query_batch(
+        self, queries: np.ndarray, radius: int
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        query_ids, candidate_ids = [], []
+        if len(self.hashes):
+            query_chunks = self._chunk_values(queries)
+            for chunk in range(self.chunks):
+                probes = (query_chunks[chunk][:, None] ^ self.flips[None, :]).ravel()
+                left = self._bucket_starts[chunk][probes]
+                counts = self._bucket_starts[chunk][probes.astype(np.int64) + 1] - left
+                total = int(counts.sum())
+                if not total:
+                    continue
+                # Expands each [left, right) range into the positions it covers.
+                offsets = np.repeat(np.cumsum(counts) - counts, counts)
+                positions = np.arange(total) - offsets + np.repeat(left, counts)
+                candidate_ids.append(self._order[chunk][positions])
+                query_ids.append(
+                    np.repeat(
+                        np.repeat(np.arange(len(queries)), len(self.flips)), counts
+                    )
+                )
+
+        if not candidate_ids:
+            return [(np.empty(0, np.int64), np.empty(0, np.int64))] * len(queries)
+
+        query_ids = np.concatenate(query_ids)
+        candidate_ids = np.concatenate(candidate_ids)
+        distances = popcount(queries[query_ids] ^ self.hashes[candidate_ids])
+        within = distances <= radius
+        # A pair can be found through several chunks; only the few within
+        # range are worth deduplicating.
+        pairs, first = np.unique(
+            query_ids[within] * len(self.hashes) + candidate_ids[within],
+            return_index=True,
+        )
+        query_ids, candidate_ids = np.divmod(pairs, len(self.hashes))
+        distances = distances[within][first]
+
+        order = np.lexsort((candidate_ids, distances, query_ids))
+        query_ids = query_ids[order]
+        candidate_ids = candidate_ids[order]
+        distances = distances[order]
+        bounds = np.searchsorted(query_ids, np.arange(len(queries) + 1))
+        return [
+            (candidate_ids[start:end], distances[start:end])
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
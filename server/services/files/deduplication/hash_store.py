@@ -0,0 +1,437 @@
+"""
+Persistent content and perceptual hashes, so deduplication is incremental
+across runs and single files can be checked against the library on upload.
+
+Rebuild the on-disk pHash index from the `server` directory:
+
+    python -m services.files.deduplication.hash_store
+"""
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import imagehash
+import numpy as np
+from PIL import Image
+from pydantic import BaseModel
+
+from config import Config
+from dbio.sqlite import SQLiteDatabaseAdapter
+from models.files import FileType
+from services.files.deduplication.hamming_index import (
+    HammingIndex,
+    pack_hash,
+    radius_for_threshold,
+)
+from services.files.directory_file_organizer import DirectoryFileOrganizer
+from services.files.file_index import FileIndex
+from services.files.uploads import hash_file
+
+PHASH_SIZE = 16
+# Hashes stored since the on-disk index was built are searched in memory;
+# past this many the index is rebuilt so that stays small.
+MAX_UNINDEXED_HASHES = 1000
+# Rows are timestamped just before they are committed, so one can land with
+# an older `hashed_at` than a row already seen; polls look back this far.
+SYNC_OVERLAP_SECONDS = 5.0
+HASH_COLUMNS = ("content_hash", "phash", "dhash", "video_signature")
+CURRENT_INDEX_FILE = "current.json"
+
+
+def compute_image_hashes(
+    image_path: str, hash_size: int = PHASH_SIZE
+) -> Optional[Tuple[str, str]]:
+    """An image's pHash and dHash as hex, or None if it can't be read."""
+    try:
+        with Image.open(image_path) as image:
+            image.draft("L", (hash_size * 4, hash_size * 4))
+            image = image.convert("L")
+            return (
+                str(imagehash.phash(image, hash_size=hash_size)),
+                str(imagehash.dhash(image, hash_size=hash_size)),
+            )
+    except Exception:
+        return None
+
+
+class DuplicateCheck(BaseModel):
+    path: str
+    content_hash: str
+    phash: Optional[str] = None
+    dhash: Optional[str] = None
+    exact_matches: List[str] = []
+    similar: List[str] = []
+
+
+class HashStore:
+    """
+    sha256, pHash, dHash and video signature per file in SQLite, keyed by
+    path and valid while the file's size, mtime and inode are unchanged.
+
+    The pHashes are also kept in a `HammingIndex` saved as `.npy` files
+    under `index_dir` and memory-mapped when loaded, so a server can start
+    and answer near-duplicate lookups without reading the whole table.
+    Hashes stored after the index was built go into a small in-memory index
+    searched alongside it until the next rebuild; each lookup first polls
+    the table for rows stored since, so hashes written by job workers and
+    other processes are found too. Each build is written to its own
+    directory and `current.json` is switched to it last, so other processes
+    reload a complete index when they notice the switch.
+
+    Use one instance per process (`from_config`), so the in-memory index is
+    shared by every caller. With a `file_index`, exact checks also cover the
+    indexed library: the sha256 of every indexed file of the checked file's
+    size is stored before the lookup.
+    """
+
+    def __init__(
+        self,
+        database_path: str,
+        schema_path: Optional[str] = None,
+        index_dir: Optional[str] = None,
+        threshold: float = 0.9,
+        hash_size: int = PHASH_SIZE,
+        file_index: Optional[FileIndex] = None,
+    ):
+        self.database = SQLiteDatabaseAdapter(database_path, schema_path)
+        self.file_index = file_index
+        self.index_dir = index_dir or os.path.join(
+            os.path.dirname(database_path), "hash_index"
+        )
+        self.hash_size = hash_size
+        self.bits = hash_size**2
+        self.radius = radius_for_threshold(threshold, self.bits)
+        self._index: Optional[HammingIndex] = None
+        self._index_paths: List[str] = []
+        self._indexed_at = 0.0
+        self._indexed_path_set: Set[str] = set()
+        self._index_version: Optional[str] = None
+        self._recent = HammingIndex(self.bits, self.radius)
+        self._recent_paths: List[str] = []
+        self._recent_phashes: Dict[str, str] = {}
+        # Rows stored after this `hashed_at` may be missing from both indexes.
+        self._synced_until = 0.0
+        self._lock = threading.RLock()
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def from_config(cls) -> "HashStore":
+        config = Config()
+        return cls(
+            config.hash_store_database_path,
+            config.hash_store_schema_path,
+            config.hash_store_index_dir,
+            config.duplicate_threshold,
+            file_index=FileIndex.from_config(),
+        )
+
+    @staticmethod
+    def _fresh(row: Dict[str, Any], stat: os.stat_result) -> bool:
+        return (
+            row["size"] == stat.st_size
+            and row["mtime"] == stat.st_mtime
+            and row["inode"] == stat.st_ino
+        )
+
+    def get(self, path: str, stat: os.stat_result) -> Optional[Dict[str, Any]]:
+        return self.get_many({path: stat}).get(path)
+
+    def get_many(self, stats: Dict[str, os.stat_result]) -> Dict[str, Dict[str, Any]]:
+        """Stored rows for the paths whose fingerprint still matches."""
+        rows = self.database.select_in("file_hashes", "path", list(stats))
+        return {
+            row["path"]: row for row in rows if self._fresh(row, stats[row["path"]])
+        }
+
+    def put(self, path: str, stat: os.stat_result, **hashes: Any) -> None:
+        self.put_many([(path, stat, hashes)])
+
+    def put_many(
+        self, entries: List[Tuple[str, os.stat_result, Dict[str, Any]]]
+    ) -> None:
+        """
+        Stores hashes (any of `HASH_COLUMNS`) per path. Hashes already stored
+        for an unchanged file are kept unless given again.
+        """
+        existing = self.get_many({path: stat for path, stat, _ in entries})
+        rows = []
+        for path, stat, hashes in entries:
+            previous = existing.get(path, {})
+            row = {column: previous.get(column) for column in HASH_COLUMNS}
+            row.update(
+                {column: value for column, value in hashes.items() if value is not None}
+            )
+            rows.append(
+                {
+                    **row,
+                    "path": path,
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "inode": stat.st_ino,
+                    "hashed_at": time.time(),
+                }
+            )
+        self.database.upsert_many("file_hashes", rows, ["path"])
+
+        self._add_recent(
+            [
+                (row["path"], row["phash"])
+                for row in rows
+                if row["phash"]
+                and row["phash"] != existing.get(row["path"], {}).get("phash")
+            ]
+        )
+
+    def _pack(self, phash: str) -> np.ndarray:
+        return pack_hash(imagehash.hex_to_hash(phash))
+
+    def _add_recent(self, phashes: List[Tuple[str, str]]) -> None:
+        """Adds (path, pHash) pairs to the in-memory index, rebuilding when full."""
+        with self._lock:
+            phashes = [
+                (path, phash)
+                for path, phash in phashes
+                if len(phash) * 4 == self.bits
+                and self._recent_phashes.get(path) != phash
+            ]
+            if not phashes:
+                return
+            self._recent.add(np.stack([self._pack(phash) for _, phash in phashes]))
+            self._recent_paths.extend(path for path, _ in phashes)
+            self._recent_phashes.update(phashes)
+            rebuild = len(self._recent_paths) >= MAX_UNINDEXED_HASHES
+        if rebuild:
+            self.build_index()
+
+    def sync(self) -> None:
+        """Adds hashes stored since the last poll, by any process, to the index."""
+        with self._lock:
+            since = self._synced_until - SYNC_OVERLAP_SECONDS
+        rows = self.database.select_greater(
+            "file_hashes", "hashed_at", since, "path, phash, hashed_at"
+        )
+        if not rows:
+            return
+        with self._lock:
+            self._synced_until = max(
+                self._synced_until, max(row["hashed_at"] for row in rows)
+            )
+            # Rows from before the build are in the index unless they were
+            # committed after it read the table.
+            rows = [
+                row
+                for row in rows
+                if row["phash"]
+                and (
+                    row["hashed_at"] > self._indexed_at
+                    or row["path"] not in self._indexed_path_set
+                )
+            ]
+        self._add_recent([(row["path"], row["phash"]) for row in rows])
+
+    def build_index(self) -> int:
+        """Writes the pHash index from the table and switches to it."""
+        # Rows stored once the read has started are picked up by `sync`.
+        indexed_at = time.time()
+        rows = [
+            row
+            for row in self.database.select("file_hashes", "path, phash")
+            if row["phash"] and len(row["phash"]) * 4 == self.bits
+        ]
+        index = HammingIndex(self.bits, self.radius)
+        if rows:
+            index.add(np.stack([self._pack(row["phash"]) for row in rows]))
+
+        version = str(time.time_ns())
+        directory = os.path.join(self.index_dir, version)
+        index.save(directory)
+        with open(os.path.join(directory, "paths.json"), "w") as file:
+            json.dump([row["path"] for row in rows], file)
+        current = os.path.join(self.index_dir, CURRENT_INDEX_FILE)
+        with open(f"{current}.{version}", "w") as file:
+            json.dump({"version": version, "indexed_at": indexed_at}, file)
+        os.replace(f"{current}.{version}", current)
+
+        # Readers that already mapped an old version keep their mapping.
+        for name in os.listdir(self.index_dir):
+            path = os.path.join(self.index_dir, name)
+            if name != version and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+        self.load_index()
+        return len(rows)
+
+    def load_index(self) -> None:
+        """Maps the current on-disk index, building it first if there is none."""
+        for attempt in range(2):
+            try:
+                with open(os.path.join(self.index_dir, CURRENT_INDEX_FILE)) as file:
+                    current = json.load(file)
+                version = current["version"]
+            except (OSError, ValueError, KeyError):
+                self.build_index()
+                return
+            if version == self._index_version:
+                return
+            directory = os.path.join(self.index_dir, version)
+            try:
+                index = HammingIndex.load(directory, self.bits, self.radius)
+                with open(os.path.join(directory, "paths.json")) as file:
+                    paths = json.load(file)
+            except OSError:
+                # Replaced by a newer build between reading the pointer and
+                # mapping the files.
+                if attempt:
+                    raise
+                continue
+            with self._lock:
+                self._index, self._index_paths = index, paths
+                self._index_version = version
+                # Everything stored since the build is polled again, so the
+                # in-memory index starts over.
+                self._recent = HammingIndex(self.bits, self.radius)
+                self._recent_paths, self._recent_phashes = [], {}
+                self._indexed_at = current.get("indexed_at", 0.0)
+                self._indexed_path_set = set(paths)
+                self._synced_until = self._indexed_at
+            return
+
+    def hash_indexed_files(self, size: int) -> None:
+        """
+        Stores the sha256 of the indexed files of `size` bytes that have none
+        stored yet. The file index keeps its own copy, so an unchanged file
+        is read at most once.
+        """
+        if self.file_index is None:
+            return
+        stats: Dict[str, os.stat_result] = {}
+        for path in self.file_index.paths_of_size(size):
+            try:
+                stats[path] = os.stat(path)
+            except OSError:
+                continue
+        stored = self.get_many(stats)
+        entries = []
+        for path, stat in stats.items():
+            if stored.get(path, {}).get("content_hash"):
+                continue
+            try:
+                content_hash = self.file_index.content_hash(path)
+            except OSError:
+                continue
+            entries.append((path, stat, {"content_hash": content_hash}))
+        if entries:
+            self.put_many(entries)
+
+    def video_signatures(self, since: float = 0.0) -> List[Dict[str, Any]]:
+        """Rows with a video signature stored after `since`, a `hashed_at`."""
+        rows = self.database.select_greater(
+            "file_hashes", "hashed_at", since, "path, video_signature, hashed_at"
+        )
+        return [row for row in rows if row["video_signature"]]
+
+    def find_exact(self, content_hash: str, exclude: Optional[str] = None) -> List[str]:
+        """
+        Stored paths with `content_hash`, leaving out files that were deleted
+        or changed since they were hashed.
+        """
+        rows = self.database.select(
+            "file_hashes", "path, size, mtime, inode", {"content_hash": content_hash}
+        )
+        matches = []
+        for row in rows:
+            if row["path"] == exclude:
+                continue
+            try:
+                stat = os.stat(row["path"])
+            except OSError:
+                continue
+            if self._fresh(row, stat):
+                matches.append(row["path"])
+        return matches
+
+    def find_similar(self, phash: str, exclude: Optional[str] = None) -> List[str]:
+        """Paths whose stored pHash is within the threshold, nearest first."""
+        self.load_index()
+        self.sync()
+        packed = self._pack(phash)
+        with self._lock:
+            candidates = []
+            for index, paths in (
+                (self._index, self._index_paths),
+                (self._recent, self._recent_paths),
+            ):
+                if index is not None and len(index):
+                    [(ids, _)] = index.query(packed)
+                    candidates.extend(paths[i] for i in ids)
+        # The index can lag behind the table, so matches are confirmed
+        # against the stored hashes.
+        rows = self.database.select_in("file_hashes", "path", candidates)
+        query = imagehash.hex_to_hash(phash)
+        matches = sorted(
+            (query - imagehash.hex_to_hash(row["phash"]), row["path"])
+            for row in rows
+            if row["phash"] and row["path"] != exclude and os.path.exists(row["path"])
+        )
+        return [path for distance, path in matches if distance <= self.radius]
+
+    def check_file(
+        self,
+        path: str,
+        content_hash: Optional[str] = None,
+        exclude: Optional[str] = None,
+        file_type: Optional[FileType] = None,
+    ) -> DuplicateCheck:
+        """
+        Exact copies of `path` by sha256 and, for images, near duplicates by
+        pHash, among the stored files other than `exclude`. Pass the sha256
+        if it is already known, as it is for uploads, and the `file_type` if
+        the extension doesn't give it away.
+        """
+        content_hash = content_hash or hash_file(path).hexdigest()
+        self.hash_indexed_files(os.path.getsize(path))
+        check = DuplicateCheck(
+            path=path,
+            content_hash=content_hash,
+            exact_matches=self.find_exact(content_hash, exclude),
+        )
+        file_type = file_type or DirectoryFileOrganizer.get_file_type(
+            path.split(".")[-1]
+        )
+        if file_type == FileType.IMAGE:
+            hashes = compute_image_hashes(path, self.hash_size)
+            if hashes is not None:
+                check.phash, check.dhash = hashes
+                check.similar = self.find_similar(check.phash, exclude)
+        return check
+
+    def add_file(self, path: str, check: Optional[DuplicateCheck] = None) -> None:
+        """Stores the hashes of `path`, reusing those of a `check_file` result."""
+        check = check or self.check_file(path)
+        self.put(
+            path,
+            os.stat(path),
+            content_hash=check.content_hash,
+            phash=check.phash,
+            dhash=check.dhash,
+        )
+
+    def close(self) -> None:
+        self.database.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.parse_args()
+    start = time.perf_counter()
+    count = HashStore.from_config().build_index()
+    print(f"Indexed {count} pHashes in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
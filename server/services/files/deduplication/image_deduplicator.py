@@ -1,105 +1,212 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, List, Optional, Tuple
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import imagehash
-from PIL import Image
-from datasketch import MinHash
+import numpy as np
 
 from models.files import FileType
-from services.files.deduplication.base import Deduplicator, DuplicateResult
+from services.files.deduplication.base import (
+    Deduplicator,
+    DuplicateResult,
+    group_matches,
+)
+from services.files.deduplication.hamming_index import (
+    HammingIndex,
+    pack_hash,
+    radius_for_threshold,
+)
+from services.files.deduplication.hash_store import HashStore, compute_image_hashes
 from services.files.directory_file_organizer import DirectoryFileOrganizer
 
+# Below this many images to hash, spawning a pool costs more than it saves.
+MIN_IMAGES_FOR_PROCESS_POOL = 32
+HASH_CHUNK_SIZE = 16
+
+Fingerprint = Tuple[str, int, int]
+
 
 class ImageDeduplicator(Deduplicator):
+    """
+    Near-duplicate images by pHash Hamming distance: two images match when
+    at least `threshold` of their `hash_size`² bits agree. Hashes are kept
+    in a `HammingIndex` rather than a MinHash LSH, since MinHashing the
+    bits of a pHash makes every image look alike.
+
+    Deduplication runs in two phases. Hashes are computed in a process pool,
+    since pHashing is CPU-bound Python and PIL work, and kept per file
+    fingerprint (path, size, mtime) so nothing is decoded twice; with a
+    `store`, they are also read from and written to the persistent hash
+    store, so later runs only hash new or changed files. Then a
+    single thread indexes them, finds every matching pair and clusters the
+    pairs with union-find, so the groups don't depend on which worker
+    finished first.
+    """
+
     def __init__(
-        self, threshold: float = 0.5, hash_size: int = 16, num_perm: int = 256
+        self,
+        threshold: float = 0.9,
+        hash_size: int = 16,
+        store: Optional[HashStore] = None,
     ):
-        super().__init__(threshold, hash_size, num_perm)
+        super().__init__(threshold, hash_size)
+        self.store = store
         self.image_hashes: Dict[str, imagehash.ImageHash] = {}
+        self.hash_cache: Dict[Fingerprint, imagehash.ImageHash] = {}
+        self.index = HammingIndex(
+            hash_size**2, radius_for_threshold(threshold, hash_size**2)
+        )
+        # Index row -> path; rows superseded by a rehash of the same path are None.
+        self.indexed_paths: List[Optional[str]] = []
+        self.path_ids: Dict[str, int] = {}
 
     def _compute_hash(self, image_path: str) -> Optional[imagehash.ImageHash]:
-        try:
-            image = Image.open(image_path)
-            phash = imagehash.phash(image, hash_size=self.hash_size)
-            return phash
-        except Exception:
-            return None
-
-    def _compute_image_minhash(self, phash: imagehash.ImageHash) -> Optional[MinHash]:
-        try:
-            minhash = MinHash(num_perm=self.num_perm)
-            for hash_value in phash.hash.flatten():
-                minhash.update(int(hash_value).to_bytes(1, byteorder="big"))
-            return minhash
-        except Exception:
-            return None
+        return self._compute_hashes([image_path])[0]
+
+    def _compute_hashes(
+        self, image_paths: List[str], max_workers: Optional[int] = None
+    ) -> List[Optional[imagehash.ImageHash]]:
+        stats: Dict[str, os.stat_result] = {}
+        for image_path in image_paths:
+            try:
+                stats[image_path] = os.stat(image_path)
+            except OSError:
+                continue
+        fingerprints = {
+            path: (path, stat.st_size, stat.st_mtime_ns) for path, stat in stats.items()
+        }
+        missing = [
+            path
+            for path, fingerprint in fingerprints.items()
+            if fingerprint not in self.hash_cache
+        ]
+
+        if self.store is not None and missing:
+            stored = self.store.get_many({path: stats[path] for path in missing})
+            for path, row in stored.items():
+                if row["phash"] and len(row["phash"]) * 4 == self.hash_size**2:
+                    self.hash_cache[fingerprints[path]] = imagehash.hex_to_hash(
+                        row["phash"]
+                    )
+            missing = [
+                path for path in missing if fingerprints[path] not in self.hash_cache
+            ]
+
+        sizes = [self.hash_size] * len(missing)
+        if len(missing) < MIN_IMAGES_FOR_PROCESS_POOL:
+            hashes = list(map(compute_image_hashes, missing, sizes))
+        else:
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as executor:
+                hashes = list(
+                    executor.map(
+                        compute_image_hashes, missing, sizes, chunksize=HASH_CHUNK_SIZE
+                    )
+                )
+
+        computed = [
+            (path, image_hashes)
+            for path, image_hashes in zip(missing, hashes)
+            if image_hashes is not None
+        ]
+        for path, (phash, _) in computed:
+            self.hash_cache[fingerprints[path]] = imagehash.hex_to_hash(phash)
+        if self.store is not None and computed:
+            self.store.put_many(
+                [
+                    (path, stats[path], {"phash": phash, "dhash": dhash})
+                    for path, (phash, dhash) in computed
+                ]
+            )
+        return [
+            self.hash_cache.get(fingerprints[path]) if path in fingerprints else None
+            for path in image_paths
+        ]
+
+    def _add_hash(self, image_path: str, phash: imagehash.ImageHash) -> int:
+        if self.image_hashes.get(image_path) == phash:
+            return self.path_ids[image_path]
+        if image_path in self.path_ids:
+            self.indexed_paths[self.path_ids[image_path]] = None
+        [row] = self.index.add(pack_hash(phash))
+        self.indexed_paths.append(image_path)
+        self.path_ids[image_path] = int(row)
+        self.image_hashes[image_path] = phash
+        return int(row)
 
     def add_image(self, image_path: str) -> None:
         phash = self._compute_hash(image_path)
         if phash is None:
             return
-        minhash = self._compute_image_minhash(phash)
-        if minhash is None:
-            return
-        self.lsh.insert(image_path, minhash)
-        self.image_hashes[image_path] = phash
+        self._add_hash(image_path, phash)
 
     def find_duplicates(self, image_path: str) -> Tuple[List[str], List[str]]:
         phash = self._compute_hash(image_path)
         if phash is None:
             return [], []
-        minhash = self._compute_image_minhash(phash)
-        if minhash is None:
-            return [], []
-        duplicates = self.lsh.query(minhash)
-        similar_files = [
-            dup for dup in duplicates if self._is_similar(phash, self.image_hashes[dup])
-        ]
-        exact_matches = [
-            dup
-            for dup in duplicates
-            if self._is_exact_match(phash, self.image_hashes[dup])
-        ]
+        [(ids, distances)] = self.index.query(pack_hash(phash))
+        similar_files, exact_matches = [], []
+        for row, distance in zip(ids, distances):
+            path = self.indexed_paths[row]
+            if path is None or path == image_path:
+                continue
+            similar_files.append(path)
+            if distance == 0:
+                exact_matches.append(path)
         return similar_files, exact_matches
 
-    def _is_similar(
-        self, phash1: imagehash.ImageHash, phash2: imagehash.ImageHash
-    ) -> bool:
-        similarity = 1 - (phash1 - phash2) / len(phash1.hash.flatten())
-        return similarity >= self.threshold
-
-    def _is_exact_match(
-        self, phash1: imagehash.ImageHash, phash2: imagehash.ImageHash
-    ) -> bool:
-        return phash1 == phash2
-
-    def deduplicate_image_paths(self, image_paths: List[str]) -> List[DuplicateResult]:
-        results: List[DuplicateResult] = []
-        with ThreadPoolExecutor() as executor:
-            futures = {
-                executor.submit(self._process_image, image_path): image_path
+    def deduplicate_image_paths(
+        self, image_paths: List[str], max_workers: Optional[int] = None
+    ) -> List[DuplicateResult]:
+        """
+        Groups of near-duplicate images among `image_paths` and the images
+        already added. Each group's original is its earliest member: images
+        added before this call, then `image_paths` in order. All of
+        `image_paths` are added.
+        """
+        image_paths = list(
+            dict.fromkeys(
+                image_path
                 for image_path in image_paths
                 if DirectoryFileOrganizer.get_file_type(image_path.split(".")[-1])
                 == FileType.IMAGE
-            }
-            for future in as_completed(futures):
-                image_path = futures[future]
-                try:
-                    duplicates, exact_matches = future.result()
-                    if duplicates or exact_matches:
-                        results.append(
-                            DuplicateResult(
-                                original=image_path,
-                                duplicates=duplicates,
-                                exact_matches=exact_matches,
-                            )
-                        )
-                except Exception:
-                    pass
-        return results
-
-    def _process_image(self, image_path: str) -> Tuple[List[str], List[str]]:
-        duplicates, exact_matches = self.find_duplicates(image_path)
-        if not duplicates and not exact_matches:
-            self.add_image(image_path)
-        return duplicates, exact_matches
+            )
+        )
+        phashes = self._compute_hashes(image_paths, max_workers)
+        hashed = [
+            (image_path, phash)
+            for image_path, phash in zip(image_paths, phashes)
+            if phash is not None
+        ]
+        if not hashed:
+            return []
+        rows = [self._add_hash(image_path, phash) for image_path, phash in hashed]
+        packed = np.stack([pack_hash(phash) for _, phash in hashed])
+
+        matches = []
+        for row, (ids, _) in zip(rows, self.index.query(packed)):
+            matches.extend(
+                (row, int(other))
+                for other in ids
+                if self.indexed_paths[other] is not None
+            )
+
+        groups = []
+        for group in group_matches(matches):
+            original, *duplicates = [self.indexed_paths[row] for row in group]
+            original_hash = self.image_hashes[original]
+            groups.append(
+                DuplicateResult(
+                    original=original,
+                    duplicates=duplicates,
+                    exact_matches=[
+                        path
+                        for path in duplicates
+                        if self.image_hashes[path] == original_hash
+                    ],
+                )
+            )
+        return groups
@@ -1,118 +1,353 @@
+import math
 import os
-import uuid
-import shutil
-from typing import List, Optional, Dict
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
-from datasketch import MinHash
+import imagehash
+import numpy as np
+from PIL import Image
 
-from services.files.deduplication.base import Deduplicator, DuplicateResult
-from services.video.frame_extractor import FrameExtractor
+from models.files import FileType
+from services.files.deduplication.base import (
+    Deduplicator,
+    DuplicateResult,
+    group_matches,
+)
+from services.files.deduplication.hamming_index import (
+    HammingIndex,
+    pack_hash,
+    popcount,
+)
+from services.files.deduplication.hash_store import SYNC_OVERLAP_SECONDS, HashStore
+from services.files.directory_file_organizer import DirectoryFileOrganizer
+from services.video.frame_sampler import sample_gray_frames
+from services.video.keyframe_extractor import KeyframeExtractor
 
-from config import Config
+FRAME_HASH_SIZE = 8
+# Frames of a re-encode or resize are usually within a few bits of the
+# original's; unrelated frames are around half the bits apart.
+FRAME_MATCH_RADIUS = 10
+# Frames flatter than this (black, fades, title cards) hash to noise and
+# would match across unrelated videos, so they are left out.
+MIN_FRAME_STDDEV = 8.0
+# Video pairs sharing fewer matching frames than this aren't scored.
+MIN_CANDIDATE_FRAMES = 2
 
-config = Config()
+Fingerprint = Tuple[str, int, int]
 
 
-"""
+def compute_video_signature(
+    video_path: str, hash_size: int = FRAME_HASH_SIZE
+) -> Optional[Dict[str, Any]]:
+    """
+    A video's frame signature as stored in the hash store: the sample
+    interval and the pHash of each sampled frame as hex, or None for frames
+    too flat to tell apart. None if the video can't be decoded.
+    """
+    try:
+        duration = KeyframeExtractor(video_path).get_duration()
+        interval, frames = sample_gray_frames(video_path, duration, hash_size * 4)
+    except (RuntimeError, ValueError, OSError):
+        return None
+    if not len(frames):
+        return None
+    return {
+        "interval": interval,
+        "frames": [
+            (
+                str(imagehash.phash(Image.fromarray(frame), hash_size=hash_size))
+                if frame.std() >= MIN_FRAME_STDDEV
+                else None
+            )
+            for frame in frames
+        ],
+    }
 
-TODO THIS NEEDS MAJOR DEBUGGING AND FIXING
 
-"""
+class VideoSignature(NamedTuple):
+    interval: float
+    hashes: np.ndarray
+    informative: np.ndarray
+
+    @classmethod
+    def from_json(cls, signature: Dict[str, Any], bits: int) -> "VideoSignature":
+        words = math.ceil(bits / 64)
+        hashes = np.zeros((len(signature["frames"]), words), np.uint64)
+        for row, frame in enumerate(signature["frames"]):
+            if frame is not None:
+                hashes[row] = pack_hash(imagehash.hex_to_hash(frame))
+        return cls(
+            float(signature["interval"]),
+            hashes,
+            np.array([frame is not None for frame in signature["frames"]], bool),
+        )
+
+    def __eq__(self, other: object) -> bool:
+        return (
+            isinstance(other, VideoSignature)
+            and self.interval == other.interval
+            and np.array_equal(self.hashes, other.hashes)
+            and np.array_equal(self.informative, other.informative)
+        )
+
+
+def alignment_score(a: VideoSignature, b: VideoSignature, radius: int) -> float:
+    """
+    Fraction of the shorter signature's informative frames that match, in
+    order, under the best time offset between the two. A frame may match
+    either of the two frames nearest its aligned position, since a trim
+    rarely falls on the sampling grid. When one interval is a multiple of
+    the other, the finer signature is subsampled at the best phase.
+    """
+    if a.interval > b.interval:
+        a, b = b, a
+    step = round(b.interval / a.interval)
+    best = 0.0
+    for phase in range(step):
+        hashes, informative = a.hashes[phase::step], a.informative[phase::step]
+        usable = min(int(informative.sum()), int(b.informative.sum()))
+        if not usable:
+            continue
+        rows, columns = np.nonzero(informative[:, None] & b.informative[None, :])
+        distances = popcount(hashes[rows] ^ b.hashes[columns])
+        rows, columns = rows[distances <= radius], columns[distances <= radius]
+        # hits[offset, row]: row matches the frame `offset` places along in b.
+        hits = np.zeros((len(hashes) + len(b.hashes), len(hashes)), bool)
+        hits[columns - rows + len(hashes) - 1, rows] = True
+        matched = (hits[:-1] | hits[1:]).sum(axis=1)
+        best = max(best, min(1.0, int(matched.max()) / usable))
+    return best
 
 
 class VideoDeduplicator(Deduplicator):
+    """
+    Near-duplicate videos (re-encodes, resizes and trims) by per-frame
+    perceptual hashes.
+
+    Each video is sampled every `sample_interval` seconds, decoded by ffmpeg
+    straight to small grayscale frames in memory and pHashed frame by frame.
+    Every informative frame goes into one `HammingIndex`, so candidate pairs
+    are the videos sharing at least `MIN_CANDIDATE_FRAMES` matching frames,
+    found without comparing every pair. Candidates match when at least
+    `threshold` of the shorter video's frames line up under
+    `alignment_score`, and matching pairs are clustered with union-find.
+
+    Signatures are computed in a thread pool, since the decoding happens in
+    ffmpeg processes, and cached per file fingerprint (path, size, mtime);
+    with a `store` they are also kept in the persistent hash store, and
+    `sync` adds every video stored there, so single videos can be checked
+    against the library.
+    """
+
     def __init__(
         self,
-        threshold: float = 0.5,
-        hash_size: int = 16,
-        num_perm: int = 256,
-        tmp_dir: str = os.path.join(
-            config.tmp_dir, f"video_frames_{str(uuid.uuid4())}"
-        ),
+        threshold: float = 0.6,
+        hash_size: int = FRAME_HASH_SIZE,
+        store: Optional[HashStore] = None,
     ):
-        super().__init__(threshold, hash_size, num_perm)
-        self.tmp_dir = tmp_dir
-        self.keyframes_dict = {}
-        self.hashes_dict = {}
-
-    def _compute_minhash(self, data: bytes) -> Optional[MinHash]:
-        try:
-            minhash = MinHash(num_perm=self.num_perm)
-            minhash.update(data)
-            return minhash
-        except Exception:
-            return None
-
-    def _extract_keyframes(self, video_path: str) -> List[bytes]:
-        video_tmp_dir = os.path.join(self.tmp_dir, os.path.basename(video_path))
-        frame_extractor = FrameExtractor(
-            video_path, method="uniform", output_dir=video_tmp_dir
+        super().__init__(threshold, hash_size)
+        self.store = store
+        self.bits = hash_size**2
+        self.signatures: Dict[str, VideoSignature] = {}
+        self.signature_cache: Dict[Fingerprint, VideoSignature] = {}
+        self.index = HammingIndex(self.bits, FRAME_MATCH_RADIUS)
+        # Index row -> video id, and video id -> path; ids of videos
+        # superseded by a rehash of the same path map to None.
+        self.frame_videos: List[int] = []
+        self.indexed_paths: List[Optional[str]] = []
+        self.path_ids: Dict[str, int] = {}
+        self.synced_until = 0.0
+
+    def _usable(self, signature: Optional[Dict[str, Any]]) -> bool:
+        """Whether a stored signature was hashed at this `hash_size`."""
+        return bool(signature) and all(
+            frame is None or len(frame) * 4 == self.bits
+            for frame in signature["frames"]
         )
-        frame_paths = frame_extractor.extract_frames(uniform_count=10)
-        keyframes = []
-        for frame_path in frame_paths:
-            with open(frame_path, "rb") as frame_file:
-                keyframes.append(frame_file.read())
-        return keyframes
-
-    def _extract_keyframes_concurrently(
-        self, video_paths: List[str]
-    ) -> Dict[str, List[bytes]]:
-        keyframes_dict = {}
-        with ThreadPoolExecutor() as executor:
-            futures = {
-                executor.submit(self._extract_keyframes, video_path): video_path
-                for video_path in video_paths
-            }
-            for future in as_completed(futures):
-                video_path = futures[future]
-                try:
-                    keyframes_dict[video_path] = future.result()
-                except Exception:
-                    keyframes_dict[video_path] = []
-        return keyframes_dict
-
-    def _compute_hashes(
-        self, keyframes_dict: Dict[str, List[bytes]]
-    ) -> Dict[str, MinHash]:
-        hashes_dict = {}
-        for video_path, keyframes in keyframes_dict.items():
-            combined_minhash = MinHash(num_perm=self.num_perm)
-            for frame in keyframes:
-                frame_minhash = self._compute_minhash(frame)
-                if frame_minhash:
-                    combined_minhash.merge(frame_minhash)
-            hashes_dict[video_path] = combined_minhash
-            self.lsh.insert(video_path, combined_minhash)
-        return hashes_dict
-
-    def deduplicate_video_paths(self, video_paths: List[str]) -> List[DuplicateResult]:
-        results = []
-
-        # Step 1: Extract all frames concurrently
-        self.keyframes_dict = self._extract_keyframes_concurrently(video_paths)
-
-        print("Extracted keyframes for all videos")
-        print(self.keyframes_dict)
-
-        # Step 2: Compute and merge hashes for each video
-        self.hashes_dict = self._compute_hashes(self.keyframes_dict)
-
-        # Step 3: Compare merged hashes to find duplicates
-        for video_path, video_minhash in self.hashes_dict.items():
-            duplicates = []
-            for other_video_path, other_video_minhash in self.hashes_dict.items():
-                if video_path != other_video_path and self.lsh.query(video_minhash):
-                    duplicates.append(other_video_path)
-            if duplicates:
-                results.append(
-                    DuplicateResult(
-                        original=video_path, duplicates=duplicates, exact_matches=[]
+
+    def _compute_signatures(
+        self, video_paths: List[str], max_workers: Optional[int] = None
+    ) -> List[Optional[VideoSignature]]:
+        stats: Dict[str, os.stat_result] = {}
+        for video_path in video_paths:
+            try:
+                stats[video_path] = os.stat(video_path)
+            except OSError:
+                continue
+        fingerprints = {
+            path: (path, stat.st_size, stat.st_mtime_ns) for path, stat in stats.items()
+        }
+        missing = [
+            path
+            for path, fingerprint in fingerprints.items()
+            if fingerprint not in self.signature_cache
+        ]
+
+        if self.store is not None and missing:
+            stored = self.store.get_many({path: stats[path] for path in missing})
+            for path, row in stored.items():
+                signature = row["video_signature"]
+                if self._usable(signature):
+                    self.signature_cache[fingerprints[path]] = VideoSignature.from_json(
+                        signature, self.bits
                     )
+            missing = [
+                path
+                for path in missing
+                if fingerprints[path] not in self.signature_cache
+            ]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            signatures = list(
+                executor.map(
+                    compute_video_signature, missing, [self.hash_size] * len(missing)
                 )
-            else:
-                self.add_video(video_path, video_path)
+            )
 
-        shutil.rmtree(self.tmp_dir, ignore_errors=True)
-        return results
+        computed = [
+            (path, signature)
+            for path, signature in zip(missing, signatures)
+            if signature is not None
+        ]
+        for path, signature in computed:
+            self.signature_cache[fingerprints[path]] = VideoSignature.from_json(
+                signature, self.bits
+            )
+        if self.store is not None and computed:
+            self.store.put_many(
+                [
+                    (path, stats[path], {"video_signature": signature})
+                    for path, signature in computed
+                ]
+            )
+        return [
+            self.signature_cache.get(fingerprints[path])
+            if path in fingerprints
+            else None
+            for path in video_paths
+        ]
+
+    def _add_signature(self, video_path: str, signature: VideoSignature) -> int:
+        if self.signatures.get(video_path) == signature:
+            return self.path_ids[video_path]
+        if video_path in self.path_ids:
+            self.indexed_paths[self.path_ids[video_path]] = None
+        video_id = len(self.indexed_paths)
+        self.index.add(signature.hashes[signature.informative])
+        self.frame_videos.extend([video_id] * int(signature.informative.sum()))
+        self.indexed_paths.append(video_path)
+        self.path_ids[video_path] = video_id
+        self.signatures[video_path] = signature
+        return video_id
+
+    def _candidates(self, video_ids: List[int]) -> List[Tuple[int, int]]:
+        """Pairs of live videos, one of them in `video_ids`, sharing frames."""
+        signatures = [self.signatures[self.indexed_paths[i]] for i in video_ids]
+        queries = [s.hashes[s.informative] for s in signatures]
+        if not sum(map(len, queries)):
+            return []
+        query_videos = np.repeat(video_ids, [len(query) for query in queries])
+        results = self.index.query(np.concatenate(queries))
+        frame_videos = np.asarray(self.frame_videos)
+        counts = np.array([len(ids) for ids, _ in results])
+        query_frames = np.repeat(np.arange(len(results)), counts)
+        others = frame_videos[np.concatenate([ids for ids, _ in results])]
+        # Each query frame votes once per other video it matches.
+        frame_votes = np.unique(np.stack([query_frames, others]), axis=1)
+        pairs = np.stack([query_videos[frame_votes[0]], frame_votes[1]])
+        pairs = np.sort(pairs[:, pairs[0] != pairs[1]], axis=0)
+        pairs, votes = np.unique(pairs, axis=1, return_counts=True)
+        return [
+            (int(a), int(b))
+            for a, b in pairs[:, votes >= MIN_CANDIDATE_FRAMES].T
+            if self.indexed_paths[a] is not None and self.indexed_paths[b] is not None
+        ]
+
+    def _matches(self, a: int, b: int) -> bool:
+        return (
+            alignment_score(
+                self.signatures[self.indexed_paths[a]],
+                self.signatures[self.indexed_paths[b]],
+                FRAME_MATCH_RADIUS,
+            )
+            >= self.threshold
+        )
+
+    def sync(self) -> None:
+        """Adds the videos stored since the last call, by any process."""
+        if self.store is None:
+            return
+        for row in self.store.video_signatures(
+            self.synced_until - SYNC_OVERLAP_SECONDS
+        ):
+            self.synced_until = max(self.synced_until, row["hashed_at"])
+            if self._usable(row["video_signature"]):
+                self._add_signature(
+                    row["path"],
+                    VideoSignature.from_json(row["video_signature"], self.bits),
+                )
+
+    def add_video(self, video_path: str) -> None:
+        [signature] = self._compute_signatures([video_path])
+        if signature is None:
+            return
+        self._add_signature(video_path, signature)
+
+    def find_duplicates(self, video_path: str) -> Tuple[List[str], List[str]]:
+        [signature] = self._compute_signatures([video_path])
+        if signature is None:
+            return [], []
+        video_id = self._add_signature(video_path, signature)
+        similar_files, exact_matches = [], []
+        for a, b in self._candidates([video_id]):
+            other = b if a == video_id else a
+            if self._matches(a, b):
+                path = self.indexed_paths[other]
+                similar_files.append(path)
+                if self.signatures[path] == signature:
+                    exact_matches.append(path)
+        return similar_files, exact_matches
+
+    def deduplicate_video_paths(
+        self, video_paths: List[str], max_workers: Optional[int] = None
+    ) -> List[DuplicateResult]:
+        """
+        Groups of near-duplicate videos among `video_paths` and the videos
+        already added. Each group's original is its earliest member: videos
+        added before this call, then `video_paths` in order. All of
+        `video_paths` are added.
+        """
+        video_paths = list(
+            dict.fromkeys(
+                video_path
+                for video_path in video_paths
+                if DirectoryFileOrganizer.get_file_type(video_path.split(".")[-1])
+                == FileType.VIDEO
+            )
+        )
+        signatures = self._compute_signatures(video_paths, max_workers)
+        video_ids = [
+            self._add_signature(video_path, signature)
+            for video_path, signature in zip(video_paths, signatures)
+            if signature is not None
+        ]
+        if not video_ids:
+            return []
+        matches = [pair for pair in self._candidates(video_ids) if self._matches(*pair)]
+
+        groups = []
+        for group in group_matches(matches):
+            original, *duplicates = [self.indexed_paths[i] for i in group]
+            original_signature = self.signatures[original]
+            groups.append(
+                DuplicateResult(
+                    original=original,
+                    duplicates=duplicates,
+                    exact_matches=[
+                        path
+                        for path in duplicates
+                        if self.signatures[path] == original_signature
+                    ],
+                )
+            )
+        return groups
@@ -40,7 +40,17 @@ class DirectoryFileOrganizer:
             return FileType.OTHER
 
     @staticmethod
-    def list_files_recursive(directory_path: str) -> List[str]:
+    def list_files_recursive(directory_path: str, use_index: bool = False) -> List[str]:
+        """
+        Every file under `directory_path`. With `use_index`, the persistent
+        file index is refreshed incrementally and queried instead of walking
+        the whole tree.
+        """
+        if use_index:
+            from services.files.file_index import FileIndex
+
+            return FileIndex.from_config().list_files(directory_path)
+
         file_paths = []
         for root, _, files in os.walk(directory_path):
             for file in files:
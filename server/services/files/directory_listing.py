@@ -0,0 +1,146 @@
+import base64
+import datetime
+import mimetypes
+import os
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# Entries are handed from the walker thread to the event loop in pages of
+# this size, so the per-hop cost is paid once per page rather than per file.
+LISTING_PAGE_SIZE = 500
+
+
+def encode_cursor(relative_path: str) -> str:
+    return base64.urlsafe_b64encode(relative_path.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> List[str]:
+    try:
+        relative_path = base64.urlsafe_b64decode(cursor.encode()).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    return relative_path.split("/")
+
+
+@lru_cache(maxsize=1024)
+def _guess_mime_type(extension: str) -> Optional[str]:
+    return mimetypes.guess_type(f"file{extension}")[0]
+
+
+def _format_timestamp(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def entry_details(entry: os.DirEntry, relative_path: str) -> Optional[dict]:
+    """
+    Details of a directory entry. The stat comes from the `DirEntry` cache, so
+    each entry costs at most one syscall; broken symlinks are skipped.
+    """
+    try:
+        stat = entry.stat()
+        is_directory = entry.is_dir()
+    except OSError:
+        return None
+    mime_type = _guess_mime_type(os.path.splitext(entry.name)[1].lower())
+    return {
+        "name": entry.name,
+        "path": entry.path,
+        "is_directory": is_directory,
+        "generic_file_type": mime_type.split("/")[0] if mime_type else "unknown",
+        "specific_file_type": mime_type if mime_type else "unknown",
+        "size_bytes": stat.st_size,
+        "added_at": _format_timestamp(stat.st_ctime),
+        "created_at": _format_timestamp(stat.st_ctime),
+        "modified_at": _format_timestamp(stat.st_mtime),
+        "cursor": encode_cursor(relative_path),
+    }
+
+
+def _sorted_entries(path: str) -> List[os.DirEntry]:
+    try:
+        with os.scandir(path) as entries:
+            return sorted(entries, key=lambda entry: entry.name)
+    except (PermissionError, NotADirectoryError, FileNotFoundError):
+        return []
+
+
+def walk_directory(
+    path: str,
+    max_depth: Optional[int] = 1,
+    cursor: Optional[str] = None,
+) -> Iterator[dict]:
+    """
+    Lazily lists `path` depth-first with `os.scandir`, `max_depth` levels deep
+    (1 is the directory itself, None is unlimited).
+
+    Entries come out in name order, each directory right before its contents,
+    so a listing can be resumed from any entry's `cursor`: the walk skips
+    straight past it by comparing names, without re-listing anything before
+    it. Only the directories on the current branch are held in memory.
+    Symlinked directories are listed but not descended into, to avoid cycles.
+    """
+    # Validated here rather than inside the generator, so bad input fails
+    # before a response starts.
+    if not os.path.isdir(path):
+        raise FileNotFoundError(path)
+    return _walk(path, max_depth, decode_cursor(cursor) if cursor else [])
+
+
+def _walk(path: str, max_depth: Optional[int], resume: List[str]) -> Iterator[dict]:
+    # Each frame is (entries, position, depth, relative path, cursor remainder).
+    stack: List[Tuple[List[os.DirEntry], int, int, str, List[str]]] = [
+        (_sorted_entries(path), 0, 1, "", resume)
+    ]
+    while stack:
+        entries, position, depth, prefix, resume = stack.pop()
+        if position >= len(entries):
+            continue
+        entry = entries[position]
+        stack.append((entries, position + 1, depth, prefix, resume))
+        relative_path = f"{prefix}{entry.name}"
+
+        if resume:
+            if entry.name < resume[0]:
+                continue
+            if entry.name > resume[0]:
+                # Past the cursor at this level: everything from here is new.
+                stack[-1] = (entries, position + 1, depth, prefix, [])
+                resume = []
+            else:
+                # The cursor entry itself (or one of its ancestors) has
+                # already been returned; its unreturned contents have not.
+                stack[-1] = (entries, position + 1, depth, prefix, [])
+                resume = resume[1:]
+                if max_depth is None or depth < max_depth:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(
+                            (
+                                _sorted_entries(entry.path),
+                                0,
+                                depth + 1,
+                                f"{relative_path}/",
+                                resume,
+                            )
+                        )
+                continue
+
+        details = entry_details(entry, relative_path)
+        if details is None:
+            continue
+        yield details
+        if details["is_directory"] and (max_depth is None or depth < max_depth):
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(
+                    (_sorted_entries(entry.path), 0, depth + 1, f"{relative_path}/", [])
+                )
+
+
+def paginate(entries: Iterable[dict], page_size: int) -> Iterator[List[dict]]:
+    page = []
+    for entry in entries:
+        page.append(entry)
+        if len(page) >= page_size:
+            yield page
+            page = []
+    if page:
+        yield page
@@ -0,0 +1,331 @@
+"""
+Persistent index of the files under the configured root paths.
+
+Build or refresh it from the `server` directory:
+
+    python -m services.files.file_index
+    python -m services.files.file_index ~/Pictures --full --hash
+"""
+
+import argparse
+import os
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from config import Config
+from dbio.sqlite import SQLiteDatabaseAdapter
+from models.files import FileType
+from services.files.directory_file_organizer import DirectoryFileOrganizer
+from services.files.uploads import hash_file
+
+
+class ScanStats(NamedTuple):
+    directories: int
+    directories_listed: int
+    files_added: int
+    files_updated: int
+    files_removed: int
+    seconds: float
+
+
+ChangeHandler = Callable[[List[Dict[str, Any]]], None]
+
+
+def _under(path: str, root: str) -> bool:
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def _file_row(path: str, stat: os.stat_result) -> Dict[str, Any]:
+    directory, name = os.path.split(path)
+    return {
+        "path": path,
+        "directory": directory,
+        "name": name,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "inode": stat.st_ino,
+        "content_hash": None,
+        "file_type": DirectoryFileOrganizer.get_file_type(
+            os.path.splitext(name)[1]
+        ).value,
+    }
+
+
+def _unchanged(row: Dict[str, Any], stat: os.stat_result) -> bool:
+    return (
+        row["size"] == stat.st_size
+        and row["mtime"] == stat.st_mtime
+        and row["inode"] == stat.st_ino
+    )
+
+
+class FileIndex:
+    """
+    Path, size, mtime, inode, content hash and `FileType` of every file under
+    the scanned roots, kept in SQLite so callers can query it instead of
+    walking the disk.
+
+    A directory's mtime changes whenever an entry is added, removed or
+    renamed in it, so rescans stat each directory and only list the ones whose
+    mtime moved; the subdirectories of unchanged ones come from the index.
+    A warm rescan therefore costs one stat per directory and none per file.
+    Files rewritten in place don't touch their directory's mtime, so those
+    are only picked up by a `full` rescan. Content hashes are computed on
+    request and kept until the file's size, mtime or inode changes.
+    """
+
+    def __init__(self, database_path: str, schema_path: Optional[str] = None):
+        self.index = SQLiteDatabaseAdapter(database_path, schema_path)
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def from_config(cls) -> "FileIndex":
+        config = Config()
+        return cls(config.file_index_database_path, config.file_index_schema_path)
+
+    def _select_under(self, table: str, root: str) -> List[Dict[str, Any]]:
+        # LIKE is case-insensitive and treats `_` as a wildcard, so it only
+        # narrows the candidates down.
+        rows = self.index.select_like(table, "path", f"{root.rstrip(os.sep)}{os.sep}%")
+        rows += self.index.select(table, "*", {"path": root})
+        return [row for row in rows if _under(row["path"], root)]
+
+    def is_indexed(self, root: str) -> bool:
+        return bool(self.index.select("indexed_directories", "path", {"path": root}))
+
+    def directories(self, root: str) -> List[str]:
+        return [row["path"] for row in self._select_under("indexed_directories", root)]
+
+    def scan(
+        self,
+        root: str,
+        full: bool = False,
+        hash_contents: bool = False,
+        on_changed: Optional[ChangeHandler] = None,
+    ) -> ScanStats:
+        """
+        Brings the index for everything under `root` up to date, passing the
+        rows of new and modified files to `on_changed` a directory at a time.
+        """
+        start = time.perf_counter()
+        root = os.path.abspath(root)
+        known = {
+            row["path"]: row for row in self._select_under("indexed_directories", root)
+        }
+        children: Dict[str, List[str]] = {}
+        for path, row in known.items():
+            children.setdefault(row["parent"], []).append(path)
+
+        seen, listed = set(), 0
+        added = updated = removed = 0
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                mtime = os.stat(directory).st_mtime
+            except OSError:
+                continue
+            seen.add(directory)
+            row = known.get(directory)
+            if not full and row is not None and row["mtime"] == mtime:
+                stack.extend(children.get(directory, []))
+                continue
+
+            listed += 1
+            counts = self._scan_directory(directory, stack, on_changed)
+            added += counts[0]
+            updated += counts[1]
+            removed += counts[2]
+            self.index.upsert(
+                "indexed_directories",
+                {
+                    "path": directory,
+                    "parent": os.path.dirname(directory),
+                    "mtime": mtime,
+                    "scanned_at": time.time(),
+                },
+                ["path"],
+            )
+
+        for directory in known.keys() - seen:
+            removed += len(
+                self.index.delete("indexed_files", {"directory": directory}) or []
+            )
+            self.index.delete("indexed_directories", {"path": directory})
+
+        if hash_contents:
+            self._hash_missing(root)
+        return ScanStats(
+            len(seen), listed, added, updated, removed, time.perf_counter() - start
+        )
+
+    def _scan_directory(
+        self,
+        directory: str,
+        stack: List[str],
+        on_changed: Optional[ChangeHandler] = None,
+    ) -> Tuple[int, int, int]:
+        """
+        Lists one directory, queueing its subdirectories on `stack`, and
+        returns how many files were added, updated and removed.
+        """
+        existing = {
+            row["name"]: row
+            for row in self.index.select("indexed_files", "*", {"directory": directory})
+        }
+        rows, added, updated = [], 0, 0
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                            continue
+                        if not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    row = existing.pop(entry.name, None)
+                    if row is not None and _unchanged(row, stat):
+                        continue
+                    rows.append(_file_row(entry.path, stat))
+                    if row is None:
+                        added += 1
+                    else:
+                        updated += 1
+        except OSError:
+            pass
+
+        if rows:
+            self.index.upsert_many("indexed_files", rows, ["path"])
+            if on_changed is not None:
+                on_changed(rows)
+        for row in existing.values():
+            self.index.delete("indexed_files", {"path": row["path"]})
+        return added, updated, len(existing)
+
+    def _hash_missing(self, root: str) -> None:
+        rows = []
+        for row in self._select_under("indexed_files", root):
+            if row["content_hash"] is not None:
+                continue
+            try:
+                rows.append({**row, "content_hash": hash_file(row["path"]).hexdigest()})
+            except OSError:
+                continue
+        if rows:
+            self.index.upsert_many("indexed_files", rows, ["path"])
+
+    def refresh(
+        self,
+        roots: Optional[List[str]] = None,
+        full: bool = False,
+        hash_contents: bool = False,
+        on_changed: Optional[ChangeHandler] = None,
+    ) -> Dict[str, ScanStats]:
+        """Rescans `roots`, the configured root paths by default."""
+        return {
+            root: self.scan(root, full, hash_contents, on_changed)
+            for root in roots or Config().root_paths
+        }
+
+    def update_file(self, path: str) -> Optional[Dict[str, Any]]:
+        """
+        Re-stats a single file, for changes that leave the directory's mtime
+        alone such as in-place rewrites. Returns its row if it changed.
+        """
+        rows = self.index.select("indexed_files", "*", {"path": path})
+        try:
+            stat = os.stat(path)
+        except OSError:
+            if rows:
+                self.index.delete("indexed_files", {"path": path})
+            return None
+        if rows and _unchanged(rows[0], stat):
+            return None
+        row = _file_row(path, stat)
+        self.index.upsert("indexed_files", row, ["path"])
+        return row
+
+    def files(
+        self, root: str, file_type: Optional[FileType] = None
+    ) -> List[Dict[str, Any]]:
+        rows = self._select_under("indexed_files", os.path.abspath(root))
+        if file_type is not None:
+            rows = [row for row in rows if row["file_type"] == file_type.value]
+        return sorted(rows, key=lambda row: row["path"])
+
+    def list_files(
+        self, root: str, file_type: Optional[FileType] = None, refresh: bool = True
+    ) -> List[str]:
+        """
+        Paths of the files under `root`, after an incremental rescan unless
+        `refresh` is False.
+        """
+        if refresh:
+            self.scan(root)
+        return [row["path"] for row in self.files(root, file_type)]
+
+    def paths_of_size(self, size: int) -> List[str]:
+        """Indexed files of exactly `size` bytes: the only possible copies."""
+        return [
+            row["path"]
+            for row in self.index.select("indexed_files", "path", {"size": size})
+        ]
+
+    def content_hash(self, path: str) -> str:
+        """The file's sha256, from the index while it is unchanged on disk."""
+        stat = os.stat(path)
+        rows = self.index.select("indexed_files", "*", {"path": path})
+        if rows and rows[0]["content_hash"] is not None and _unchanged(rows[0], stat):
+            return rows[0]["content_hash"]
+        content_hash = hash_file(path).hexdigest()
+        if rows:
+            self.index.update(
+                "indexed_files",
+                {
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "inode": stat.st_ino,
+                    "content_hash": content_hash,
+                },
+                {"path": path},
+            )
+        return content_hash
+
+    def close(self) -> None:
+        self.index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument(
+        "roots", nargs="*", help="Folders to index (default: configured root paths)"
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Restat every file, not only those in changed directories",
+    )
+    parser.add_argument(
+        "--hash", action="store_true", help="Compute missing content hashes"
+    )
+    args = parser.parse_args()
+
+    roots = [os.path.abspath(os.path.expanduser(root)) for root in args.roots]
+    results = FileIndex.from_config().refresh(roots or None, args.full, args.hash)
+    if not results:
+        print("No root paths configured")
+    for root, stats in results.items():
+        print(
+            f"{root}: {stats.directories} directories "
+            f"({stats.directories_listed} listed), {stats.files_added} added, "
+            f"{stats.files_updated} updated, {stats.files_removed} removed "
+            f"in {stats.seconds:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import sys
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from models.files import FileType
+from services.files.file_index import FileIndex
+from services.jobs import JobQueue
+
+logger = logging.getLogger("uvicorn")
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_ONLYDIR
+    | IN_DONT_FOLLOW
+)
+STRUCTURE_EVENTS = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+# Events keep being collected until none arrive for `debounce_seconds`, but a
+# steady stream (a long copy) is still flushed after this many debounce periods.
+MAX_DEBOUNCE_PERIODS = 10
+WATCHED_FILE_TYPES = {FileType.IMAGE.value, FileType.VIDEO.value}
+
+
+class Inotify:
+    """Minimal ctypes binding for Linux inotify, read from the event loop."""
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths: Dict[int, str] = {}
+
+    @staticmethod
+    def available() -> bool:
+        return sys.platform.startswith("linux")
+
+    def add_watch(self, path: str) -> None:
+        wd = self._libc.inotify_add_watch(
+            self.fd, os.fsencode(path), ctypes.c_uint32(WATCH_MASK)
+        )
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        self.paths[wd] = path
+
+    def remove_watches_under(self, path: str) -> None:
+        prefix = path.rstrip(os.sep) + os.sep
+        for wd, watched in list(self.paths.items()):
+            if watched == path or watched.startswith(prefix):
+                self._libc.inotify_rm_watch(self.fd, wd)
+                self.paths.pop(wd, None)
+
+    def read_events(self) -> List[Tuple[Optional[str], str, int]]:
+        """Drains pending events as (directory, name, mask)."""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+                offset += length
+                if mask & IN_IGNORED:
+                    self.paths.pop(wd, None)
+                    continue
+                events.append((self.paths.get(wd), name, mask))
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class FileWatcher:
+    """
+    Keeps the file index current while the server runs and hands new or
+    changed media to the job queue for metadata, thumbnails and dedup.
+
+    On Linux every directory under the roots gets an inotify watch. Events
+    are coalesced per directory (entries added, removed or renamed) and per
+    file (rewritten in place) and applied once they have been quiet for
+    `debounce_seconds`: directories through an incremental index rescan,
+    files through a single re-stat. Elsewhere, or when the watch limit is
+    hit, the roots are rescanned every `poll_interval_seconds` instead, which
+    only costs a stat per directory. Roots that were never indexed are
+    indexed once without queueing anything, so the first start doesn't
+    queue the whole library.
+    """
+
+    def __init__(
+        self,
+        index: FileIndex,
+        roots: List[str],
+        job_queue: JobQueue,
+        debounce_seconds: float,
+        poll_interval_seconds: float,
+    ):
+        self.index = index
+        self.roots = [os.path.abspath(root) for root in roots if os.path.isdir(root)]
+        self.job_queue = job_queue
+        self.debounce_seconds = debounce_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.inotify: Optional[Inotify] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+        self._dirty_directories: Set[str] = set()
+        self._new_directories: Set[str] = set()
+        self._dirty_files: Set[str] = set()
+
+    async def start(self) -> None:
+        if self.roots:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.inotify:
+            asyncio.get_running_loop().remove_reader(self.inotify.fd)
+            self.inotify.close()
+            self.inotify = None
+
+    async def _run(self) -> None:
+        for root in self.roots:
+            if not self.index.is_indexed(root):
+                await asyncio.to_thread(self.index.scan, root)
+
+        if Inotify.available():
+            try:
+                self.inotify = Inotify()
+                await asyncio.to_thread(self._watch_all)
+            except OSError as e:
+                logger.warning(f"inotify unavailable ({e}) - polling for changes")
+                if self.inotify:
+                    self.inotify.close()
+                    self.inotify = None
+
+        if self.inotify is None:
+            while True:
+                await self._apply(self.roots, [], [])
+                await asyncio.sleep(self.poll_interval_seconds)
+
+        asyncio.get_running_loop().add_reader(self.inotify.fd, self._on_events)
+        # Catches up with whatever changed while the server was down; the
+        # watches are already in place, so nothing from here on is missed.
+        await self._apply(self.roots, [], [])
+        while True:
+            await self._debounce()
+            directories, self._dirty_directories = self._dirty_directories, set()
+            new, self._new_directories = self._new_directories, set()
+            files, self._dirty_files = self._dirty_files, set()
+            await self._apply(sorted(directories), sorted(new), sorted(files))
+
+    def _watch_all(self) -> None:
+        for root in self.roots:
+            for directory in self.index.directories(root):
+                self.inotify.add_watch(directory)
+
+    def _watch_tree(self, path: str) -> None:
+        for directory, _, _ in os.walk(path):
+            self.inotify.add_watch(directory)
+
+    def _on_events(self) -> None:
+        for directory, name, mask in self.inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                self._dirty_directories.update(self.roots)
+                self._changed.set()
+            if directory is None:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR and mask & IN_MOVED_FROM:
+                self.inotify.remove_watches_under(path)
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                self._new_directories.add(path)
+            if mask & STRUCTURE_EVENTS:
+                self._dirty_directories.add(directory)
+            elif mask & IN_CLOSE_WRITE:
+                self._dirty_files.add(path)
+            self._changed.set()
+
+    async def _debounce(self) -> None:
+        await self._changed.wait()
+        for _ in range(MAX_DEBOUNCE_PERIODS):
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), self.debounce_seconds)
+            except asyncio.TimeoutError:
+                return
+
+    async def _apply(
+        self, directories: List[str], new_directories: List[str], files: List[str]
+    ) -> None:
+        try:
+            changed = await asyncio.to_thread(
+                self._update_index, directories, new_directories, files
+            )
+            await self._submit_jobs(list(changed.values()))
+        except Exception as e:
+            logger.error(f"File watcher failed to apply changes: {e}")
+
+    def _update_index(
+        self, directories: List[str], new_directories: List[str], files: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        changed: Dict[str, Dict[str, Any]] = {}
+
+        def collect(rows: List[Dict[str, Any]]) -> None:
+            changed.update((row["path"], row) for row in rows)
+
+        # New directories are watched before they are listed, so files that
+        # land in them in between are either listed or produce an event.
+        for directory in new_directories:
+            try:
+                self._watch_tree(directory)
+            except OSError as e:
+                logger.warning(f"Could not watch {directory}: {e}")
+        for directory in directories:
+            self.index.scan(directory, on_changed=collect)
+        for path in files:
+            row = self.index.update_file(path)
+            if row is not None:
+                changed[path] = row
+        return changed
+
+    async def _submit_jobs(self, rows: List[Dict[str, Any]]) -> None:
+        rows = [
+            row
+            for row in rows
+            if row["file_type"] in WATCHED_FILE_TYPES
+            and not row["name"].startswith(".")
+        ]
+        for row in rows:
+            await self.job_queue.submit("metadata", {"path": row["path"]})
+            await self.job_queue.submit("cache_thumbnails", {"path": row["path"]})
+        if rows:
+            # Each file is checked against the whole library, not just the
+            # rest of its batch, so a single new copy is caught too.
+            await self.job_queue.submit(
+                "check_duplicates", {"paths": [row["path"] for row in rows]}
+            )
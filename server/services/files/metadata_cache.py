@@ -0,0 +1,159 @@
+import atexit
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Optional, Type
+
+from config import Config
+from dbio.sqlite import SQLiteDatabaseAdapter
+from models.file_metadata import (
+    ArchiveMetadata,
+    AudioMetadata,
+    DocumentMetadata,
+    FileMetadata,
+    ImageMetadata,
+    TextMetadata,
+    VideoMetadata,
+)
+from services.files.uploads import hash_file
+
+# Bump whenever an extractor or metadata model changes what it produces, so
+# rows written by the old code are re-extracted.
+METADATA_SCHEMA_VERSION = 5
+# Counters are added to the persisted totals every this many lookups (and at
+# exit), so a cache hit doesn't pay for a write.
+STATS_FLUSH_INTERVAL = 1000
+# Every process adds its counts to this one row.
+STATS_ROW_ID = 1
+
+METADATA_TYPES: Dict[str, Type[FileMetadata]] = {
+    model.__name__: model
+    for model in (
+        FileMetadata,
+        ImageMetadata,
+        VideoMetadata,
+        TextMetadata,
+        AudioMetadata,
+        ArchiveMetadata,
+        DocumentMetadata,
+    )
+}
+
+
+class MetadataCache:
+    """
+    Persistent cache of extracted metadata.
+
+    Entries are keyed by path and valid while the file's size, mtime and
+    inode match, so re-running extraction over an unchanged library costs a
+    stat and an indexed lookup per file. With `verify_content`, a file whose
+    stat changed but whose sha256 did not (a `touch`, a copy that kept the
+    bytes) is still a hit. Hits and misses are counted per process and
+    flushed into the database so they can be read from anywhere.
+    """
+
+    def __init__(
+        self,
+        database_path: str,
+        schema_path: Optional[str] = None,
+        verify_content: bool = False,
+        schema_version: int = METADATA_SCHEMA_VERSION,
+    ):
+        self.index = SQLiteDatabaseAdapter(database_path, schema_path)
+        self.verify_content = verify_content
+        self.schema_version = schema_version
+        self.hits = 0
+        self.misses = 0
+        self._unflushed = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        atexit.register(self.flush_stats)
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def from_config(cls) -> "MetadataCache":
+        config = Config()
+        return cls(
+            config.metadata_cache_database_path,
+            config.metadata_cache_schema_path,
+            config.metadata_cache_verify_content,
+        )
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+            self._unflushed[name] += 1
+            flush = sum(self._unflushed.values()) >= STATS_FLUSH_INTERVAL
+        if flush:
+            self.flush_stats()
+
+    def get(self, path: str, stat: os.stat_result) -> Optional[FileMetadata]:
+        rows = self.index.select("metadata_cache", "*", {"path": path})
+        row = rows[0] if rows else None
+        if row is None or row["schema_version"] != self.schema_version:
+            self._count("misses")
+            return None
+
+        fresh = (
+            row["size"] == stat.st_size
+            and row["mtime"] == stat.st_mtime
+            and row["inode"] == stat.st_ino
+        )
+        if not fresh and self.verify_content and row["content_hash"]:
+            fresh = (
+                row["size"] == stat.st_size
+                and hash_file(path).hexdigest() == row["content_hash"]
+            )
+            if fresh:
+                self.index.update(
+                    "metadata_cache",
+                    {"mtime": stat.st_mtime, "inode": stat.st_ino},
+                    {"path": path},
+                )
+        if not fresh:
+            self._count("misses")
+            return None
+
+        self._count("hits")
+        return METADATA_TYPES[row["metadata_type"]](**row["metadata"])
+
+    def put(self, path: str, stat: os.stat_result, metadata: FileMetadata) -> None:
+        self.index.upsert(
+            "metadata_cache",
+            {
+                "path": path,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "inode": stat.st_ino,
+                "content_hash": (
+                    hash_file(path).hexdigest() if self.verify_content else None
+                ),
+                "schema_version": self.schema_version,
+                "metadata_type": type(metadata).__name__,
+                "metadata": metadata.model_dump(mode="json"),
+                "extracted_at": time.time(),
+            },
+            ["path"],
+        )
+
+    def flush_stats(self) -> None:
+        with self._lock:
+            unflushed, self._unflushed = self._unflushed, {"hits": 0, "misses": 0}
+        if any(unflushed.values()):
+            self.index.increment(
+                "metadata_cache_stats",
+                {"id": STATS_ROW_ID, "flushed_at": time.time()},
+                unflushed,
+            )
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss totals across all processes, plus this process's own."""
+        self.flush_stats()
+        rows = self.index.select("metadata_cache_stats", "hits, misses")
+        return {
+            "hits": sum(row["hits"] for row in rows),
+            "misses": sum(row["misses"] for row in rows),
+            "process_hits": self.hits,
+            "process_misses": self.misses,
+            "schema_version": self.schema_version,
+        }
@@ -3,15 +3,18 @@ import zipfile
 import tarfile
 
 from models.file_metadata import ArchiveMetadata
-from services.files.metadata_extraction.base import MetadataExtractor
+from services.files.metadata_extraction.base import (
+    MetadataExtractor,
+    format_timestamp,
+)
 
 
 class ArchiveMetadataExtractor(MetadataExtractor):
     def extract_metadata(self, file_path: str) -> ArchiveMetadata:
         try:
             size = os.path.getsize(file_path)
-            created_at = os.path.getctime(file_path)
-            modified_at = os.path.getmtime(file_path)
+            created_at = format_timestamp(os.path.getctime(file_path))
+            modified_at = format_timestamp(os.path.getmtime(file_path))
         except (OSError, ValueError) as e:
             raise RuntimeError(f"Failed to retrieve file system metadata: {str(e)}")
 
@@ -2,7 +2,10 @@ import os
 import ffmpeg
 
 from models.file_metadata import AudioMetadata
-from services.files.metadata_extraction.base import MetadataExtractor
+from services.files.metadata_extraction.base import (
+    MetadataExtractor,
+    format_timestamp,
+)
 
 
 class AudioMetadataExtractor(MetadataExtractor):
@@ -12,8 +15,8 @@ class AudioMetadataExtractor(MetadataExtractor):
                 raise FileNotFoundError(f"File not found: {file_path}")
 
             size = os.path.getsize(file_path)
-            created_at = os.path.getctime(file_path)
-            modified_at = os.path.getmtime(file_path)
+            created_at = format_timestamp(os.path.getctime(file_path))
+            modified_at = format_timestamp(os.path.getmtime(file_path))
 
             try:
                 probe = ffmpeg.probe(file_path)
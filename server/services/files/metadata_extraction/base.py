@@ -1,7 +1,15 @@
+import datetime
 from abc import ABC, abstractmethod
 
 from models.file_metadata import FileMetadata
 
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def format_timestamp(timestamp: float) -> str:
+    """Formats an `os.stat` time the way the file metadata stores it."""
+    return datetime.datetime.fromtimestamp(timestamp).strftime(TIMESTAMP_FORMAT)
+
 
 class MetadataExtractor(ABC):
     @abstractmethod
@@ -0,0 +1,350 @@
+"""
+EXIF/IPTC/XMP/GPS metadata read straight from an image's header, on any
+platform.
+
+Returns the same shapes as the ImageIO-based functions in
+`image_metadata_functions` (`{TIFF}`, `{Exif}`, `{GPS}` and `{IPTC}`
+dictionaries of stringified values, XMP keyed `prefix:name`) without needing
+pyobjc. The file is opened once and only its first `HEADER_READ_BYTES` are
+read; Pillow parses the header from that buffer and never decodes pixels.
+Files whose metadata runs past the buffer are reread in full.
+"""
+
+import io
+import xml.etree.ElementTree as ET
+from typing import Any, BinaryIO, Dict, NamedTuple, Optional, Tuple
+
+from PIL import ExifTags, Image, TiffImagePlugin
+from pillow_heif import register_heif_opener
+
+HEADER_READ_BYTES = 512 * 1024
+
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+INTEROP_IFD = 0xA005
+MAKER_NOTE = 0x927C
+XMP_TAG = 700
+IPTC_TAG = 33723
+PHOTOSHOP_IPTC_RESOURCE = 0x0404
+# IFD0 pointers and blobs that are either parsed separately or meaningless
+# once stringified.
+SKIPPED_TAGS = {EXIF_IFD, GPS_IFD, INTEROP_IFD, MAKER_NOTE, XMP_TAG, IPTC_TAG, 34377}
+
+XMP_MARKER = b"http://ns.adobe.com/xap/1.0/\x00"
+RDF_NAMESPACE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+RDF_CONTAINERS = {f"{{{RDF_NAMESPACE}}}{name}" for name in ("Seq", "Bag", "Alt")}
+
+# IPTC IIM record 2 datasets, named as ImageIO names them.
+IPTC_DATASETS = {
+    5: "ObjectName",
+    10: "Urgency",
+    15: "Category",
+    20: "SupplementalCategory",
+    25: "Keywords",
+    40: "SpecialInstructions",
+    55: "DateCreated",
+    60: "TimeCreated",
+    80: "Byline",
+    85: "BylineTitle",
+    90: "City",
+    92: "SubLocation",
+    95: "ProvinceState",
+    100: "CountryPrimaryLocationCode",
+    101: "CountryPrimaryLocationName",
+    103: "OriginalTransmissionReference",
+    105: "Headline",
+    110: "Credit",
+    115: "Source",
+    116: "CopyrightNotice",
+    118: "Contact",
+    120: "CaptionAbstract",
+    122: "WriterEditor",
+}
+IPTC_LIST_DATASETS = {20, 25, 80, 85, 118, 122}
+
+COLOR_MODELS = {"1": "Gray", "L": "Gray", "LA": "Gray", "I;16": "Gray", "P": "RGB"}
+COLOR_MODELS.update({mode: "RGB" for mode in ("RGB", "RGBA", "RGBX", "YCbCr")})
+COLOR_MODELS.update({"CMYK": "CMYK", "LAB": "Lab"})
+
+
+class ImageHeaderMetadata(NamedTuple):
+    width: Optional[int]
+    height: Optional[int]
+    format: Optional[str]
+    color_mode: Optional[str]
+    properties: Dict[str, Any]
+    xmp: Optional[Dict[str, Any]]
+    location: Optional[Tuple[float, float]]
+
+
+def _stringify(value: Any) -> Any:
+    """Matches how the ImageIO path turned NSNumber/NSString values into str."""
+    if isinstance(value, tuple):
+        return [_stringify(item) for item in value]
+    if isinstance(value, TiffImagePlugin.IFDRational):
+        try:
+            return str(float(value))
+        except ZeroDivisionError:
+            return "0.0"
+    if isinstance(value, bytes):
+        text = value.rstrip(b"\x00")
+        if text.isascii() and all(byte >= 0x20 for byte in text):
+            return text.decode("ascii")
+        return [str(byte) for byte in value]
+    if isinstance(value, str):
+        return value.rstrip("\x00").strip()
+    return str(value)
+
+
+def _named_tags(ifd: Dict[int, Any], names: Dict[int, str]) -> Dict[str, Any]:
+    return {
+        names[tag]: _stringify(value)
+        for tag, value in ifd.items()
+        if tag in names and tag not in SKIPPED_TAGS
+    }
+
+
+def _dms_to_degrees(value: Any, reference: Any) -> Optional[float]:
+    try:
+        degrees, minutes, seconds = (float(part) for part in value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    decimal = degrees + minutes / 60 + seconds / 3600
+    if str(reference).strip("\x00 ") in ("S", "W"):
+        decimal *= -1
+    return decimal
+
+
+def _gps_dictionary(gps: Dict[int, Any]) -> Dict[str, Any]:
+    """GPS tags without their `GPS` prefix and with decimal coordinates, as ImageIO reports them."""
+    names = {tag: name[3:] for tag, name in ExifTags.GPSTAGS.items()}
+    result = _named_tags(gps, names)
+    for axis, tag in (("Latitude", 2), ("Longitude", 4)):
+        if tag in gps:
+            # ImageIO reports the magnitude; the sign lives in the Ref tag.
+            degrees = _dms_to_degrees(gps[tag], "")
+            if degrees is not None:
+                result[axis] = str(degrees)
+    return result
+
+
+def _location(gps: Dict[int, Any]) -> Optional[Tuple[float, float]]:
+    latitude = _dms_to_degrees(gps.get(2), gps.get(1))
+    longitude = _dms_to_degrees(gps.get(4), gps.get(3))
+    if latitude is None or longitude is None:
+        return None
+    return latitude, longitude
+
+
+def _parse_iptc(data: bytes) -> Dict[str, Any]:
+    """Record 2 datasets from an IPTC IIM block."""
+    result: Dict[str, Any] = {}
+    offset = 0
+    while offset + 5 <= len(data):
+        if data[offset] != 0x1C:
+            break
+        record, dataset = data[offset + 1], data[offset + 2]
+        length = int.from_bytes(data[offset + 3 : offset + 5], "big")
+        offset += 5
+        if length & 0x8000:
+            # Extended length: the low bits give the size of the length field.
+            size = length & 0x7FFF
+            length = int.from_bytes(data[offset : offset + size], "big")
+            offset += size
+        value = data[offset : offset + length]
+        offset += length
+        if record != 2 or dataset not in IPTC_DATASETS:
+            continue
+        text = value.decode("utf-8", errors="replace").strip()
+        name = IPTC_DATASETS[dataset]
+        if dataset in IPTC_LIST_DATASETS:
+            result.setdefault(name, []).append(text)
+        else:
+            result[name] = text
+    return result
+
+
+def _iptc_block(img: Image.Image) -> Optional[bytes]:
+    if img.format == "JPEG":
+        return img.info.get("photoshop", {}).get(PHOTOSHOP_IPTC_RESOURCE)
+    if img.format == "TIFF":
+        data = getattr(img, "tag_v2", {}).get(IPTC_TAG)
+        return data if isinstance(data, bytes) else None
+    return None
+
+
+def _xmp_packet(img: Image.Image) -> Optional[bytes]:
+    if img.format == "JPEG":
+        for marker, data in getattr(img, "applist", []):
+            if marker == "APP1" and data.startswith(XMP_MARKER):
+                return data[len(XMP_MARKER) :]
+        return None
+    if img.format == "TIFF":
+        packet = getattr(img, "tag_v2", {}).get(XMP_TAG)
+    else:
+        packet = img.info.get("xmp") or img.info.get("XML:com.adobe.xmp")
+    if isinstance(packet, str):
+        packet = packet.encode()
+    return packet or None
+
+
+def parse_xmp(packet: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Properties of an XMP packet keyed `prefix:name`, with arrays as lists and
+    structures as dicts.
+    """
+    packet = packet.strip(b"\x00 \r\n\t")
+    try:
+        prefixes = {}
+        for _, (prefix, uri) in ET.iterparse(io.BytesIO(packet), events=("start-ns",)):
+            prefixes.setdefault(uri, prefix)
+        root = ET.fromstring(packet)
+    except ET.ParseError:
+        return None
+
+    def name(tag: str) -> str:
+        if tag.startswith("{"):
+            uri, local = tag[1:].split("}", 1)
+            return f"{prefixes.get(uri, uri)}:{local}"
+        return tag
+
+    def properties(element: ET.Element) -> Dict[str, Any]:
+        result = {
+            name(key): value.strip()
+            for key, value in element.attrib.items()
+            if not key.startswith(f"{{{RDF_NAMESPACE}}}")
+        }
+        for child in element:
+            result[name(child.tag)] = value(child)
+        return result
+
+    def value(element: ET.Element) -> Any:
+        children = list(element)
+        if children and children[0].tag in RDF_CONTAINERS:
+            return [value(item) for item in children[0]]
+        if children and children[0].tag == f"{{{RDF_NAMESPACE}}}Description":
+            return properties(children[0])
+        if children or (element.get(f"{{{RDF_NAMESPACE}}}parseType") == "Resource"):
+            return properties(element)
+        attributes = properties(element)
+        return attributes if attributes else (element.text or "").strip()
+
+    metadata: Dict[str, Any] = {}
+    for rdf in root.iter(f"{{{RDF_NAMESPACE}}}RDF"):
+        for description in rdf.findall(f"{{{RDF_NAMESPACE}}}Description"):
+            metadata.update(properties(description))
+    return metadata or None
+
+
+def _exif(img: Image.Image) -> Image.Exif:
+    """
+    `getexif()` without decoding pixels: on PNG it calls `load()` when the
+    header has no eXIf chunk, so the chunk is read from `info` instead.
+    """
+    if img.format != "PNG":
+        return img.getexif()
+    exif = Image.Exif()
+    if img.info.get("exif"):
+        exif.load(img.info["exif"])
+    return exif
+
+
+def _image_properties(img: Image.Image) -> Tuple[Dict[str, Any], Dict[int, Any]]:
+    exif = _exif(img)
+    properties: Dict[str, Any] = {
+        "PixelWidth": str(img.width),
+        "PixelHeight": str(img.height),
+        "Depth": "16" if img.mode.startswith("I;16") else "8",
+        "HasAlpha": "1" if "A" in img.getbands() else "0",
+    }
+    if img.mode in COLOR_MODELS:
+        properties["ColorModel"] = COLOR_MODELS[img.mode]
+    if "dpi" in img.info:
+        dpi_width, dpi_height = img.info["dpi"]
+        properties["DPIWidth"], properties["DPIHeight"] = str(dpi_width), str(
+            dpi_height
+        )
+    if 0x0112 in exif:
+        properties["Orientation"] = str(exif[0x0112])
+
+    tiff = _named_tags(exif, ExifTags.TAGS)
+    if tiff:
+        properties["{TIFF}"] = tiff
+    exif_ifd = exif.get_ifd(EXIF_IFD)
+    if exif_ifd:
+        properties["{Exif}"] = _named_tags(exif_ifd, ExifTags.TAGS)
+    gps = exif.get_ifd(GPS_IFD)
+    if gps:
+        properties["{GPS}"] = _gps_dictionary(gps)
+    iptc_block = _iptc_block(img)
+    if iptc_block:
+        iptc = _parse_iptc(iptc_block)
+        if iptc:
+            properties["{IPTC}"] = iptc
+    return properties, gps
+
+
+def _read(img: Image.Image, complete: bool = True) -> ImageHeaderMetadata:
+    try:
+        properties, gps = _image_properties(img)
+    except Exception as e:
+        if not complete:
+            # Possibly just the end of the header buffer; the caller retries
+            # with the whole file.
+            raise
+        # A corrupt EXIF block shouldn't cost the dimensions or the XMP.
+        print(f"Error reading image properties: {e}")
+        properties, gps = {}, {}
+    packet = _xmp_packet(img)
+    return ImageHeaderMetadata(
+        width=img.width,
+        height=img.height,
+        format=img.format,
+        color_mode=img.mode,
+        properties=properties,
+        xmp=parse_xmp(packet) if packet else None,
+        location=_location(gps) if gps else None,
+    )
+
+
+def read_image_header(file: BinaryIO, image_path: str) -> ImageHeaderMetadata:
+    """
+    Everything the image metadata extractor needs from an already open file,
+    read from its first `HEADER_READ_BYTES`. `image_path` only picks the
+    decoder.
+    """
+    if image_path.lower().endswith((".heic", ".heif")):
+        register_heif_opener()
+    file.seek(0)
+    header = file.read(HEADER_READ_BYTES)
+    complete = len(header) < HEADER_READ_BYTES
+    try:
+        with Image.open(io.BytesIO(header)) as img:
+            return _read(img, complete)
+    except Exception:
+        if complete:
+            raise
+    # The metadata didn't fit in the buffer: parse from the file itself.
+    file.seek(0)
+    with Image.open(file) as img:
+        return _read(img)
+
+
+def read_image_metadata(image_path: str) -> ImageHeaderMetadata:
+    with open(image_path, "rb") as file:
+        return read_image_header(file, image_path)
+
+
+def get_image_properties(image_path: str) -> Dict[str, Any]:
+    return read_image_metadata(image_path).properties
+
+
+def get_image_xmp_metadata(image_path: str) -> Optional[Dict[str, Any]]:
+    return read_image_metadata(image_path).xmp
+
+
+def get_image_location(image_path: str) -> Tuple[float, float]:
+    location = read_image_metadata(image_path).location
+    if location is None:
+        raise ValueError("This image does not contain GPS data")
+    return location
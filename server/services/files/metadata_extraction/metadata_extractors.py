@@ -1,6 +1,25 @@
+import logging
+import multiprocessing
 import os
-from typing import Dict, List
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import Counter, deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import (
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
 
 from models.files import File, FileType
 from models.file_metadata import FileMetadata
@@ -21,11 +40,38 @@ from services.files.metadata_extraction.video_metadata_extractor import (
     VideoMetadataExtractor,
 )
 
-from services.files.metadata_extraction.base import MetadataExtractor
+from services.files.metadata_extraction.base import (
+    MetadataExtractor,
+    format_timestamp,
+)
+from services.files.metadata_cache import MetadataCache
 from services.files.directory_file_organizer import DirectoryFileOrganizer
 
 from utilities.general import generate_id
 
+logger = logging.getLogger("uvicorn")
+
+
+class ExtractionBudget(NamedTuple):
+    use_processes: bool
+    max_in_flight: int
+
+
+# Image and text extraction is Python/PIL/chardet work, so it gets a process
+# per core; video and audio mostly wait on ffprobe and exiftool, so a few
+# threads keep those subprocesses busy without oversubscribing the machine.
+EXTRACTION_BUDGETS: Dict[FileType, ExtractionBudget] = {
+    FileType.IMAGE: ExtractionBudget(True, os.cpu_count() or 1),
+    FileType.TEXT: ExtractionBudget(True, max(1, (os.cpu_count() or 1) // 2)),
+    FileType.VIDEO: ExtractionBudget(False, 4),
+    FileType.AUDIO: ExtractionBudget(False, 4),
+    FileType.ARCHIVE: ExtractionBudget(False, 2),
+    FileType.DOCUMENT: ExtractionBudget(False, 4),
+    FileType.OTHER: ExtractionBudget(False, 8),
+}
+DEFAULT_EXTRACTION_BUDGET = ExtractionBudget(False, 4)
+LOOKAHEAD_PER_WORKER = 4
+
 
 class FileMetadataExtractor:
     """
@@ -38,7 +84,8 @@ class FileMetadataExtractor:
         extractors (Dict[FileType, MetadataExtractor]): A dictionary mapping file types to their respective metadata extractors.
     """
 
-    def __init__(self):
+    def __init__(self, use_cache: bool = True):
+        self.cache = MetadataCache.from_config() if use_cache else None
         self.extractors: Dict[FileType, MetadataExtractor] = {
             FileType.IMAGE: ImageMetadataExtractor(),
             FileType.VIDEO: VideoMetadataExtractor(),
@@ -52,7 +99,27 @@ class FileMetadataExtractor:
         file_extension = file_path.split(".")[-1].lower()
         return DirectoryFileOrganizer.get_file_type(file_extension)
 
+    def _stat(self, file_path: str) -> Optional[os.stat_result]:
+        if self.cache is None:
+            return None
+        try:
+            return os.stat(file_path)
+        except OSError:
+            return None
+
     def extract_file_metadata(self, file_path: str) -> FileMetadata:
+        """Cached metadata while the file is unchanged, otherwise extracts it."""
+        stat = self._stat(file_path)
+        if stat is not None:
+            cached = self.cache.get(file_path, stat)
+            if cached is not None:
+                return cached
+        metadata = self._extract_uncached(file_path)
+        if stat is not None:
+            self.cache.put(file_path, stat, metadata)
+        return metadata
+
+    def _extract_uncached(self, file_path: str) -> FileMetadata:
         file_extension = file_path.split(".")[-1].lower()
         file_type = DirectoryFileOrganizer.get_file_type(file_extension)
         extractor = self.extractors.get(file_type, None)
@@ -60,44 +127,158 @@ class FileMetadataExtractor:
             return extractor.extract_metadata(file_path)
         else:
             size = os.path.getsize(file_path)
-            created_at = os.path.getctime(file_path)
-            modified_at = os.path.getmtime(file_path)
+            created_at = format_timestamp(os.path.getctime(file_path))
+            modified_at = format_timestamp(os.path.getmtime(file_path))
             return FileMetadata(
                 size=size, created_at=created_at, modified_at=modified_at
             )
 
+    def _result(
+        self, file_path: str, metadata: FileMetadata, return_raw_metadata: bool
+    ) -> Union[File, FileMetadata]:
+        if return_raw_metadata:
+            return metadata
+        return File(
+            id=generate_id(),
+            name=os.path.basename(file_path),
+            type=self._get_file_type(file_path),
+            path=file_path,
+            metadata=metadata,
+        )
+
+    def iter_files_metadata(
+        self,
+        file_paths: Iterable[str],
+        return_raw_metadata: bool = False,
+        budgets: Optional[Dict[FileType, ExtractionBudget]] = None,
+        max_workers: Optional[int] = None,
+    ) -> Iterator[Union[File, FileMetadata]]:
+        """
+        Extracts metadata for `file_paths`, yielding results as they finish.
+
+        CPU-bound extractors (image, text) run in a process pool so they are
+        not serialised by the GIL; extractors that mostly wait on ffprobe,
+        exiftool or disk run in a thread pool. Each file type may only have
+        its budget's worth of files in flight, and paths are pulled from
+        `file_paths` only while fewer than `LOOKAHEAD_PER_WORKER` per worker
+        are buffered, so memory stays bounded however many paths there are.
+        `max_workers` caps every type's budget. The metadata cache is checked
+        here before anything is queued, so cached files never reach a pool.
+        Files that fail are logged and skipped.
+        """
+        budgets = dict(budgets or EXTRACTION_BUDGETS)
+        if max_workers is not None:
+            budgets = {
+                file_type: budget._replace(
+                    max_in_flight=min(budget.max_in_flight, max_workers)
+                )
+                for file_type, budget in budgets.items()
+            }
+        process_workers = sum(
+            budget.max_in_flight for budget in budgets.values() if budget.use_processes
+        )
+        thread_workers = sum(
+            budget.max_in_flight
+            for budget in budgets.values()
+            if not budget.use_processes
+        )
+        lookahead = LOOKAHEAD_PER_WORKER * (process_workers + thread_workers)
+
+        # Workers are spawned, as in the job queue, so they never inherit
+        # open connections or exiftool pipes.
+        process_pool = ProcessPoolExecutor(
+            max_workers=max(1, min(process_workers, os.cpu_count() or 1)),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        thread_pool = ThreadPoolExecutor(max_workers=max(1, thread_workers))
+        queued: Dict[FileType, Deque[Tuple[str, Optional[os.stat_result]]]] = {
+            file_type: deque() for file_type in budgets
+        }
+        in_flight: Dict[Future, Tuple[str, Optional[os.stat_result], FileType]] = {}
+        counts: Counter = Counter()
+        paths, buffered, exhausted = iter(file_paths), 0, False
+
+        try:
+            while True:
+                new_videos = []
+                while not exhausted and buffered < lookahead:
+                    file_path = next(paths, None)
+                    if file_path is None:
+                        exhausted = True
+                        break
+                    stat = self._stat(file_path)
+                    if stat is not None:
+                        cached = self.cache.get(file_path, stat)
+                        if cached is not None:
+                            yield self._result(file_path, cached, return_raw_metadata)
+                            continue
+                    file_type = self._get_file_type(file_path)
+                    queued.setdefault(file_type, deque()).append((file_path, stat))
+                    buffered += 1
+                    if file_type == FileType.VIDEO:
+                        new_videos.append(file_path)
+                if new_videos:
+                    self.extractors[FileType.VIDEO].prefetch_properties(new_videos)
+
+                for file_type, file_paths_queued in queued.items():
+                    budget = budgets.get(file_type, DEFAULT_EXTRACTION_BUDGET)
+                    while (
+                        file_paths_queued and counts[file_type] < budget.max_in_flight
+                    ):
+                        file_path, stat = file_paths_queued.popleft()
+                        if budget.use_processes:
+                            future = process_pool.submit(_extract_in_worker, file_path)
+                        else:
+                            future = thread_pool.submit(
+                                self._extract_uncached, file_path
+                            )
+                        in_flight[future] = (file_path, stat, file_type)
+                        counts[file_type] += 1
+
+                if not in_flight:
+                    if exhausted:
+                        return
+                    continue
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_path, stat, file_type = in_flight.pop(future)
+                    counts[file_type] -= 1
+                    buffered -= 1
+                    try:
+                        metadata = future.result()
+                    except Exception as e:
+                        logger.warning(
+                            f"Failed to extract metadata for {file_path}: {e}"
+                        )
+                        continue
+                    if stat is not None:
+                        self.cache.put(file_path, stat, metadata)
+                    yield self._result(file_path, metadata, return_raw_metadata)
+        finally:
+            process_pool.shutdown(wait=False, cancel_futures=True)
+            thread_pool.shutdown(wait=False, cancel_futures=True)
+
     def extract_files_metadata_concurrent(
         self,
         file_paths: List[str],
-        max_workers: int = 5,
+        max_workers: Optional[int] = None,
         return_raw_metadata: bool = False,
-    ) -> List[FileMetadata]:
-        def extract(file_path: str) -> FileMetadata:
-            file_type = self._get_file_type(file_path)
-            metadata = self.extract_file_metadata(file_path)
-            return (
-                metadata
-                if return_raw_metadata
-                else File(
-                    id=generate_id(),
-                    name=os.path.basename(file_path),
-                    type=file_type,
-                    path=file_path,
-                    metadata=metadata,
-                )
+    ) -> List[Union[File, FileMetadata]]:
+        """`iter_files_metadata`, collected into a list."""
+        return list(
+            self.iter_files_metadata(
+                file_paths, return_raw_metadata, max_workers=max_workers
             )
+        )
 
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_file = {
-                executor.submit(extract, file_path): file_path
-                for file_path in file_paths
-            }
-            results = []
-            for future in as_completed(future_to_file):
-                file_path = future_to_file[future]
-                try:
-                    metadata = future.result()
-                    results.append(metadata)
-                except Exception as e:
-                    print(f"Error extracting metadata for {file_path}: {e}")
-        return results
+
+_worker_extractor: Optional[FileMetadataExtractor] = None
+
+
+def _extract_in_worker(file_path: str) -> FileMetadata:
+    global _worker_extractor
+    if _worker_extractor is None:
+        # The parent process checks and fills the cache.
+        _worker_extractor = FileMetadataExtractor(use_cache=False)
+    return _worker_extractor._extract_uncached(file_path)
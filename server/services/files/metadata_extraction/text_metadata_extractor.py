@@ -1,37 +1,93 @@
+import codecs
 import os
+from typing import List, Optional, Tuple
 
-import chardet
+from chardet.universaldetector import UniversalDetector
 from langdetect import detect
 
 from models.file_metadata import TextMetadata
-from services.files.metadata_extraction.base import MetadataExtractor
+from services.files.metadata_extraction.base import (
+    MetadataExtractor,
+    format_timestamp,
+)
 from services.files.directory_file_organizer import DirectoryFileOrganizer
 
+READ_CHUNK_BYTES = 1024 * 1024
+# The detector usually settles within the first few KB; past this it gives
+# its best guess instead of reading on.
+ENCODING_SAMPLE_BYTES = 4 * 1024 * 1024
+LANGUAGE_SAMPLE_CHARS = 20_000
+
 
 class TextMetadataExtractor(MetadataExtractor):
-    def extract_metadata(self, file_path: str) -> TextMetadata:
-        size = os.path.getsize(file_path)
-        created_at = os.path.getctime(file_path)
-        modified_at = os.path.getmtime(file_path)
+    """
+    Streams the file in `READ_CHUNK_BYTES` chunks, so memory stays flat
+    whatever its size: the encoding is detected incrementally from at most
+    `ENCODING_SAMPLE_BYTES`, words are counted chunk by chunk as they are
+    decoded and the language is detected from the first
+    `LANGUAGE_SAMPLE_CHARS` characters.
+    """
 
+    def extract_metadata(self, file_path: str) -> TextMetadata:
         with open(file_path, "rb") as file:
-            raw_data = file.read()
-            encoding_info = chardet.detect(raw_data)
-            encoding = encoding_info["encoding"]
-            text = raw_data.decode(encoding)
-
-        num_words = len(text.split())
-        language = self.detect_language(text)
+            stat = os.fstat(file.fileno())
+            encoding, head = self._detect_encoding(file)
+            num_words, sample = self._count_words(file, head, encoding)
 
         return TextMetadata(
-            size=size,
-            created_at=created_at,
-            modified_at=modified_at,
+            size=stat.st_size,
+            created_at=format_timestamp(stat.st_ctime),
+            modified_at=format_timestamp(stat.st_mtime),
             num_words=num_words,
-            language=language,
+            language=self.detect_language(sample),
             encoding=encoding,
         )
 
+    def _detect_encoding(self, file) -> Tuple[Optional[str], List[bytes]]:
+        """
+        Feeds the detector until it is confident, returning the encoding and
+        the chunks read so far so they can be decoded without rereading.
+        """
+        detector = UniversalDetector()
+        head, read = [], 0
+        while not detector.done and read < ENCODING_SAMPLE_BYTES:
+            chunk = file.read(READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            head.append(chunk)
+            read += len(chunk)
+            detector.feed(chunk)
+        detector.close()
+        return detector.result["encoding"], head
+
+    def _count_words(
+        self, file, head: List[bytes], encoding: Optional[str]
+    ) -> Tuple[int, str]:
+        """Word count over the whole file and its first `LANGUAGE_SAMPLE_CHARS`."""
+        decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+        num_words, sample = 0, ""
+        in_word = False
+
+        def chunks():
+            yield from head
+            yield from iter(lambda: file.read(READ_CHUNK_BYTES), b"")
+
+        for chunk in chunks():
+            text = decoder.decode(chunk, final=False)
+            if not text:
+                continue
+            num_words += len(text.split())
+            # A word split across two chunks was counted in both.
+            if in_word and not text[0].isspace():
+                num_words -= 1
+            in_word = not text[-1].isspace()
+            if len(sample) < LANGUAGE_SAMPLE_CHARS:
+                sample += text[: LANGUAGE_SAMPLE_CHARS - len(sample)]
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            num_words += len(tail.split()) - (in_word and not tail[0].isspace())
+        return num_words, sample
+
     def detect_language(self, text: str) -> str:
         try:
             language = detect(text)
@@ -1,49 +1,101 @@
-import os
-import ffmpeg
 import json
+import os
 import subprocess
-from typing import Optional, Tuple, Dict, Any
+from fractions import Fraction
+from typing import Optional, Tuple, Dict, Any, List
 
 from models.file_metadata import VideoMetadata
-from services.files.metadata_extraction.base import MetadataExtractor
+from services.exiftool import get_exiftool
+from services.files.metadata_extraction.base import (
+    MetadataExtractor,
+    format_timestamp,
+)
 from utilities.geo import GeoDataParser
 
 
+# Only the entries the metadata needs, from the first video stream.
+FFPROBE_ENTRIES = (
+    "format=duration,bit_rate:stream=codec_type,codec_name,width,height,r_frame_rate"
+)
+
+
 class VideoMetadataExtractor(MetadataExtractor):
+    def __init__(self):
+        self._prefetched_properties: Dict[str, Dict[str, Any]] = {}
+
+    def prefetch_properties(self, file_paths: List[str]) -> None:
+        """
+        Reads the exiftool tags of many videos in one command ahead of
+        `extract_metadata`, which then uses them instead of asking per file.
+        """
+        try:
+            self._prefetched_properties.update(get_exiftool().read_metadata(file_paths))
+        except Exception as e:
+            print(f"Error prefetching video properties: {e}")
+
     def extract_metadata(self, file_path: str) -> VideoMetadata:
         try:
-            if not os.path.exists(file_path):
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
                 raise FileNotFoundError(f"File not found: {file_path}")
 
-            probe = self._probe_video(file_path)
+            probe, properties = self._probe(file_path)
             video_stream = self._get_video_stream(probe)
-            properties = self._get_video_properties(file_path)
             resolution = self._get_resolution(video_stream)
 
             return VideoMetadata(
-                size=os.path.getsize(file_path),
-                created_at=os.path.getctime(file_path),
-                modified_at=os.path.getmtime(file_path),
+                size=stat.st_size,
+                created_at=format_timestamp(stat.st_ctime),
+                modified_at=format_timestamp(stat.st_mtime),
                 duration=self._get_duration(probe),
                 width=resolution[0] if resolution[0] else None,
                 height=resolution[1] if resolution[1] else None,
                 framerate=self._get_framerate(video_stream),
+                codec=self._get_codec(video_stream),
                 bitrate=self._get_bitrate(probe),
-                properties=self._get_video_properties(file_path),
+                properties=properties,
                 location=self._get_video_location(properties),
             )
         except Exception as e:
             raise RuntimeError(f"Failed to extract video metadata: {str(e)}")
 
-    def _probe_video(self, file_path: str) -> Dict[str, Any]:
-        try:
-            return ffmpeg.probe(file_path)
-        except ffmpeg.Error as e:
-            raise ValueError(f"Error probing video file: {e.stderr.decode()}")
+    def _probe(self, file_path: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        One ffprobe for the stream and container fields and one exiftool
+        read for the tags, run side by side: ffprobe is started first and
+        the exiftool daemon is queried while it runs.
+        """
+        process = subprocess.Popen(
+            [
+                "ffprobe",
+                "-v",
+                "error",
+                "-select_streams",
+                "v:0",
+                "-show_entries",
+                FFPROBE_ENTRIES,
+                "-of",
+                "json",
+                file_path,
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        properties = self._get_video_properties(file_path)
+        stdout, stderr = process.communicate()
+        if process.returncode != 0:
+            raise ValueError(f"Error probing video file: {stderr}")
+        return json.loads(stdout), properties
 
     def _get_video_stream(self, probe: Dict[str, Any]) -> Dict[str, Any]:
         video_stream = next(
-            (stream for stream in probe["streams"] if stream["codec_type"] == "video"),
+            (
+                stream
+                for stream in probe.get("streams", [])
+                if stream.get("codec_type") == "video"
+            ),
             None,
         )
         if video_stream is None:
@@ -66,8 +118,8 @@ class VideoMetadataExtractor(MetadataExtractor):
 
     def _get_framerate(self, video_stream: Dict[str, Any]) -> Optional[float]:
         try:
-            return eval(video_stream["r_frame_rate"])
-        except (KeyError, ValueError, TypeError, SyntaxError):
+            return float(Fraction(video_stream["r_frame_rate"]))
+        except (KeyError, ValueError, TypeError, ZeroDivisionError):
             return None
 
     def _get_codec(self, video_stream: Dict[str, Any]) -> Optional[str]:
@@ -83,15 +135,11 @@ class VideoMetadataExtractor(MetadataExtractor):
             return None
 
     def _get_video_properties(self, file_path: str) -> Dict[str, Any]:
+        prefetched = self._prefetched_properties.pop(file_path, None)
+        if prefetched is not None:
+            return prefetched
         try:
-            command = ["exiftool", "-json", file_path]
-            result = subprocess.run(
-                command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
-            )
-            if result.returncode != 0:
-                raise Exception(f"Error running exiftool: {result.stderr}")
-            metadata = json.loads(result.stdout)[0]
-            return metadata
+            return get_exiftool().read_metadata([file_path])[file_path]
         except Exception as e:
             return {"error": str(e)}
 
@@ -0,0 +1,319 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import (
+    Any,
+    AsyncIterator,
+    BinaryIO,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from pydantic import BaseModel
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from utilities.general import generate_id
+
+# Uploads are read and written in 1 MiB blocks: large enough that syscalls
+# and thread hops stop mattering, small enough to bound memory per upload.
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_SESSION_TTL_SECONDS = 24 * 60 * 60
+# Combined size of the non-file fields of a multipart upload.
+MAX_FORM_FIELDS_BYTES = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UploadOffsetMismatch(Exception):
+    def __init__(self, expected: int):
+        super().__init__(f"Upload offset should be {expected}")
+        self.expected = expected
+
+
+class UploadSession(BaseModel):
+    id: str
+    filename: str
+    size: int
+    offset: int = 0
+    metadata: Optional[str] = None
+    file_id: Optional[str] = None
+    created_at: float
+
+
+def secure_filename(filename: str) -> str:
+    return filename.replace("..", "").replace("/", "").replace("\\", "")
+
+
+def move_into_place(source_path: str, destination_path: str) -> None:
+    """Atomic rename, falling back to a copy when the paths are on different devices."""
+    os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+    try:
+        os.replace(source_path, destination_path)
+    except OSError:
+        shutil.move(source_path, destination_path)
+
+
+class MultipartUpload(NamedTuple):
+    filename: str
+    fields: Dict[str, str]
+    size: int
+    sha256: str
+
+
+async def _flush(part: BinaryIO, digest: Any, buffer: bytearray, offset: int) -> int:
+    if not buffer:
+        return offset
+    digest.update(buffer)
+    await asyncio.to_thread(part.write, buffer)
+    return offset + len(buffer)
+
+
+async def receive_multipart_upload(
+    content_type: str,
+    chunks: AsyncIterator[bytes],
+    destination_path: str,
+    max_bytes: int,
+    check_filename: Optional[Callable[[str], None]] = None,
+) -> MultipartUpload:
+    """
+    Parses a `multipart/form-data` body as it arrives, writing its single
+    file part straight to `destination_path` and hashing it on the way, so
+    nothing is spooled first. Raises `UploadTooLarge` as soon as the file
+    passes `max_bytes` or the other fields pass `MAX_FORM_FIELDS_BYTES`, and
+    `ValueError` for a malformed body. `check_filename` is called with the
+    file's name before any of its data is written and may raise to refuse it.
+    """
+    _, options = parse_options_header(content_type)
+    boundary = options.get(b"boundary")
+    if not boundary:
+        raise ValueError("Missing multipart boundary")
+
+    events: List[Tuple[str, bytes]] = []
+
+    def callback(event: str):
+        return lambda data=b"", start=0, end=0: events.append(
+            (event, bytes(data[start:end]))
+        )
+
+    parser = MultipartParser(
+        boundary,
+        {
+            f"on_{event}": callback(event)
+            for event in (
+                "part_begin",
+                "header_field",
+                "header_value",
+                "header_end",
+                "headers_finished",
+                "part_data",
+                "part_end",
+            )
+        },
+    )
+
+    digest, size = hashlib.sha256(), 0
+    filename: Optional[str] = None
+    fields: Dict[str, str] = {}
+    fields_bytes = 0
+    header_field = header_value = disposition = b""
+    name, is_file, value, buffer = "", False, bytearray(), bytearray()
+    with open(destination_path, "wb") as destination:
+        async for chunk in chunks:
+            parser.write(chunk)
+            for event, data in events:
+                if event == "part_begin":
+                    header_field = header_value = disposition = b""
+                elif event == "header_field":
+                    header_field += data
+                elif event == "header_value":
+                    header_value += data
+                elif event == "header_end":
+                    if header_field.lower() == b"content-disposition":
+                        disposition = header_value
+                    header_field = header_value = b""
+                elif event == "headers_finished":
+                    _, params = parse_options_header(disposition)
+                    name = params.get(b"name", b"").decode("utf-8", "replace")
+                    is_file = b"filename" in params
+                    if is_file:
+                        if filename is not None:
+                            raise ValueError("Only one file can be uploaded")
+                        filename = params[b"filename"].decode("utf-8", "replace")
+                        if check_filename:
+                            check_filename(filename)
+                elif event == "part_data" and is_file:
+                    size += len(data)
+                    if size > max_bytes:
+                        raise UploadTooLarge()
+                    buffer += data
+                    if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                        await _flush(destination, digest, buffer, 0)
+                        buffer = bytearray()
+                elif event == "part_data":
+                    fields_bytes += len(data)
+                    if fields_bytes > MAX_FORM_FIELDS_BYTES:
+                        raise UploadTooLarge()
+                    value += data
+                elif event == "part_end" and not is_file:
+                    fields[name] = value.decode("utf-8", "replace")
+                    value = bytearray()
+            events.clear()
+        parser.finalize()
+        await _flush(destination, digest, buffer, 0)
+
+    if filename is None:
+        raise ValueError("No file in upload")
+    return MultipartUpload(filename, fields, size, digest.hexdigest())
+
+
+def hash_file(path: str) -> Any:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest
+
+
+class ResumableUploads:
+    """
+    Chunked uploads that survive dropped connections.
+
+    A session is created with the final size up front; the client then appends
+    the body at the offset the server reports, so after a disconnect it asks
+    for the offset and carries on from there. Each session is a `.part` file
+    plus a JSON sidecar in `uploads_dir`, so sessions survive restarts, and the
+    part file's length is the source of truth for the offset. The content hash
+    is kept running in memory between chunks and rebuilt from the part file
+    if the server restarted mid-upload.
+    """
+
+    def __init__(self, uploads_dir: str, max_bytes: int):
+        self.uploads_dir = uploads_dir
+        self.max_bytes = max_bytes
+        self._digests: Dict[str, Tuple[int, Any]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        os.makedirs(self.uploads_dir, exist_ok=True)
+
+    def _session_path(self, upload_id: str) -> str:
+        return os.path.join(self.uploads_dir, f"{upload_id}.json")
+
+    def part_path(self, upload_id: str) -> str:
+        return os.path.join(self.uploads_dir, f"{upload_id}.part")
+
+    def _save(self, session: UploadSession) -> None:
+        with open(self._session_path(session.id), "w") as file:
+            json.dump(session.model_dump(), file)
+
+    def create(
+        self,
+        filename: str,
+        size: int,
+        metadata: Optional[str] = None,
+        file_id: Optional[str] = None,
+    ) -> UploadSession:
+        if size > self.max_bytes:
+            raise UploadTooLarge()
+        self.remove_expired()
+        session = UploadSession(
+            id=generate_id(),
+            filename=secure_filename(filename),
+            size=size,
+            metadata=metadata,
+            file_id=file_id,
+            created_at=time.time(),
+        )
+        open(self.part_path(session.id), "wb").close()
+        self._save(session)
+        return session
+
+    def get(self, upload_id: str) -> Optional[UploadSession]:
+        if os.path.basename(upload_id) != upload_id:
+            return None
+        try:
+            with open(self._session_path(upload_id), "r") as file:
+                session = UploadSession(**json.load(file))
+        except FileNotFoundError:
+            return None
+        session.offset = os.path.getsize(self.part_path(upload_id))
+        return session
+
+    async def append(
+        self, session: UploadSession, offset: int, chunks: AsyncIterator[bytes]
+    ) -> UploadSession:
+        """
+        Appends `chunks` at `offset`, which must match what has been received
+        so far. Whatever arrives before a disconnect is kept.
+        """
+        lock = self._locks.setdefault(session.id, asyncio.Lock())
+        async with lock:
+            current = os.path.getsize(self.part_path(session.id))
+            if offset != current:
+                raise UploadOffsetMismatch(current)
+
+            digest = await self._digest(session.id, current)
+            buffer = bytearray()
+            with open(self.part_path(session.id), "ab") as part:
+                try:
+                    async for chunk in chunks:
+                        if current + len(buffer) + len(chunk) > session.size:
+                            raise UploadTooLarge()
+                        buffer += chunk
+                        if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                            current = await _flush(part, digest, buffer, current)
+                            buffer = bytearray()
+                finally:
+                    current = await _flush(part, digest, buffer, current)
+                    self._digests[session.id] = (current, digest)
+                    # Keeps sessions that are still receiving data from expiring.
+                    os.utime(self._session_path(session.id))
+
+            session.offset = current
+            return session
+
+    async def _digest(self, upload_id: str, offset: int) -> Any:
+        cached = self._digests.get(upload_id)
+        if cached and cached[0] == offset:
+            return cached[1]
+        return await asyncio.to_thread(hash_file, self.part_path(upload_id))
+
+    def content_hash(self, session: UploadSession) -> str:
+        """The sha256 of a fully received upload, without moving it."""
+        digest = self._digests.get(session.id)
+        if not digest or digest[0] != session.offset:
+            digest = (session.offset, hash_file(self.part_path(session.id)))
+            self._digests[session.id] = digest
+        return digest[1].hexdigest()
+
+    def complete(self, session: UploadSession, destination_path: str) -> str:
+        """Moves a fully received upload into place and returns its sha256."""
+        sha256 = self.content_hash(session)
+        move_into_place(self.part_path(session.id), destination_path)
+        self.discard(session.id)
+        return sha256
+
+    def discard(self, upload_id: str) -> None:
+        self._digests.pop(upload_id, None)
+        self._locks.pop(upload_id, None)
+        for path in (self._session_path(upload_id), self.part_path(upload_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def remove_expired(self) -> None:
+        cutoff = time.time() - UPLOAD_SESSION_TTL_SECONDS
+        for name in os.listdir(self.uploads_dir):
+            upload_id, extension = os.path.splitext(name)
+            if extension != ".json":
+                continue
+            if os.path.getmtime(os.path.join(self.uploads_dir, name)) < cutoff:
+                self.discard(upload_id)
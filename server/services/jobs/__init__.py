@@ -0,0 +1,5 @@
+from .job_queue import JobQueue
+from .job_store import JobStore
+from .tasks import TASKS, JobTask
+
+__all__ = ["JobQueue", "JobStore", "JobTask", "TASKS"]
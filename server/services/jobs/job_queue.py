@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from dbio.base_sql import AsyncBaseSQLDatabaseAdapter
+from models.jobs import Job, JobStatus
+from services.jobs.job_store import JobStore
+from services.jobs.tasks import TASKS, JobTask
+from utilities.general import generate_id
+
+logger = logging.getLogger("uvicorn")
+
+PRUNE_INTERVAL_SECONDS = 60 * 60
+
+
+class JobQueue:
+    """
+    In-process queue for CPU and subprocess heavy work (thumbnails, metadata,
+    deduplication). Task functions run in a process pool sized to the machine,
+    one worker coroutine per process keeps concurrency bounded, and every state
+    change is persisted so jobs interrupted by a restart are picked up again.
+    Store calls run in a thread so sqlite3 never blocks the event loop, and
+    finished jobs older than `retention_days` are pruned hourly.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        db: AsyncBaseSQLDatabaseAdapter,
+        max_workers: int,
+        retention_days: float,
+        tasks: Dict[str, JobTask] = TASKS,
+    ):
+        self.store = store
+        self.db = db
+        self.max_workers = max_workers
+        self.retention_days = retention_days
+        self.tasks = tasks
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.workers: List[asyncio.Task] = []
+        self.pruner: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        # Workers are spawned rather than forked so they never inherit the
+        # event loop or open database connections.
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        for job in await asyncio.to_thread(self.store.unfinished):
+            if job.task in self.tasks:
+                self.queue.put_nowait(job)
+        self.workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.max_workers)
+        ]
+        self.pruner = asyncio.create_task(self._prune())
+
+    async def stop(self) -> None:
+        tasks = [*self.workers, *([self.pruner] if self.pruner else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.workers, self.pruner = [], None
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+        await asyncio.to_thread(self.store.close)
+
+    async def submit(self, task: str, payload: dict) -> Job:
+        if task not in self.tasks:
+            raise KeyError(f"Unknown task: {task}")
+        job = await asyncio.to_thread(
+            self.store.create, Job(id=generate_id(), task=task, payload=payload)
+        )
+        self.queue.put_nowait(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def list(
+        self, status: Optional[JobStatus] = None, limit: Optional[int] = None
+    ) -> List[Job]:
+        return await asyncio.to_thread(self.store.list, status, limit)
+
+    async def _prune(self) -> None:
+        while True:
+            try:
+                pruned = await asyncio.to_thread(self.store.prune, self.retention_days)
+                if pruned:
+                    logger.info(f"Pruned {pruned} finished jobs")
+            except Exception as e:
+                logger.warning(f"Failed to prune jobs: {e}")
+            await asyncio.sleep(PRUNE_INTERVAL_SECONDS)
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._run(loop, job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The job store itself failed; keep serving the queue.
+                logger.error(f"Could not record job {job.id} ({job.task}): {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, loop: asyncio.AbstractEventLoop, job: Job) -> None:
+        task = self.tasks[job.task]
+        await asyncio.to_thread(self.store.mark_running, job)
+        try:
+            result = await loop.run_in_executor(
+                self.pool, _call, task.function, job.payload
+            )
+            if task.on_complete:
+                await task.on_complete(self.db, job, result)
+            # Inside the try, so a result that can't be serialised or stored
+            # fails the job instead of the worker.
+            await asyncio.to_thread(self.store.mark_finished, job, result=result)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Job {job.id} ({job.task}) failed: {e}")
+            traceback.print_exc()
+            await asyncio.to_thread(self.store.mark_finished, job, error=str(e))
+
+
+def _call(function, payload: dict):
+    return function(**payload)
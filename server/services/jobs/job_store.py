@@ -0,0 +1,93 @@
+import datetime
+import json
+from typing import List, Optional
+
+from dbio.sqlite import SQLiteDatabaseAdapter
+from models.jobs import Job, JobStatus
+
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+class JobStore:
+    """
+    Persists job state in a local SQLite file. Calls block on sqlite3, so
+    `JobQueue` makes them from a thread rather than the event loop. Finished
+    jobs are kept for `JOB_RETENTION_DAYS` and then removed by `prune`.
+    """
+
+    def __init__(self, database_path: str, schema_path: str):
+        self.db = SQLiteDatabaseAdapter(database_path, schema_path)
+
+    def create(self, job: Job) -> Job:
+        job.created_at = now()
+        self.db.insert(
+            "jobs",
+            {
+                "id": job.id,
+                "task": job.task,
+                "payload": json.dumps(job.payload),
+                "status": job.status.value,
+                "created_at": job.created_at,
+            },
+        )
+        return job
+
+    def mark_running(self, job: Job) -> None:
+        job.status, job.started_at = JobStatus.RUNNING, now()
+        self.db.update(
+            "jobs",
+            {"status": job.status.value, "started_at": job.started_at},
+            {"id": job.id},
+        )
+
+    def mark_finished(self, job: Job, result=None, error: Optional[str] = None) -> None:
+        job.status = JobStatus.FAILED if error else JobStatus.COMPLETED
+        job.result, job.error, job.finished_at = result, error, now()
+        self.db.update(
+            "jobs",
+            {
+                "status": job.status.value,
+                "result": json.dumps(result),
+                "error": error,
+                "finished_at": job.finished_at,
+            },
+            {"id": job.id},
+        )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        rows = self.db.select("jobs", "*", {"id": job_id})
+        return Job(**rows[0]) if rows else None
+
+    def list(
+        self, status: Optional[JobStatus] = None, limit: Optional[int] = None
+    ) -> List[Job]:
+        """Jobs with `status`, or all of them, newest first."""
+        filters = {"status": status.value} if status else None
+        rows = self.db.select_ordered(
+            "jobs", "created_at", descending=True, limit=limit, filters=filters
+        )
+        return [Job(**row) for row in rows]
+
+    def unfinished(self) -> List[Job]:
+        """Running and queued jobs, oldest first, to be resumed in order."""
+        jobs = self.list(JobStatus.RUNNING) + self.list(JobStatus.QUEUED)
+        return sorted(jobs, key=lambda job: job.created_at)
+
+    def prune(self, retention_days: float) -> int:
+        """
+        Deletes jobs that finished more than `retention_days` ago and returns
+        how many there were.
+        """
+        cutoff = (
+            datetime.datetime.now(datetime.timezone.utc)
+            - datetime.timedelta(days=retention_days)
+        ).strftime(TIMESTAMP_FORMAT)
+        return self.db.delete_less("jobs", "finished_at", cutoff)
+
+    def close(self) -> None:
+        self.db.close()
@@ -0,0 +1,159 @@
+"""
+Work that can be handed to the job queue. Task functions run in worker
+processes, so they must be module level and take/return JSON-serialisable
+values. Completion handlers run back on the event loop with the database.
+"""
+
+import os
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from config import Config
+from dbio.base_sql import AsyncBaseSQLDatabaseAdapter
+from models.files import FileType
+from models.jobs import Job
+from services.files.deduplication.base import merge_duplicate_results
+from services.files.deduplication.exact_deduplicator import (
+    ExactDeduplicator,
+    unique_paths,
+)
+from services.files.deduplication.hash_store import HashStore
+from services.files.deduplication.image_deduplicator import ImageDeduplicator
+from services.files.deduplication.video_deduplicator import VideoDeduplicator
+from services.files.directory_file_organizer import DirectoryFileOrganizer
+from services.files.metadata_extraction import FileMetadataExtractor
+from services.thumbnail_extractor import ThumbnailExtractor
+
+config = Config()
+
+
+class JobTask(NamedTuple):
+    function: Callable[..., Any]
+    on_complete: Optional[
+        Callable[[AsyncBaseSQLDatabaseAdapter, Job, Any], Awaitable[None]]
+    ] = None
+
+
+def generate_thumbnails(
+    file_id: str, path: str, duration: Optional[float] = None
+) -> List[str]:
+    thumbnail_extractor = ThumbnailExtractor(
+        media_path=path, output_dir=config.thumbnails_dir, duration=duration
+    )
+    thumbnail_paths = thumbnail_extractor.extract()
+    if thumbnail_paths is None:
+        raise RuntimeError(f"Failed to extract thumbnails for {path}")
+    return thumbnail_paths
+
+
+def cache_thumbnails(path: str) -> List[str]:
+    """Renders every configured size into the thumbnail cache ahead of annotation."""
+    thumbnail_extractor = ThumbnailExtractor(
+        media_path=path, output_dir=config.thumbnails_dir
+    )
+    if thumbnail_extractor.media_type == "video":
+        renditions = thumbnail_extractor.frame_renditions()
+        return [path for frame in renditions.values() for path in frame.values()]
+    return list(thumbnail_extractor.renditions().values())
+
+
+async def save_thumbnails(
+    db: AsyncBaseSQLDatabaseAdapter, job: Job, thumbnail_paths: List[str]
+) -> None:
+    await db.delete("file_thumbnails", {"file_id": job.payload["file_id"]})
+    await db.insert_many(
+        "file_thumbnails",
+        [
+            {"file_id": job.payload["file_id"], "thumbnail_path": thumbnail_path}
+            for thumbnail_path in thumbnail_paths
+        ],
+    )
+
+
+def extract_metadata(path: str) -> dict:
+    return FileMetadataExtractor().extract_file_metadata(path).model_dump(mode="json")
+
+
+def find_duplicate_images(paths: List[str]) -> List[dict]:
+    store = HashStore.from_config()
+    exact = ExactDeduplicator(store=store).deduplicate_paths(paths)
+    deduplicator = ImageDeduplicator(config.duplicate_threshold, store=store)
+    results = merge_duplicate_results(
+        paths, exact, deduplicator.deduplicate_image_paths(unique_paths(paths, exact))
+    )
+    return [result.model_dump(mode="json") for result in results]
+
+
+def find_duplicate_videos(paths: List[str]) -> List[dict]:
+    store = HashStore.from_config()
+    exact = ExactDeduplicator(store=store).deduplicate_paths(paths)
+    deduplicator = VideoDeduplicator(config.video_duplicate_threshold, store=store)
+    results = merge_duplicate_results(
+        paths, exact, deduplicator.deduplicate_video_paths(unique_paths(paths, exact))
+    )
+    return [result.model_dump(mode="json") for result in results]
+
+
+def find_duplicate_files(directory: str) -> List[dict]:
+    """
+    Identical files of every type under `directory`, then near-duplicate
+    images and videos among the files left once exact copies are set aside.
+    """
+    paths = DirectoryFileOrganizer.list_files_recursive(directory, use_index=True)
+    store = HashStore.from_config()
+    exact = ExactDeduplicator(store=store).deduplicate_paths(paths)
+    remaining = unique_paths(paths, exact)
+    images = ImageDeduplicator(config.duplicate_threshold, store=store)
+    videos = VideoDeduplicator(config.video_duplicate_threshold, store=store)
+    results = merge_duplicate_results(
+        paths,
+        exact,
+        images.deduplicate_image_paths(remaining),
+        videos.deduplicate_video_paths(remaining),
+    )
+    return [result.model_dump(mode="json") for result in results]
+
+
+@lru_cache(maxsize=None)
+def library_video_deduplicator() -> VideoDeduplicator:
+    """One per worker process, so stored signatures are only loaded once."""
+    return VideoDeduplicator(
+        config.video_duplicate_threshold, store=HashStore.from_config()
+    )
+
+
+def check_duplicates(paths: List[str]) -> List[dict]:
+    """
+    Checks new files against every file in the hash store, exact copies by
+    sha256 and near-duplicate images and videos by perceptual hash, and
+    stores their hashes so later files are checked against them. Returns
+    the checks of the files that have matches.
+    """
+    store = HashStore.from_config()
+    checks = []
+    for path in paths:
+        file_type = DirectoryFileOrganizer.get_file_type(path.split(".")[-1])
+        try:
+            check = store.check_file(path, exclude=path, file_type=file_type)
+            store.add_file(path, check)
+        except OSError:
+            continue
+        if file_type == FileType.VIDEO:
+            videos = library_video_deduplicator()
+            videos.sync()
+            similar, _ = videos.find_duplicates(path)
+            check.similar = [other for other in similar if os.path.exists(other)]
+        if check.exact_matches or check.similar:
+            checks.append(check.model_dump(mode="json"))
+    return checks
+
+
+TASKS: Dict[str, JobTask] = {
+    "thumbnails": JobTask(generate_thumbnails, save_thumbnails),
+    "cache_thumbnails": JobTask(cache_thumbnails),
+    "metadata": JobTask(extract_metadata),
+    "deduplicate_images": JobTask(find_duplicate_images),
+    "deduplicate_videos": JobTask(find_duplicate_videos),
+    "deduplicate_files": JobTask(find_duplicate_files),
+    "check_duplicates": JobTask(check_duplicates),
+}
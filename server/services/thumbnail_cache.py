@@ -0,0 +1,257 @@
+import hashlib
+import os
+import time
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+from PIL import Image
+
+from config import Config
+from dbio.sqlite import SQLiteDatabaseAdapter
+
+HASH_CHUNK_SIZE = 1024 * 1024
+EVICTION_TARGET_RATIO = 0.9
+
+FORMAT_EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp"}
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ThumbnailCache:
+    """
+    Content-addressed store for thumbnail renditions.
+
+    Sources are identified by the hash of their bytes. The hash is only
+    recomputed when a file's size or mtime changes, and renditions are only
+    rendered when their hash has none yet, so re-annotating (or moving) a file
+    costs a stat. Every configured size is produced from a single decode.
+    Renditions are evicted least-recently-used once the cache grows past
+    `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        sizes: List[int],
+        image_format: str = "JPEG",
+        quality: int = 80,
+        max_bytes: Optional[int] = None,
+        schema_path: Optional[str] = None,
+    ):
+        if image_format not in FORMAT_EXTENSIONS:
+            raise ValueError(f"Unsupported thumbnail format: {image_format}")
+        self.cache_dir = cache_dir
+        self.sizes = sorted(sizes)
+        self.image_format = image_format
+        self.extension = FORMAT_EXTENSIONS[image_format]
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.index = SQLiteDatabaseAdapter(
+            os.path.join(cache_dir, "index.db"), schema_path
+        )
+        self.total_bytes = sum(
+            row["bytes"] for row in self.index.select("thumbnail_renditions", "bytes")
+        )
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def from_config(cls, cache_dir: Optional[str] = None) -> "ThumbnailCache":
+        config = Config()
+        return cls(
+            cache_dir or config.thumbnails_dir,
+            config.thumbnail_sizes,
+            config.thumbnail_format,
+            config.thumbnail_quality,
+            config.thumbnail_cache_max_bytes,
+            config.thumbnail_cache_schema_path,
+        )
+
+    def closest_size(self, size: int) -> int:
+        """Smallest configured size that covers `size`, or the largest one."""
+        return next((s for s in self.sizes if s >= size), self.sizes[-1])
+
+    def content_hash(self, path: str) -> str:
+        stat = os.stat(path)
+        rows = self.index.select("thumbnail_sources", "*", {"path": path})
+        if (
+            rows
+            and rows[0]["size"] == stat.st_size
+            and rows[0]["mtime"] == stat.st_mtime
+        ):
+            return rows[0]["content_hash"]
+
+        content_hash = hash_file(path)
+        self.index.upsert(
+            "thumbnail_sources",
+            {
+                "path": path,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "content_hash": content_hash,
+            },
+            ["path"],
+        )
+        return content_hash
+
+    def rendition_path(self, content_hash: str, size: int, frame: int = 0) -> str:
+        name = f"{content_hash}_{frame}ms_{size}" if frame else f"{content_hash}_{size}"
+        return os.path.join(
+            self.cache_dir, content_hash[:2], f"{name}.{self.extension}"
+        )
+
+    def get(self, path: str, size: int) -> Optional[str]:
+        """Returns the cached rendition for `path`, without rendering on a miss."""
+        return self._lookup(self.content_hash(path), self.closest_size(size))
+
+    def get_or_create(
+        self,
+        path: str,
+        load_image: Callable[[int], Image.Image],
+        sizes: Optional[List[int]] = None,
+    ) -> Dict[int, str]:
+        """
+        Returns the renditions of `path` keyed by size (every configured size
+        by default). `load_image` is only called, once, when at least one is
+        missing, with the largest missing size so it can decode no larger.
+        """
+        content_hash = self.content_hash(path)
+        renditions = {
+            size: self._lookup(content_hash, size) for size in sizes or self.sizes
+        }
+        missing = [size for size, cached in renditions.items() if cached is None]
+        if missing:
+            image = load_image(max(missing))
+            renditions.update(self._render(content_hash, image, missing))
+            self.evict()
+        return renditions
+
+    def get_or_create_frames(
+        self,
+        path: str,
+        frames: List[int],
+        write_frames: Callable[[Dict[int, Dict[int, str]]], None],
+        sizes: Optional[List[int]] = None,
+    ) -> Dict[int, Dict[int, str]]:
+        """
+        Video counterpart of `get_or_create`, keyed by frame offset (ms) and
+        size. Missing renditions are handed to `write_frames` in one call as
+        `{frame: {size: output_path}}` for it to write itself.
+        """
+        content_hash = self.content_hash(path)
+        renditions = {
+            frame: {
+                size: self._lookup(content_hash, size, frame)
+                for size in sizes or self.sizes
+            }
+            for frame in frames
+        }
+        targets = {
+            frame: {
+                size: self._tmp_path(self.rendition_path(content_hash, size, frame))
+                for size, cached in frame_renditions.items()
+                if cached is None
+            }
+            for frame, frame_renditions in renditions.items()
+        }
+        if any(targets.values()):
+            write_frames(targets)
+            for frame, frame_targets in targets.items():
+                for size, tmp_path in frame_targets.items():
+                    renditions[frame][size] = self._store(
+                        content_hash, size, tmp_path, frame
+                    )
+            self.evict()
+        return renditions
+
+    def _lookup(self, content_hash: str, size: int, frame: int = 0) -> Optional[str]:
+        key = {
+            "content_hash": content_hash,
+            "frame": frame,
+            "size": size,
+            "format": self.image_format,
+        }
+        rows = self.index.select("thumbnail_renditions", "path", key)
+        if not rows:
+            return None
+        if not os.path.exists(rows[0]["path"]):
+            self.index.delete("thumbnail_renditions", key)
+            return None
+        self.index.update("thumbnail_renditions", {"last_accessed": time.time()}, key)
+        return rows[0]["path"]
+
+    @staticmethod
+    def _tmp_path(path: str) -> str:
+        # Keeps the extension, which encoders such as ffmpeg pick formats by.
+        root, extension = os.path.splitext(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return f"{root}.{os.getpid()}.tmp{extension}"
+
+    def _store(
+        self, content_hash: str, size: int, tmp_path: str, frame: int = 0
+    ) -> str:
+        """Moves a finished rendition into place and records it in the index."""
+        path = self.rendition_path(content_hash, size, frame)
+        os.replace(tmp_path, path)
+        row = {
+            "content_hash": content_hash,
+            "frame": frame,
+            "size": size,
+            "format": self.image_format,
+            "path": path,
+            "bytes": os.path.getsize(path),
+            "last_accessed": time.time(),
+        }
+        self.index.upsert(
+            "thumbnail_renditions", row, ["content_hash", "frame", "size", "format"]
+        )
+        self.total_bytes += row["bytes"]
+        return path
+
+    def _render(
+        self, content_hash: str, image: Image.Image, sizes: List[int]
+    ) -> Dict[int, str]:
+        if self.image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        renditions = {}
+        # Largest first, each downscaled from the previous one, so the source
+        # is only resampled at full resolution once.
+        for size in sorted(sizes, reverse=True):
+            image = image.copy()
+            image.thumbnail((size, size))
+            tmp_path = self._tmp_path(self.rendition_path(content_hash, size))
+            image.save(tmp_path, self.image_format, quality=self.quality)
+            renditions[size] = self._store(content_hash, size, tmp_path)
+        return renditions
+
+    def evict(self) -> None:
+        if self.max_bytes is None or self.total_bytes <= self.max_bytes:
+            return
+        # Other processes write to the same cache, so re-read the real total.
+        rows = self.index.select("thumbnail_renditions", "*")
+        rows.sort(key=lambda row: row["last_accessed"])
+        self.total_bytes = sum(row["bytes"] for row in rows)
+        target = self.max_bytes * EVICTION_TARGET_RATIO
+        for row in rows:
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(row["path"])
+            except FileNotFoundError:
+                pass
+            self.index.delete(
+                "thumbnail_renditions",
+                {
+                    "content_hash": row["content_hash"],
+                    "frame": row["frame"],
+                    "size": row["size"],
+                    "format": row["format"],
+                },
+            )
+            self.total_bytes -= row["bytes"]
@@ -1,15 +1,24 @@
+import io
 import os
-import shlex
-import subprocess
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 
+import piexif
 from PIL import Image, ExifTags
+from pillow_heif import register_heif_opener
 
 from config import Config
-from utilities.image import convert_heic_to_jpg
+from services.thumbnail_cache import ThumbnailCache
+from services.video.keyframe_extractor import KeyframeExtractor
 
 config = Config()
 
+# `Image.thumbnail` first shrinks by an integer factor with `reduce()` while the
+# image is still this many times larger than the target, then resamples.
+REDUCING_GAP = 2.0
+# Embedded EXIF thumbnails are only used when their aspect ratio matches the
+# photo; many cameras letterbox them to a fixed 160x120.
+EXIF_THUMBNAIL_ASPECT_TOLERANCE = 0.01
+
 
 class ThumbnailExtractor:
     def __init__(
@@ -18,15 +27,21 @@ class ThumbnailExtractor:
         output_dir: str,
         media_type: Optional[str] = None,
         media_id: Optional[str] = None,
-        size: int = 512,
+        size: int = config.thumbnail_default_size,
+        cache: Optional[ThumbnailCache] = None,
+        duration: Optional[float] = None,
+        frame_count: int = config.video_thumbnail_frames,
     ):
         self.media_path = media_path
         self.media_id = media_id or os.path.splitext(os.path.basename(media_path))[0]
         self.output_dir = output_dir
         self.media_type = media_type or self._determine_media_type()
         self.size = size
+        self.duration = duration
+        self.frame_count = frame_count
 
         os.makedirs(self.output_dir, exist_ok=True)
+        self.cache = cache or ThumbnailCache.from_config(self.output_dir)
 
     def _determine_media_type(self) -> str:
         extension = os.path.splitext(self.media_path)[1].lower().replace(".", "")
@@ -37,42 +52,55 @@ class ThumbnailExtractor:
         else:
             raise ValueError("Unsupported media type")
 
-    def _run_command(self, command: str) -> subprocess.CompletedProcess:
-        return subprocess.run(
-            command,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
+    def _exif_thumbnail(self, img: Image.Image, size: int) -> Optional[Image.Image]:
+        """The JPEG's embedded EXIF preview, if it is at least `size` pixels."""
+        try:
+            data = piexif.load(img.info["exif"]).get("thumbnail")
+        except Exception:
+            return None
+        if not data:
+            return None
+
+        thumbnail = Image.open(io.BytesIO(data))
+        aspect_difference = abs(
+            thumbnail.width / thumbnail.height - img.width / img.height
         )
+        if (
+            max(thumbnail.size) < size
+            or aspect_difference > EXIF_THUMBNAIL_ASPECT_TOLERANCE
+        ):
+            return None
+        thumbnail.load()
+        return thumbnail
+
+    def _load_image(self, size: int) -> Image.Image:
+        """
+        Decodes the image at the lowest resolution that still covers `size`:
+        the embedded EXIF preview when it is big enough, otherwise JPEGs are
+        decoded straight to 1/2, 1/4 or 1/8 scale with `draft()` and other
+        formats are shrunk with `reducing_gap` before the final resample.
+        """
+        if self.media_path.lower().endswith(".heic"):
+            register_heif_opener()
+        img = Image.open(self.media_path)
+
+        if img.format == "JPEG":
+            thumbnail = self._exif_thumbnail(img, size)
+            if thumbnail is not None:
+                return self._maintain_orientation(thumbnail, exif_source=img)
+            img.draft("RGB", (size, size))
 
-    def _get_video_duration(self) -> float:
-        duration_command = f"ffprobe -v error -show_entries format=duration -of default=noprint_wrappers=1:nokey=1 {shlex.quote(self.media_path)}"
-        result = self._run_command(duration_command)
-        if result.returncode != 0:
-            raise RuntimeError(f"Failed to get video duration: {result.stderr}")
-        return float(result.stdout.strip())
-
-    def _extract_frame(self, time: float, output_path: str) -> None:
-        frame_command = f"ffmpeg -ss {time} -i {shlex.quote(self.media_path)} -frames:v 1 {shlex.quote(output_path)}"
-        result = self._run_command(frame_command)
-        if result.returncode != 0:
-            raise RuntimeError(f"Failed to extract frame: {result.stderr}")
-
-    def _process_image(
-        self, input_path: str, output_path: str, quality: int = 60
-    ) -> None:
-        img = Image.open(input_path)
-        img.thumbnail((self.size, self.size))
-        img = self._maintain_orientation(img)
-        img.save(output_path, "JPEG", quality=quality)
-
-    def _maintain_orientation(self, img: Image) -> Image:
+        img.thumbnail((size, size), reducing_gap=REDUCING_GAP)
+        return self._maintain_orientation(img)
+
+    def _maintain_orientation(
+        self, img: Image, exif_source: Optional[Image.Image] = None
+    ) -> Image:
         try:
             for orientation in ExifTags.TAGS.keys():
                 if ExifTags.TAGS[orientation] == "Orientation":
                     break
-            exif = img._getexif()
+            exif = (exif_source or img)._getexif()
             if exif is not None:
                 orientation = exif.get(orientation)
                 if orientation == 3:
@@ -85,36 +113,49 @@ class ThumbnailExtractor:
             pass
         return img
 
-    def _extract_video(self, n: int) -> List[str]:
-        paths = []
-        duration = self._get_video_duration()
-        intervals = duration / n
-
-        for i in range(n):
-            time = i * intervals
-            output_path = os.path.join(self.output_dir, f"{self.media_id}_{i}.jpg")
-            self._extract_frame(time, output_path)
-            self._process_image(output_path, output_path)
-            paths.append(output_path)
-
-        return paths
+    def frame_renditions(
+        self, sizes: Optional[List[int]] = None
+    ) -> Dict[int, Dict[int, str]]:
+        """
+        Video thumbnails for `frame_count` evenly spaced frames, keyed by frame
+        offset in milliseconds and then size. All missing frames are written by
+        a single ffmpeg process; `duration` skips the ffprobe call when the
+        video's metadata is already known.
+        """
+        keyframe_extractor = KeyframeExtractor(
+            self.media_path, self.duration, self.cache.quality
+        )
+        timestamps = keyframe_extractor.timestamps(self.frame_count)
+        return self.cache.get_or_create_frames(
+            self.media_path,
+            [round(timestamp * 1000) for timestamp in timestamps],
+            lambda targets: keyframe_extractor.extract(
+                {frame / 1000: paths for frame, paths in targets.items()}
+            ),
+            sizes,
+        )
 
-    def _extract_image(self) -> str:
-        dest_path = os.path.join(self.output_dir, f"{self.media_id}.jpg")
-        if self.media_path.lower().endswith(".heic"):
-            convert_heic_to_jpg(self.media_path, dest_path)
+    def renditions(self, sizes: Optional[List[int]] = None) -> Dict[int, str]:
+        """Thumbnails for the media keyed by size, all configured sizes by default."""
+        if self.media_type == "video":
+            return next(iter(self.frame_renditions(sizes).values()))
+        elif self.media_type == "image":
+            return self.cache.get_or_create(self.media_path, self._load_image, sizes)
         else:
-            self._process_image(self.media_path, dest_path, quality=10)
-        return dest_path
+            raise ValueError("Unsupported media type")
+
+    def rendition(self, size: int) -> str:
+        size = self.cache.closest_size(size)
+        return self.renditions([size])[size]
 
     def extract(self) -> Optional[Union[List[str], str]]:
         try:
+            # Renders every configured size, returning the default one.
+            size = self.cache.closest_size(self.size)
             if self.media_type == "video":
-                return self._extract_video(1)
-            elif self.media_type == "image":
-                return [self._extract_image()]
-            else:
-                raise ValueError("Unsupported media type")
+                frames = self.frame_renditions()
+                return [renditions[size] for renditions in frames.values()]
+            return [self.renditions()[size]]
         except Exception as e:
             print(f"ERROR EXTRACTING THUMBNAILS: {e}")
             return None
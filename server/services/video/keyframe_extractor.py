@@ -0,0 +1,199 @@
+import os
+import shutil
+import subprocess
+from typing import Dict, List, Optional
+
+
+def ffmpeg_quality_args(output_path: str, quality: int) -> List[str]:
+    """Maps a 0-100 quality onto the encoder options for the output format."""
+    if output_path.lower().endswith(".webp"):
+        return ["-c:v", "libwebp", "-quality", str(quality)]
+    # mjpeg's qscale runs from 2 (best) to 31 (worst).
+    return ["-q:v", str(round(2 + (100 - quality) * 29 / 100))]
+
+
+class KeyframeExtractor:
+    """
+    Grabs evenly spaced frames from a video in a single ffmpeg process.
+
+    Every timestamp is its own input seeked with `-ss` before `-i`, which
+    jumps straight to the nearest keyframe, and `-skip_frame nokey` keeps the
+    decoder from touching anything else, so each frame costs one keyframe
+    decode. Timestamps that seek to the same keyframe are decoded once.
+    Scaling happens in the same filter graph and ffmpeg writes every
+    rendition itself; nothing is decoded again in Python. Some files leave
+    keyframe-only seeks without a frame while ffmpeg still exits cleanly,
+    so those timestamps are retried with an accurate seek.
+    """
+
+    def __init__(
+        self, video_path: str, duration: Optional[float] = None, quality: int = 80
+    ):
+        self.video_path = video_path
+        self.duration = duration
+        self.quality = quality
+
+    def get_duration(self) -> float:
+        if self.duration is None:
+            command = [
+                "ffprobe",
+                "-v",
+                "error",
+                "-show_entries",
+                "format=duration",
+                "-of",
+                "default=noprint_wrappers=1:nokey=1",
+                self.video_path,
+            ]
+            result = subprocess.run(command, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"Failed to get video duration: {result.stderr}")
+            self.duration = float(result.stdout.strip())
+        return self.duration
+
+    def timestamps(self, count: int) -> List[float]:
+        """`count` evenly spaced timestamps, starting at the first frame."""
+        if count == 1:
+            return [0.0]
+        duration = self.get_duration()
+        return [i * duration / count for i in range(count)]
+
+    def keyframe_times(self, timestamps: List[float]) -> Dict[float, float]:
+        """
+        The keyframe each timestamp seeks to, read by one ffprobe that stops
+        after the first video packet of every seek. Timestamps whose keyframe
+        can't be read map to themselves.
+        """
+        keyframes = {timestamp: timestamp for timestamp in timestamps}
+        command = [
+            "ffprobe",
+            "-v",
+            "error",
+            "-select_streams",
+            "v:0",
+            "-read_intervals",
+            ",".join(f"{timestamp:.3f}%+#1" for timestamp in timestamps),
+            "-show_entries",
+            "packet=pts_time,flags",
+            "-of",
+            "csv=print_section=0",
+            self.video_path,
+        ]
+        result = subprocess.run(command, capture_output=True, text=True)
+        packets = result.stdout.split()
+        if result.returncode != 0 or len(packets) != len(timestamps):
+            return keyframes
+        for timestamp, packet in zip(timestamps, packets):
+            pts_time, _, flags = packet.partition(",")
+            try:
+                if flags.startswith("K"):
+                    keyframes[timestamp] = float(pts_time)
+            except ValueError:
+                pass
+        return keyframes
+
+    def _command(
+        self, frames: Dict[float, Dict[int, str]], keyframes_only: bool = True
+    ) -> List[str]:
+        inputs, filters, outputs = [], [], []
+        seek = ["-skip_frame", "nokey", "-noaccurate_seek"] if keyframes_only else []
+        for index, (timestamp, renditions) in enumerate(frames.items()):
+            # One decoder thread per input: each only decodes a single frame,
+            # so per-input thread pools would cost more than they save.
+            inputs += [
+                "-threads",
+                "1",
+                *seek,
+                "-ss",
+                f"{timestamp:.3f}",
+                "-i",
+                self.video_path,
+            ]
+            # Largest size first, each smaller one scaled from the previous.
+            source = f"{index}:v:0"
+            sizes = sorted(renditions, reverse=True)
+            for size in sizes:
+                label = f"f{index}s{size}"
+                scale = f"scale={size}:{size}:force_original_aspect_ratio=decrease"
+                if size == sizes[-1]:
+                    filters.append(f"[{source}]{scale}[{label}]")
+                else:
+                    filters.append(f"[{source}]{scale},split=2[{label}][{label}next]")
+                    source = f"{label}next"
+                outputs += [
+                    "-map",
+                    f"[{label}]",
+                    "-frames:v",
+                    "1",
+                    "-update",
+                    "1",
+                    *ffmpeg_quality_args(renditions[size], self.quality),
+                    renditions[size],
+                ]
+        return [
+            "ffmpeg",
+            "-v",
+            "error",
+            "-y",
+            *inputs,
+            "-filter_complex",
+            ";".join(filters),
+            *outputs,
+        ]
+
+    def _write(
+        self, frames: Dict[float, Dict[int, str]], keyframes_only: bool = True
+    ) -> List[float]:
+        """Runs one ffmpeg for `frames` and returns the timestamps it left out."""
+        result = subprocess.run(
+            self._command(frames, keyframes_only), capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Failed to extract frames: {result.stderr}")
+        return [
+            timestamp
+            for timestamp, renditions in frames.items()
+            if not all(os.path.exists(path) for path in renditions.values())
+        ]
+
+    def extract(
+        self, frames: Dict[float, Dict[int, str]]
+    ) -> Dict[float, Dict[int, str]]:
+        """
+        Writes every requested rendition. `frames` maps a timestamp in seconds
+        to `{size: output_path}`; timestamps with no renditions are skipped.
+        """
+        frames = {timestamp: paths for timestamp, paths in frames.items() if paths}
+        if not frames:
+            return {}
+
+        # Timestamps on the same keyframe share one decode, written to the
+        # first of their paths for each size and copied to the rest.
+        keyframes = self.keyframe_times(list(frames))
+        groups: Dict[float, List[float]] = {}
+        for timestamp in frames:
+            groups.setdefault(keyframes[timestamp], []).append(timestamp)
+        shared: Dict[float, Dict[int, str]] = {}
+        for keyframe, timestamps in groups.items():
+            shared[keyframe] = {}
+            for timestamp in timestamps:
+                for size, path in frames[timestamp].items():
+                    shared[keyframe].setdefault(size, path)
+
+        missing = []
+        for keyframe in self._write(shared):
+            missing += groups.pop(keyframe)
+        if missing:
+            retry = {timestamp: frames[timestamp] for timestamp in missing}
+            failed = self._write(retry, keyframes_only=False)
+            if failed:
+                raise RuntimeError(
+                    f"Failed to extract frames at {', '.join(map(str, failed))}s"
+                )
+
+        for keyframe, timestamps in groups.items():
+            for timestamp in timestamps:
+                for size, path in frames[timestamp].items():
+                    if path != shared[keyframe][size]:
+                        shutil.copyfile(shared[keyframe][size], path)
+        return frames
@@ -1,13 +1,23 @@
-import os
 import uuid
 
-from dbio.supabase import SupabaseDatabaseAdapter
+from fastapi import Request
 
+from dbio.base_sql import AsyncBaseSQLDatabaseAdapter
 
-def get_db():
-    return SupabaseDatabaseAdapter(
-        url=os.environ["SUPABASE_URL"], key=os.environ["SUPABASE_SECRET_KEY"]
-    )
+
+def get_db(request: Request) -> AsyncBaseSQLDatabaseAdapter:
+    """FastAPI dependency returning the process-wide adapter created at startup."""
+    return request.app.state.db
+
+
+def get_job_queue(request: Request):
+    """FastAPI dependency returning the background job queue created at startup."""
+    return request.app.state.job_queue
+
+
+def get_hash_store(request: Request):
+    """FastAPI dependency returning the process-wide hash store."""
+    return request.app.state.hash_store
 
 
 def generate_id():